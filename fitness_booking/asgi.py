@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fitness_booking.settings')
+# Route the read endpoints to the native async views under ASGI
+os.environ.setdefault('STUDIO_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
@@ -42,6 +42,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its wall time and Server-Timing header cover the whole stack
+    'studio.metrics.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -63,6 +65,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'studio.context_processors.upcoming_classes',
             ],
         },
     },
@@ -78,9 +81,63 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Writers take the lock at BEGIN instead of failing on upgrade
+            'transaction_mode': 'IMMEDIATE',
+        },
+    }
+}
+
+# Applied to every new SQLite connection (see studio/database.py)
+STUDIO_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 134217728,
+    'cache_size': -32000,
+}
+
+# Bounded retry with backoff for write transactions still hitting a lock
+STUDIO_WRITE_RETRIES = 3
+STUDIO_WRITE_RETRY_DELAY = 0.05
+
+# Cache backend for the upcoming-class catalog (see studio/catalog.py).
+# Point STUDIO_CATALOG_CACHE at a shared backend (e.g. Redis) when running
+# several processes so invalidations are seen everywhere.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'studio',
     }
 }
 
+STUDIO_CATALOG_CACHE = 'default'
+STUDIO_CATALOG_TIMEOUT = 300
+
+# Serve the read-only endpoints from studio/async_views.py. asgi.py turns
+# this on; WSGI deployments keep the sync views.
+STUDIO_ASYNC_VIEWS = os.environ.get('STUDIO_ASYNC_VIEWS', '0') == '1'
+
+# Maximum number of entries accepted by POST /book/batch/
+STUDIO_BATCH_BOOKING_LIMIT = 100
+
+# Idempotency-Key replay store for POST /book/ (see studio/idempotency.py)
+STUDIO_IDEMPOTENCY_CACHE = 'default'
+STUDIO_IDEMPOTENCY_TTL = 24 * 60 * 60
+# How long a concurrent duplicate waits for the original request's result
+STUDIO_IDEMPOTENCY_WAIT = 5
+
+# Weeks generated by the "Repeat selected classes weekly" admin action
+STUDIO_REPEAT_WEEKS = 12
+
+# Classes that started more than this many days ago are moved to the
+# archive tables by `manage.py archive_classes`
+STUDIO_ARCHIVE_AFTER_DAYS = 90
+
+# `manage.py reconcile_slots --every` checks every class at least this often
+# (seconds); the passes in between only look at classes whose updated_at moved
+STUDIO_RECONCILE_FULL_INTERVAL = int(os.environ.get('STUDIO_RECONCILE_FULL_INTERVAL', '3600'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -130,9 +187,57 @@ REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
         'rest_framework.renderers.JSONRenderer',
     ],
+    # Throttled requests answer in the studio error format
+    'EXCEPTION_HANDLER': 'studio.throttling.exception_handler',
+    # Reverse proxies in front of the app. 0 keys rate limits on REMOTE_ADDR;
+    # otherwise the address the outermost trusted proxy appended to
+    # X-Forwarded-For is used. Anything left of it is client-supplied.
+    'NUM_PROXIES': int(os.environ.get('STUDIO_NUM_PROXIES', '0')),
 }
 
+# Token-bucket limits per API scope and key kind (see studio/throttling.py).
+# A scope without an entry is not limited.
+STUDIO_THROTTLE_RATES = {
+    'classes': {'ip': '600/min'},
+    'bookings': {'ip': '120/min', 'email': '60/min'},
+    'book': {'ip': '30/min', 'email': '10/min'},
+    'cancel': {'ip': '30/min', 'email': '10/min'},
+    'waitlist': {'ip': '30/min', 'email': '10/min'},
+    'export': {'ip': '10/min'},
+    'stats': {'ip': '60/min'},
+}
+# Cache alias to share buckets between workers; None keeps them in process
+STUDIO_THROTTLE_CACHE = None
+
+# Bearer token for Prometheus scrapes of /metrics; staff sessions need none
+STUDIO_METRICS_TOKEN = os.environ.get('STUDIO_METRICS_TOKEN', '')
+
 # Enhanced Logging Configuration
+# 'queue' hands studio records to a background writer thread (studio/log.py);
+# 'sync' writes them on the request thread.
+STUDIO_LOG_MODE = os.environ.get('STUDIO_LOG_MODE', 'queue')
+# 'size' rotates studio.log at 10 MB, 'time' at midnight
+STUDIO_LOG_ROTATION = os.environ.get('STUDIO_LOG_ROTATION', 'size')
+# The test settings point this at a temporary file (see test_settings.py)
+STUDIO_LOG_FILE = os.environ.get('STUDIO_LOG_FILE') or os.path.join(BASE_DIR, 'studio.log')
+# Share of high-volume events to keep, by event name
+STUDIO_LOG_SAMPLING = {
+    'classes_listed': float(os.environ.get('STUDIO_LOG_SAMPLE_CLASSES', '1.0')),
+}
+
+LOG_ROTATION_HANDLERS = {
+    'size': {
+        'class': 'logging.handlers.RotatingFileHandler',
+        'maxBytes': 10 * 1024 * 1024,
+        'backupCount': 5,
+    },
+    'time': {
+        'class': 'logging.handlers.TimedRotatingFileHandler',
+        'when': 'midnight',
+        'backupCount': 14,
+    },
+}
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -145,23 +250,42 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'studio.log.JsonFormatter',
+        },
+    },
+    'filters': {
+        'request_context': {
+            '()': 'studio.log.RequestContextFilter',
+        },
+        'sampling': {
+            '()': 'studio.log.SamplingFilter',
+            'rates': STUDIO_LOG_SAMPLING,
+        },
     },
     'handlers': {
         'file': {
             'level': 'INFO',
-            'class': 'logging.FileHandler',
-            'filename': os.path.join(BASE_DIR, 'studio.log'),
-            'formatter': 'verbose',
+            **LOG_ROTATION_HANDLERS[STUDIO_LOG_ROTATION],
+            'filename': STUDIO_LOG_FILE,
+            'formatter': 'json',
         },
         'console': {
             'level': 'DEBUG',
             'class': 'logging.StreamHandler',
             'formatter': 'simple',
         },
+        'queue': {
+            'class': 'studio.log.QueueListenerHandler',
+            'targets': ['cfg://handlers.file', 'cfg://handlers.console'],
+        },
     },
     'loggers': {
         'studio': {
-            'handlers': ['file', 'console'],
+            'handlers': ['queue'],
+            # Logger-level filters: sampled-out records are dropped before
+            # any handler (or the queue) sees them
+            'filters': ['sampling', 'request_context'],
             'level': 'INFO',
             'propagate': False,
         },
@@ -175,4 +299,9 @@ LOGGING = {
         'handlers': ['console'],
         'level': 'WARNING',
     },
-}
\ No newline at end of file
+}
+
+if STUDIO_LOG_MODE == 'sync':
+    # Write on the request thread, without the background listener
+    del LOGGING['handlers']['queue']
+    LOGGING['loggers']['studio']['handlers'] = ['file', 'console']
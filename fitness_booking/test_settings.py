@@ -0,0 +1,13 @@
+"""
+Settings for the test suite: the project settings with the log file moved
+out of the tracked studio.log.
+
+    python manage.py test studio --settings=fitness_booking.test_settings
+"""
+import os
+import tempfile
+
+from .settings import *
+
+STUDIO_LOG_FILE = os.environ.get('STUDIO_LOG_FILE') or os.path.join(tempfile.gettempdir(), 'studio-test.log')
+LOGGING['handlers']['file']['filename'] = STUDIO_LOG_FILE
@@ -1,5 +1,7 @@
-from django.contrib import admin
-from .models import FitnessClass, Booking
+from django.contrib import admin, messages
+from django.conf import settings
+from .models import ArchivedBooking, ArchivedClass, DailyClassStats, FitnessClass, Booking, WaitlistEntry
+from .schedule import import_classes, repeat_weekly
 
 @admin.register(FitnessClass)
 class FitnessClassAdmin(admin.ModelAdmin):
@@ -7,16 +9,69 @@ class FitnessClassAdmin(admin.ModelAdmin):
     list_filter = ['name', 'instructor', 'datetime']
     search_fields = ['name', 'instructor']
     ordering = ['datetime']
+    actions = ['repeat_selected_weekly']
     
     def is_available(self, obj):
         return obj.is_available()
     is_available.boolean = True
     is_available.short_description = 'Available'
 
+    @admin.action(description='Repeat selected classes weekly')
+    def repeat_selected_weekly(self, request, queryset):
+        weeks = getattr(settings, 'STUDIO_REPEAT_WEEKS', 12)
+        created, skipped = import_classes(repeat_weekly(queryset, weeks))
+        self.message_user(
+            request,
+            f'Created {len(created)} classes over the next {weeks} weeks, skipped {len(skipped)} duplicates',
+            messages.SUCCESS
+        )
+
 @admin.register(Booking)
 class BookingAdmin(admin.ModelAdmin):
     list_display = ['client_name', 'client_email', 'fitness_class', 'booked_at', 'is_cancelled']
     list_filter = ['fitness_class__name', 'booked_at', 'is_cancelled']
     search_fields = ['client_name', 'client_email', 'fitness_class__name']
     ordering = ['-booked_at']
-    readonly_fields = ['booked_at']
\ No newline at end of file
+    readonly_fields = ['booked_at']
+
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ['client_name', 'client_email', 'fitness_class', 'joined_at', 'promoted_at']
+    list_filter = ['fitness_class__name', 'promoted_at']
+    search_fields = ['client_name', 'client_email', 'fitness_class__name']
+    ordering = ['id']
+    readonly_fields = ['joined_at', 'promoted_at', 'promoted_booking']
+
+@admin.register(DailyClassStats)
+class DailyClassStatsAdmin(admin.ModelAdmin):
+    list_display = ['day', 'class_type', 'instructor', 'class_count', 'total_slots', 'booking_count', 'cancellation_count']
+    list_filter = ['class_type', 'instructor', 'day']
+    ordering = ['-day']
+
+    # Maintained by the booking write path and rebuild_stats
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+class ArchiveAdmin(admin.ModelAdmin):
+    # Written only by the archive_classes command
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(ArchivedClass)
+class ArchivedClassAdmin(ArchiveAdmin):
+    list_display = ['id', 'name', 'instructor', 'datetime', 'total_slots', 'available_slots', 'archived_at']
+    list_filter = ['name', 'instructor']
+    ordering = ['-datetime']
+
+@admin.register(ArchivedBooking)
+class ArchivedBookingAdmin(ArchiveAdmin):
+    list_display = ['id', 'fitness_class', 'client_name', 'client_email', 'booked_at', 'is_cancelled']
+    list_filter = ['is_cancelled', 'fitness_class__name']
+    search_fields = ['client_name', 'client_email']
+    ordering = ['-booked_at']
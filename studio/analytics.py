@@ -0,0 +1,192 @@
+"""Precomputed class utilization for the ``/stats/`` endpoint.
+
+``DailyClassStats`` holds one row per (day, class type, instructor) with the
+number of classes, their capacity, the bookings made and how many of those
+were cancelled. The booking write paths in ``services.py`` add to the
+counters of the rows they touch with an ``F()`` UPDATE inside their own
+transaction, so dashboards read O(days) summary rows instead of scanning
+bookings. Class changes are rare and recompute the days they touch from the
+source tables (live and archived) with DB-side aggregates instead;
+``python manage.py rebuild_stats`` does the same for every day (e.g. after
+bulk edits in the admin, which the counters do not see).
+
+Days are calendar days in the studio time zone.
+"""
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import ArchivedBooking, ArchivedClass, Booking, DailyClassStats, FitnessClass
+
+# Response field -> summary column
+STATS_FIELDS = {
+    'classes': 'class_count',
+    'capacity': 'total_slots',
+    'bookings': 'booking_count',
+    'cancellations': 'cancellation_count',
+}
+STATS_GROUPS = ('day', 'class_type', 'instructor')
+
+
+class StatsError(ValueError):
+    pass
+
+
+def stats_key(starts_at, class_type, instructor):
+    """Summary row of a class starting at ``starts_at``"""
+    return timezone.localdate(starts_at), class_type, instructor
+
+
+def record(deltas):
+    """Add ``{stats_key: {column: delta}}`` to the summary, one UPDATE per row
+
+    A row that does not exist yet is rebuilt from the source tables, which
+    already include the change being recorded.
+    """
+    missing = set()
+    for (day, class_type, instructor), changes in deltas.items():
+        changes = {column: F(column) + delta for column, delta in changes.items() if delta}
+        if changes and not DailyClassStats.objects.filter(
+            day=day, class_type=class_type, instructor=instructor
+        ).update(**changes):
+            missing.add(day)
+    if missing:
+        rebuild_stats(missing)
+
+
+def record_bookings(keys, column='booking_count'):
+    """Count one booking (or cancellation) per stats key in ``keys``"""
+    record({key: {column: count} for key, count in Counter(keys).items()})
+
+
+def record_cancellations(keys):
+    record_bookings(keys, column='cancellation_count')
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def rebuild_stats(days=None):
+    """Recompute the summary rows of ``days`` (every day if None); returns the row count
+
+    Archived classes and bookings count as well, so archiving never loses history.
+    """
+    rows = {}
+    for class_model, booking_model in ((FitnessClass, Booking), (ArchivedClass, ArchivedBooking)):
+        _count(rows, class_model.objects.all(), booking_model.objects.all(), days)
+
+    with transaction.atomic():
+        stale = DailyClassStats.objects.all() if days is None else DailyClassStats.objects.filter(day__in=days)
+        stale.delete()
+        DailyClassStats.objects.bulk_create(rows.values(), batch_size=1000)
+    return len(rows)
+
+
+def _count(rows, classes, bookings, days=None):
+    """Add the DB-side aggregates of ``classes`` and ``bookings`` to ``rows`` (key -> unsaved DailyClassStats)"""
+    if days is not None:
+        days = list(days)
+        # The range lets the datetime index narrow the rows before the
+        # per-row date conversion of __date
+        window = (_day_start(min(days)), _day_start(max(days) + timedelta(days=1)))
+        classes = classes.filter(datetime__gte=window[0], datetime__lt=window[1], datetime__date__in=days)
+        bookings = bookings.filter(
+            fitness_class__datetime__gte=window[0], fitness_class__datetime__lt=window[1],
+            fitness_class__datetime__date__in=days,
+        )
+
+    for row in (
+        classes.annotate(day=TruncDate('datetime'))
+        .values('day', 'name', 'instructor')
+        .annotate(class_count=Count('id'), total_slots=Sum('total_slots'))
+        .order_by()
+    ):
+        key = (row['day'], row['name'], row['instructor'])
+        stats = rows.setdefault(key, DailyClassStats(day=key[0], class_type=key[1], instructor=key[2]))
+        stats.class_count += row['class_count']
+        stats.total_slots += row['total_slots']
+    # A separate query: joining bookings above would multiply total_slots
+    for row in (
+        bookings.annotate(day=TruncDate('fitness_class__datetime'))
+        .values('day', 'fitness_class__name', 'fitness_class__instructor')
+        .annotate(booking_count=Count('id'), cancellation_count=Count('id', filter=Q(is_cancelled=True)))
+        .order_by()
+    ):
+        stats = rows[row['day'], row['fitness_class__name'], row['fitness_class__instructor']]
+        stats.booking_count += row['booking_count']
+        stats.cancellation_count += row['cancellation_count']
+
+
+def class_changed(fitness_class, created):
+    """Keep the summary in step with a saved FitnessClass"""
+    if created:
+        key = stats_key(fitness_class.datetime, fitness_class.name, fitness_class.instructor)
+        record({key: {'class_count': 1, 'total_slots': fitness_class.total_slots}})
+        return
+    # Type, instructor, capacity or day may have changed: recompute
+    days = {timezone.localdate(fitness_class.datetime)}
+    previous = getattr(fitness_class, '_loaded_datetime', None)
+    if previous is not None:
+        days.add(timezone.localdate(previous))
+    rebuild_stats(days)
+
+
+def _parse_date(value, name):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise StatsError(f'{name} must be a date in YYYY-MM-DD format')
+
+
+def stats_queryset(group_by='day', start=None, end=None, class_type=None, instructor=None):
+    """Summary rows summed per ``group_by`` (comma-separated STATS_GROUPS)
+
+    ``start`` and ``end`` are inclusive YYYY-MM-DD dates.
+    """
+    groups = [group.strip() for group in (group_by or 'day').split(',') if group.strip()]
+    if not groups or any(group not in STATS_GROUPS for group in groups):
+        raise StatsError(f'group_by must be a comma-separated list of: {", ".join(STATS_GROUPS)}')
+
+    stats = DailyClassStats.objects.all()
+    if start:
+        stats = stats.filter(day__gte=_parse_date(start, 'start'))
+    if end:
+        stats = stats.filter(day__lte=_parse_date(end, 'end'))
+    if class_type:
+        stats = stats.filter(class_type=class_type.upper())
+    if instructor:
+        stats = stats.filter(instructor=instructor)
+
+    today = timezone.localdate()
+    return stats.values(*groups).annotate(
+        **{field: Sum(column) for field, column in STATS_FIELDS.items()},
+        # Bookings still standing for classes already held; attendance is
+        # not recorded, so these are the ones to check against the register
+        no_show_candidates=Coalesce(
+            Sum(F('booking_count') - F('cancellation_count'), filter=Q(day__lt=today)), 0
+        ),
+    ).order_by(*groups)
+
+
+def stats_queryset_from_params(params):
+    """stats_queryset() driven by request query parameters"""
+    return stats_queryset(
+        group_by=params.get('group_by'),
+        start=params.get('start'),
+        end=params.get('end'),
+        class_type=params.get('class_type'),
+        instructor=params.get('instructor'),
+    )
+
+
+def summarize(row):
+    """Add fill and cancellation rates to a stats_queryset() row"""
+    active = row['bookings'] - row['cancellations']
+    row['fill_rate'] = round(active / row['capacity'], 3) if row['capacity'] else 0.0
+    row['cancellation_rate'] = round(row['cancellations'] / row['bookings'], 3) if row['bookings'] else 0.0
+    return row
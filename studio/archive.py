@@ -0,0 +1,90 @@
+"""Archival of past classes and their bookings out of the hot tables.
+
+``archive_classes`` moves classes that started more than a retention window
+ago, with their bookings, into ``ArchivedClass`` / ``ArchivedBooking``, one
+batch per transaction, so the live tables and their indexes stay sized to
+the current schedule. Rows keep their ids. Waitlist entries of those
+classes are dropped; a past class has no queue to serve.
+
+The rows leave the live tables through plain DELETEs: the Booking and
+FitnessClass signals would hand slots back and take the bookings out of the
+utilization summary, which keeps counting archived days (see analytics.py).
+Clients read their archived bookings with ``GET /bookings/?include_past=1``.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .database import retry_on_locked
+from .models import ArchivedBooking, ArchivedClass, Booking, FitnessClass, WaitlistEntry
+
+logger = logging.getLogger('studio')
+
+ARCHIVE_BATCH_SIZE = 500
+
+CLASS_FIELDS = ('id', 'name', 'instructor', 'datetime', 'total_slots', 'available_slots', 'created_at', 'updated_at')
+BOOKING_FIELDS = ('id', 'fitness_class_id', 'client_name', 'client_email', 'booked_at', 'is_cancelled')
+
+
+def archive_cutoff(days=None):
+    """Classes that started before this are archived"""
+    if days is None:
+        days = getattr(settings, 'STUDIO_ARCHIVE_AFTER_DAYS', 90)
+    return timezone.now() - timedelta(days=days)
+
+
+def archivable(cutoff):
+    return FitnessClass.objects.filter(datetime__lt=cutoff)
+
+
+def include_past(params):
+    """Whether a bookings request opted into the archive with ?include_past=1"""
+    return params.get('include_past', '').lower() in ('1', 'true', 'yes')
+
+
+def _delete(model, column, ids):
+    table = connection.ops.quote_name(model._meta.db_table)
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE {connection.ops.quote_name(column)} IN ({placeholders})', ids)
+
+
+@retry_on_locked
+def archive_batch(cutoff, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move the oldest ``batch_size`` classes before ``cutoff`` and their bookings
+
+    Returns (classes moved, bookings moved); (0, 0) once nothing is left.
+    """
+    with transaction.atomic():
+        classes = list(archivable(cutoff).order_by('datetime', 'id').values(*CLASS_FIELDS)[:batch_size])
+        if not classes:
+            return 0, 0
+        class_ids = [row['id'] for row in classes]
+        bookings = list(Booking.objects.filter(fitness_class_id__in=class_ids).values(*BOOKING_FIELDS))
+
+        ArchivedClass.objects.bulk_create([ArchivedClass(**row) for row in classes])
+        ArchivedBooking.objects.bulk_create([ArchivedBooking(**row) for row in bookings], batch_size=1000)
+
+        # Children first: the foreign keys still point at the live rows
+        _delete(WaitlistEntry, 'fitness_class_id', class_ids)
+        _delete(Booking, 'fitness_class_id', class_ids)
+        _delete(FitnessClass, 'id', class_ids)
+    return len(classes), len(bookings)
+
+
+def archive_classes(cutoff, batch_size=ARCHIVE_BATCH_SIZE):
+    """Archive every class before ``cutoff``, batch by batch; returns the totals moved"""
+    moved_classes = moved_bookings = 0
+    while True:
+        classes, bookings = archive_batch(cutoff, batch_size)
+        if not classes:
+            break
+        moved_classes += classes
+        moved_bookings += bookings
+    if moved_classes:
+        logger.info('Archived %d classes and %d bookings', moved_classes, moved_bookings,
+                    extra={'event': 'archive', 'count': moved_classes})
+    return moved_classes, moved_bookings
@@ -0,0 +1,185 @@
+"""Native async versions of the read-only views, routed under ASGI.
+
+They mirror the sync views in views.py (kept for WSGI) but use the async
+cache and ORM APIs, so a uvicorn worker serves them on its event loop
+instead of borrowing a thread from the sync-to-async pool per request.
+Serialization only runs on already-loaded instances and is async-safe.
+"""
+import logging
+
+from django.http import JsonResponse, StreamingHttpResponse
+from django.shortcuts import render
+
+from .analytics import StatsError, stats_queryset_from_params, summarize
+from .archive import include_past
+from .catalog import aget_catalog_index, aget_upcoming_entries, catalog_entry_key, entries_data
+from .context_processors import UpcomingClasses
+from .conditional import abooking_list_validators, aclass_list_validators, add_validators, not_modified
+from .exports import EXPORT_FORMATS, ExportError, astream_export, export_filename, export_queryset_from_params, get_format, staff_only
+from .metrics import measure
+from .models import ArchivedBooking, Booking
+from .pagination import InvalidCursor, KeysetPagination
+from .search import FilterError, parse_class_query
+from .serializers import serialize_bookings
+from .throttling import throttled_response
+from .timezones import LocalTimes, TimezoneError, request_zone
+
+logger = logging.getLogger('studio')
+
+# ====================== API VIEWS ======================
+
+async def get_classes(request):
+    """Get upcoming fitness classes, one keyset page at a time"""
+    if request.method != 'GET':
+        return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+    response = throttled_response(request, 'classes')
+    if response is not None:
+        return response
+    try:
+        zone = request_zone(request)
+        query = parse_class_query(request.GET, zone)
+        paginator = KeysetPagination(request)
+        validators = await aclass_list_validators(zone)
+        response = not_modified(request, validators)
+        if response is not None:
+            return response
+
+        entries = paginator.paginate_list((await aget_catalog_index()).search(query), key=catalog_entry_key)
+        classes = entries_data(entries, LocalTimes(zone))
+
+        logger.info('Retrieved %d upcoming classes', len(classes), extra={'event': 'classes_listed', 'count': len(classes)})
+        return add_validators(JsonResponse(paginator.get_paginated_response_data(classes)), validators)
+
+    except (InvalidCursor, FilterError, TimezoneError) as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': str(e)
+        }, status=400)
+
+    except Exception as e:
+        logger.error('Error retrieving classes: %s', e, extra={'event': 'classes_listed', 'outcome': 'error'})
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Failed to retrieve classes'
+        }, status=500)
+
+async def get_bookings(request):
+    """Get all bookings for a specific email address"""
+    if request.method != 'GET':
+        return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+    response = throttled_response(request, 'bookings')
+    if response is not None:
+        return response
+    try:
+        email = request.GET.get('email')
+        if not email:
+            return JsonResponse({
+                'status': 'error',
+                'message': 'Email parameter is required'
+            }, status=400)
+
+        zone = request_zone(request)
+        paginator = KeysetPagination(request)
+        validators = await abooking_list_validators(email, zone)
+        response = not_modified(request, validators)
+        if response is not None:
+            return response
+
+        bookings = Booking.objects.active_for(email).select_related('fitness_class')
+        if include_past(request.GET):
+            archived = ArchivedBooking.objects.active_for(email).select_related('fitness_class')
+            page = await paginator.apaginate_querysets([bookings, archived], ordering=('-booked_at', '-id'))
+        else:
+            page = await paginator.apaginate_queryset(bookings, ordering=('-booked_at', '-id'))
+
+        with measure('serialize'):
+            data = serialize_bookings(page, LocalTimes(zone))
+
+        logger.info('Retrieved %d bookings for %s', len(page), email, extra={'event': 'bookings_listed', 'email': email, 'count': len(page)})
+        return add_validators(JsonResponse(paginator.get_paginated_response_data(data)), validators)
+
+    except (InvalidCursor, TimezoneError) as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': str(e)
+        }, status=400)
+
+    except Exception as e:
+        logger.error('Error retrieving bookings: %s', e, extra={'event': 'bookings_listed', 'outcome': 'error'})
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Failed to retrieve bookings'
+        }, status=500)
+
+async def get_stats(request):
+    """Class utilization per day, class type and/or instructor from the daily summary"""
+    if request.method != 'GET':
+        return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+    response = throttled_response(request, 'stats')
+    if response is not None:
+        return response
+    try:
+        stats = [summarize(row) async for row in stats_queryset_from_params(request.GET)]
+        logger.info('Retrieved %d stats rows', len(stats), extra={'event': 'stats_listed', 'count': len(stats)})
+        return JsonResponse({
+            'status': 'success',
+            'data': stats,
+            'count': len(stats)
+        })
+
+    except StatsError as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': str(e)
+        }, status=400)
+
+    except Exception as e:
+        logger.error('Error retrieving stats: %s', e, extra={'event': 'stats_listed', 'outcome': 'error'})
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Failed to retrieve stats'
+        }, status=500)
+
+async def export_bookings(request):
+    """Stream bookings as CSV or NDJSON, by class, client email and/or class dates"""
+    if request.method != 'GET':
+        return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+    response = throttled_response(request, 'export') or staff_only(await request.auser())
+    if response is not None:
+        return response
+    try:
+        fmt = get_format(request.GET)
+        rows = export_queryset_from_params(request.GET)
+    except ExportError as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': str(e)
+        }, status=400)
+
+    logger.info('Exporting bookings as %s: %s', fmt, request.GET.urlencode(), extra={'event': 'export', 'outcome': fmt})
+    # An async iterator, so ASGI streams it instead of buffering the whole export
+    response = StreamingHttpResponse(astream_export(rows, fmt), content_type=EXPORT_FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(request.GET, fmt)}"'
+    return response
+
+# ====================== TEMPLATE VIEWS ======================
+
+async def home(request):
+    """Home page showing upcoming classes"""
+    # Replaces the context processor's lazy catalog, which would read synchronously
+    return render(request, 'home.html', {'upcoming_classes': UpcomingClasses(await aget_upcoming_entries())})
+
+async def view_bookings_page(request):
+    """View bookings page"""
+    email = request.GET.get('email')
+    bookings = None
+    message = None
+
+    if email:
+        queryset = Booking.objects.active_for(email).select_related('fitness_class').order_by('-booked_at', '-id')
+        bookings = [booking async for booking in queryset.aiterator()]
+
+        if not bookings:
+            message = 'No bookings found for this email.'
+
+    return render(request, 'viewbook.html', {'bookings': bookings, 'message': message, 'email': email})
@@ -0,0 +1,178 @@
+"""Cached catalog of upcoming fitness classes.
+
+GET /classes/ is by far the hottest read, yet the catalog only changes when a
+class is edited or a booking moves ``available_slots``. The serialized payload
+is therefore kept in a Django cache (``STUDIO_CATALOG_CACHE``, local memory by
+default) under a versioned key. Writers call ``invalidate_catalog()``, which
+bumps the version once their transaction commits. A rebuild that read the
+rows before the commit is stored under the old version, so it is never
+served once the bump has happened.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+from .metrics import measure
+from .models import FitnessClass
+from .search import CatalogIndex
+from .serializers import FitnessClassSerializer
+
+CATALOG_KEY = 'studio:catalog'
+CATALOG_VERSION_KEY = 'studio:catalog:version'
+
+
+def _cache():
+    return caches[getattr(settings, 'STUDIO_CATALOG_CACHE', 'default')]
+
+
+def catalog_version():
+    """Return the current catalog version, initialising it if missing"""
+    cache = _cache()
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # Seed from the clock so payloads cached under an evicted version
+        # key are never picked up again.
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+async def acatalog_version():
+    """Async variant of catalog_version"""
+    cache = _cache()
+    if isinstance(cache, LocMemCache):
+        # In-process and non-blocking: skip the sync_to_async thread hop
+        return catalog_version()
+    version = await cache.aget(CATALOG_VERSION_KEY)
+    if version is None:
+        await cache.aadd(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+        version = await cache.aget(CATALOG_VERSION_KEY)
+    return version
+
+
+def invalidate_catalog():
+    """Drop the cached catalog once the current transaction commits; the next read rebuilds it"""
+    # Bumping earlier would let a concurrent read cache the rows that are
+    # still committed under the new version
+    transaction.on_commit(_bump_version)
+
+
+def _bump_version():
+    cache = _cache()
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def _catalog_queryset():
+    return FitnessClass.objects.upcoming().order_by('datetime', 'id')
+
+
+def _serialize_entries(classes):
+    # Serializing model instances touches no database, so this is async-safe
+    with measure('serialize'):
+        serialized = FitnessClassSerializer(classes, many=True).data
+    return [
+        (fitness_class.datetime.timestamp(), dict(data))
+        for fitness_class, data in zip(classes, serialized)
+    ]
+
+
+def catalog_entry_key(entry):
+    """Keyset ordering key of a catalog entry: (start timestamp, class id)"""
+    starts_at, data = entry
+    return (starts_at, data['id'])
+
+
+def _timeout():
+    return getattr(settings, 'STUDIO_CATALOG_TIMEOUT', 300)
+
+
+def _load_entries(key):
+    cache = _cache()
+    entries = cache.get(key)
+    if entries is None:
+        entries = _serialize_entries(list(_catalog_queryset()))
+        cache.set(key, entries, _timeout())
+    return entries
+
+
+async def _aload_entries(key):
+    cache = _cache()
+    if isinstance(cache, LocMemCache):
+        entries = cache.get(key)
+    else:
+        entries = await cache.aget(key)
+    if entries is None:
+        entries = _serialize_entries([fitness_class async for fitness_class in _catalog_queryset().aiterator()])
+        await cache.aset(key, entries, _timeout())
+    return entries
+
+
+def get_upcoming_entries():
+    """Return ``(start timestamp, serialized class)`` pairs ordered by (datetime, id)"""
+    return _still_upcoming(_load_entries(f'{CATALOG_KEY}:{catalog_version()}'))
+
+
+async def aget_upcoming_entries():
+    """Async variant of get_upcoming_entries using the async cache and ORM APIs"""
+    return _still_upcoming(await _aload_entries(f'{CATALOG_KEY}:{await acatalog_version()}'))
+
+
+# (catalog key, built at, CatalogIndex) of the latest catalog seen by this
+# process; a hit skips even the cache read and unpickling of the payload
+_index = None
+
+
+def _current_index(key):
+    current = _index
+    if current is not None and current[0] == key and time.monotonic() - current[1] < _timeout():
+        return current[2]
+    return None
+
+
+def _remember_index(key, entries):
+    global _index
+    index = CatalogIndex(entries)
+    _index = (key, time.monotonic(), index)
+    return index
+
+
+def get_catalog_index():
+    """Search index over the current catalog (see search.py), rebuilt when the version changes"""
+    key = f'{CATALOG_KEY}:{catalog_version()}'
+    return _current_index(key) or _remember_index(key, _load_entries(key))
+
+
+async def aget_catalog_index():
+    """Async variant of get_catalog_index"""
+    key = f'{CATALOG_KEY}:{await acatalog_version()}'
+    return _current_index(key) or _remember_index(key, await _aload_entries(key))
+
+
+def _still_upcoming(entries):
+    # Classes that started since the payload was built drop out here, so
+    # the cached ``is_available`` flag only depends on the slot count.
+    now = time.time()
+    return [entry for entry in entries if entry[0] > now]
+
+
+def entries_data(entries, local_times=None):
+    """Serialized classes of ``entries``, with ``local_datetime`` in the zone of ``local_times``
+
+    The cached payload is rendered in the studio zone; other zones format
+    the start times of just these entries in one pass over copies.
+    """
+    if local_times is None or local_times.is_studio_zone:
+        return [data for starts_at, data in entries]
+    texts = local_times.format_timestamps([starts_at for starts_at, data in entries])
+    return [{**data, 'local_datetime': text} for (starts_at, data), text in zip(entries, texts)]
+
+
+def get_upcoming_classes():
+    """Return serialized upcoming classes, served from cache when possible"""
+    return [data for starts_at, data in get_upcoming_entries()]
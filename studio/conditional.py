@@ -0,0 +1,102 @@
+"""Conditional GET (ETag / Last-Modified) for the polled list endpoints.
+
+Validators come from one aggregate query, ``MAX(updated_at)`` (or
+``booked_at``) plus ``COUNT(*)`` over the rows a list shows. Every write
+that changes what a list returns moves one of the two: slot changes bump
+``updated_at``, bookings are newer than everything before them, and
+cancellations or classes starting drop rows from the count. The class
+list only sends an ETag, since a count can go down without any timestamp
+moving forward. Bookings embed
+their class, so the booking validators also follow the classes'
+``updated_at`` and the start of the latest class that has begun. A matching
+``If-None-Match`` or ``If-Modified-Since`` is answered with 304 before any
+cache lookup, serialization or body rendering happens. Lists rendered in a
+client-chosen time zone (see timezones.py) get a per-zone ETag and
+``Vary: Accept-Timezone``.
+
+Django's ``condition`` decorator is not used because it calls the ETag and
+Last-Modified functions separately and synchronously, which would cost two
+queries and cannot run inside the async views.
+"""
+import calendar
+from collections import namedtuple
+
+from django.conf import settings
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .models import Booking, FitnessClass
+
+Validators = namedtuple('Validators', ['etag', 'last_modified'])
+
+
+def _validators(scope, state, zone=None, dated=True):
+    # Every other aggregate is the time of the latest change of some kind
+    count = state.pop('count')
+    last_modified = max((stamp for stamp in state.values() if stamp is not None), default=None)
+    # Microseconds in the ETag; Last-Modified only has whole seconds
+    stamp = last_modified.strftime('%Y%m%d%H%M%S%f') if last_modified else '0'
+    # The local times differ per zone, so does the representation
+    variant = f'-{zone.key}' if zone is not None and zone.key != settings.TIME_ZONE else ''
+    return Validators(
+        etag=quote_etag(f'{scope}-{count}-{stamp}{variant}'),
+        last_modified=calendar.timegm(last_modified.utctimetuple()) if dated and last_modified else None,
+    )
+
+
+# Aggregates behind the validators of each list
+CLASS_LIST_STATE = {'last_modified': Max('updated_at'), 'count': Count('id')}
+
+
+def _booking_list_state():
+    return {
+        'last_modified': Max('booked_at'),
+        'count': Count('id'),
+        # Each row embeds its class: edits and slot changes move the class's
+        # updated_at, and is_available flips when the class starts
+        'class_modified': Max('fitness_class__updated_at'),
+        'class_started': Max('fitness_class__datetime', filter=Q(fitness_class__datetime__lte=timezone.now())),
+    }
+
+
+def class_list_validators(zone=None):
+    """Validators of the upcoming-class catalog, in one query
+
+    ETag only: classes that start or are deleted leave the list without a
+    newer timestamp, so a date alone could answer 304 for a stale list.
+    """
+    return _validators('classes', FitnessClass.objects.upcoming().aggregate(**CLASS_LIST_STATE), zone, dated=False)
+
+
+async def aclass_list_validators(zone=None):
+    state = await FitnessClass.objects.upcoming().aaggregate(**CLASS_LIST_STATE)
+    return _validators('classes', state, zone, dated=False)
+
+
+def booking_list_validators(email, zone=None):
+    """Validators of a client's active bookings, in one query"""
+    return _validators('bookings', Booking.objects.active_for(email).aggregate(**_booking_list_state()), zone)
+
+
+async def abooking_list_validators(email, zone=None):
+    state = await Booking.objects.active_for(email).aaggregate(**_booking_list_state())
+    return _validators('bookings', state, zone)
+
+
+def not_modified(request, validators):
+    """A 304 response if the client's copy is current, else None"""
+    response = get_conditional_response(
+        request, etag=validators.etag, last_modified=validators.last_modified
+    )
+    # A 304 carries the validators so clients can keep revalidating
+    return add_validators(response, validators) if response is not None else None
+
+
+def add_validators(response, validators):
+    response['ETag'] = validators.etag
+    patch_vary_headers(response, ['Accept-Timezone'])
+    if validators.last_modified is not None:
+        response['Last-Modified'] = http_date(validators.last_modified)
+    return response
@@ -0,0 +1,42 @@
+"""Template context shared by the server-rendered pages."""
+from datetime import datetime, timezone as dt_timezone
+
+from django.utils.functional import cached_property
+
+from .catalog import catalog_version, get_upcoming_entries
+
+
+class UpcomingClasses:
+    """Lazy, iterable view of the cached class catalog for templates
+
+    Nothing is read until a template asks. The pages wrap the class table in
+    ``{% cache ... upcoming_classes.version upcoming_classes|length %}`` so a
+    warm fragment costs two cache lookups: no query, no row rendering. The
+    length is part of the key because classes drop out as they start, which
+    does not bump the catalog version.
+    """
+
+    def __init__(self, entries=None):
+        if entries is not None:
+            # Async views fetch the entries up front (no sync ORM in render)
+            self.entries = entries
+
+    @cached_property
+    def entries(self):
+        return get_upcoming_entries()
+
+    @cached_property
+    def version(self):
+        return catalog_version()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        for starts_at, data in self.entries:
+            # Templates format a real datetime, not the serialized string
+            yield {**data, 'datetime': datetime.fromtimestamp(starts_at, tz=dt_timezone.utc)}
+
+
+def upcoming_classes(request):
+    return {'upcoming_classes': UpcomingClasses()}
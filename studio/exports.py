@@ -0,0 +1,185 @@
+"""Streaming CSV / NDJSON exports of bookings and class rosters.
+
+Rows are read with ``.values()`` over a server-side ``.iterator()`` and
+encoded chunk by chunk, so an export of any size holds at most one chunk of
+rows in memory. No model instances or serializers are involved. Exports
+carry every matching client's name and email, so the HTTP endpoint is for
+staff only.
+"""
+import csv
+import io
+import json
+from datetime import datetime, time, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse
+from django.utils import timezone
+
+from .archive import include_past
+from .models import ArchivedBooking, Booking
+
+EXPORT_CHUNK_SIZE = 2000
+
+# Column name -> values() lookup
+EXPORT_FIELDS = {
+    'booking_id': 'id',
+    'class_id': 'fitness_class_id',
+    'class_name': 'fitness_class__name',
+    'instructor': 'fitness_class__instructor',
+    'class_datetime': 'fitness_class__datetime',
+    'client_name': 'client_name',
+    'client_email': 'client_email',
+    'booked_at': 'booked_at',
+    'is_cancelled': 'is_cancelled',
+}
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class ExportError(ValueError):
+    pass
+
+
+def _parse_date(value, name):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ExportError(f'{name} must be a date in YYYY-MM-DD format')
+
+
+def export_queryset(class_id=None, email=None, start=None, end=None, include_cancelled=False, include_past=False):
+    """Booking rows (as dicts) for a class, a client and/or a date range of classes
+
+    ``start`` and ``end`` are inclusive YYYY-MM-DD dates in the studio time zone.
+    With ``include_past`` the bookings of archived classes are exported too.
+    """
+    filters = _export_filters(class_id, email, start, end, include_cancelled)
+    rows = Booking.objects.filter(**filters).order_by().values(*EXPORT_FIELDS.values())
+    if include_past:
+        # Archived rows keep their booking ids and have the same columns, so
+        # one UNION ordered by id streams both tables as a single export
+        archived = ArchivedBooking.objects.filter(**filters).order_by().values(*EXPORT_FIELDS.values())
+        rows = rows.union(archived, all=True)
+    # Primary key order needs no sort step, so the first rows go out at once
+    # values() rather than values_list(): aiterator() cannot wrap the latter
+    return rows.order_by('id')
+
+
+def _export_filters(class_id, email, start, end, include_cancelled):
+    """filter() keywords shared by Booking and ArchivedBooking"""
+    filters = {}
+    if class_id is not None:
+        try:
+            filters['fitness_class_id'] = int(class_id)
+        except (TypeError, ValueError):
+            raise ExportError('class_id must be an integer')
+    if email:
+        filters['client_email'] = email
+    if start:
+        day = _parse_date(start, 'start')
+        filters['fitness_class__datetime__gte'] = timezone.make_aware(datetime.combine(day, time.min))
+    if end:
+        day = _parse_date(end, 'end') + timedelta(days=1)
+        filters['fitness_class__datetime__lt'] = timezone.make_aware(datetime.combine(day, time.min))
+    if not include_cancelled:
+        filters['is_cancelled'] = False
+    return filters
+
+
+def export_queryset_from_params(params):
+    """export_queryset() driven by request query parameters"""
+    return export_queryset(
+        class_id=params.get('class_id'),
+        email=params.get('email'),
+        start=params.get('start'),
+        end=params.get('end'),
+        include_cancelled=params.get('include_cancelled', '').lower() in ('1', 'true', 'yes'),
+        include_past=include_past(params),
+    )
+
+
+def staff_only(user, what='Exports'):
+    """403 JsonResponse unless ``user`` is an active staff member, else None"""
+    if user.is_active and user.is_staff:
+        return None
+    return JsonResponse({'status': 'error', 'message': f'{what} require a staff login'}, status=403)
+
+
+def get_format(params):
+    fmt = params.get('format', 'csv').lower()
+    if fmt not in EXPORT_FORMATS:
+        raise ExportError(f'format must be one of: {", ".join(EXPORT_FORMATS)}')
+    return fmt
+
+
+def _csv_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _encode_csv(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(
+        [_csv_value(row[lookup]) for lookup in EXPORT_FIELDS.values()]
+        for row in rows
+    )
+    return buffer.getvalue()
+
+
+def _encode_ndjson(rows):
+    return ''.join(
+        json.dumps({name: row[lookup] for name, lookup in EXPORT_FIELDS.items()}, cls=DjangoJSONEncoder) + '\n'
+        for row in rows
+    )
+
+
+ENCODERS = {'csv': _encode_csv, 'ndjson': _encode_ndjson}
+
+
+def _header(fmt):
+    return ','.join(EXPORT_FIELDS) + '\r\n' if fmt == 'csv' else ''
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def stream_export(queryset, fmt, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield encoded text, one chunk of rows at a time"""
+    encode = ENCODERS[fmt]
+    yield _header(fmt)
+    for chunk in _chunks(queryset.iterator(chunk_size=chunk_size), chunk_size):
+        yield encode(chunk)
+
+
+async def astream_export(queryset, fmt, chunk_size=EXPORT_CHUNK_SIZE):
+    """Async variant of stream_export for the ASGI views"""
+    encode = ENCODERS[fmt]
+    yield _header(fmt)
+    chunk = []
+    async for row in queryset.aiterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield encode(chunk)
+            chunk = []
+    if chunk:
+        yield encode(chunk)
+
+
+def export_filename(params, fmt):
+    parts = ['bookings']
+    if params.get('class_id'):
+        parts.append(f'class-{params["class_id"]}')
+    for name in ('start', 'end'):
+        if params.get(name):
+            parts.append(f'{name}-{params[name]}')
+    return f'{"-".join(parts)}.{fmt}'
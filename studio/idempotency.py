@@ -0,0 +1,101 @@
+"""``Idempotency-Key`` support for write endpoints.
+
+The first request with a given key runs the view and stores its status and
+body in a cache (``STUDIO_IDEMPOTENCY_CACHE``) for ``STUDIO_IDEMPOTENCY_TTL``
+seconds; retries with the same key get that response replayed without
+touching the database. A concurrent duplicate finds the in-flight marker
+(set with the atomic ``cache.add``) and waits for the first request's
+result instead of running the view a second time, so only one of them ever
+reaches the database. Reusing a key with a different body is rejected.
+
+5xx responses are not stored, so a retry after a server error runs again.
+"""
+import hashlib
+import json
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+_PENDING = 'pending'
+
+
+def _cache():
+    return caches[getattr(settings, 'STUDIO_IDEMPOTENCY_CACHE', 'default')]
+
+
+def _fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def _error(message, http_status):
+    return Response({'status': 'error', 'message': message}, status=http_status)
+
+
+def _replay(stored, fingerprint):
+    if stored['fingerprint'] != fingerprint:
+        return _error('Idempotency-Key was already used with a different request',
+                      status.HTTP_422_UNPROCESSABLE_ENTITY)
+    response = Response(stored['data'], status=stored['status'])
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view):
+    """Replay the stored response of requests repeating an Idempotency-Key"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view(request, *args, **kwargs)
+        if len(key) > 255:
+            return _error('Idempotency-Key must be at most 255 characters', status.HTTP_400_BAD_REQUEST)
+
+        cache = _cache()
+        ttl = getattr(settings, 'STUDIO_IDEMPOTENCY_TTL', 24 * 60 * 60)
+        cache_key = f'studio:idempotency:{view.__name__}:{key}'
+        fingerprint = _fingerprint(request)
+
+        # add() is atomic: exactly one request claims the key
+        if not cache.add(cache_key, _PENDING, timeout=getattr(settings, 'STUDIO_IDEMPOTENCY_LOCK_TTL', 30)):
+            stored = _wait_for_result(cache, cache_key)
+            if stored is None:
+                return _error('The original request with this Idempotency-Key has not completed; retry later',
+                              status.HTTP_409_CONFLICT)
+            return _replay(stored, fingerprint)
+
+        try:
+            response = view(request, *args, **kwargs)
+        except Exception:
+            cache.delete(cache_key)
+            raise
+        if response.status_code >= 500:
+            cache.delete(cache_key)
+        else:
+            cache.set(cache_key, {
+                'fingerprint': fingerprint,
+                'status': response.status_code,
+                'data': response.data,
+            }, timeout=ttl)
+        return response
+    return wrapper
+
+
+def _wait_for_result(cache, cache_key):
+    """Poll for the result of the in-flight request holding ``cache_key``"""
+    deadline = time.monotonic() + getattr(settings, 'STUDIO_IDEMPOTENCY_WAIT', 5)
+    while True:
+        stored = cache.get(cache_key)
+        if stored is None:
+            # The first request failed and released the key
+            return None
+        if stored != _PENDING:
+            return stored
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(0.02)
@@ -0,0 +1,136 @@
+"""Non-blocking, structured logging for the ``studio`` logger.
+
+``QueueListenerHandler`` only puts records on an in-memory queue; a
+background ``QueueListener`` thread does the JSON formatting and the file
+and console writes, so request threads never wait on disk I/O. Threads do
+not survive ``fork()``, so each process starts its own listener on its
+first record (preloading servers configure logging before they fork).
+``RequestContextFilter`` stamps each record with the view and the time
+elapsed in the current request, and ``SamplingFilter`` drops a share of the
+high-volume events before any work is done for them. Views log with lazy
+%-style arguments plus structured ``extra`` fields (``event``,
+``class_id``, ``outcome``, ...), which ``JsonFormatter`` writes as one JSON
+object per line.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import time
+from logging.config import ConvertingList
+from logging.handlers import QueueHandler, QueueListener
+
+from .metrics import current_request_stats
+
+# Structured fields copied from ``extra`` into the JSON line when present
+STRUCTURED_FIELDS = (
+    'event', 'view', 'method', 'class_id', 'booking_id', 'email',
+    'outcome', 'code', 'count', 'elapsed_ms',
+)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        payload = {
+            'ts': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                payload[field] = value
+        if record.exc_info:
+            payload['exc'] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """Add the resolved view and the elapsed request time to each record"""
+
+    def filter(self, record):
+        stats = current_request_stats()
+        if stats is not None and stats.request is not None:
+            match = getattr(stats.request, 'resolver_match', None)
+            if match and not hasattr(record, 'view'):
+                record.view = match.view_name
+            record.method = stats.request.method
+            record.elapsed_ms = round((time.perf_counter() - stats.started) * 1000, 2)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only ``rates[event]`` (0..1) of the records tagged with ``event``"""
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = rates or {}
+
+    def filter(self, record):
+        rate = self.rates.get(getattr(record, 'event', None))
+        if rate is None or rate >= 1:
+            return True
+        return random.random() < rate
+
+
+def _resolve_handlers(handlers):
+    # dictConfig hands over 'cfg://handlers.x' references lazily; indexing
+    # the ConvertingList resolves them to the configured handler objects
+    if isinstance(handlers, ConvertingList):
+        return [handlers[i] for i in range(len(handlers))]
+    return list(handlers)
+
+
+class QueueListenerHandler(logging.Handler):
+    """Hand records to a QueueListener thread that feeds ``targets``
+
+    Not a QueueHandler subclass: newer dictConfig versions take those over
+    and build their own listener.
+    """
+
+    def __init__(self, targets, maxsize=10000):
+        super().__init__()
+        self.targets = _resolve_handlers(targets)
+        self.maxsize = maxsize
+        self.queue = None
+        self.listener = None
+        # Process that owns the listener; started lazily, see _start()
+        self._pid = None
+        atexit.register(self.close)
+
+    def _start(self):
+        # A forked worker inherits the parent's queue but not its thread;
+        # without a listener of its own the queue would fill and drop
+        # every record. handle() holds the handler lock around emit().
+        self.queue = queue.Queue(self.maxsize)
+        self._prepare = QueueHandler(self.queue).prepare
+        self.listener = QueueListener(self.queue, *self.targets, respect_handler_level=True)
+        self.listener.start()
+        self._pid = os.getpid()
+
+    def _running(self):
+        return self._pid == os.getpid() and self.listener._thread is not None
+
+    def emit(self, record):
+        try:
+            if self._pid != os.getpid():
+                self._start()
+            self.queue.put_nowait(self._prepare(record))
+        except queue.Full:
+            # Shed load rather than block the request behind a slow disk
+            pass
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        """Block until the listener has written everything queued so far"""
+        if self._running():
+            self.queue.join()
+
+    def close(self):
+        if self._running():
+            self.listener.stop()
+        super().close()
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from studio.archive import ARCHIVE_BATCH_SIZE, archivable, archive_classes, archive_cutoff
+from studio.models import Booking
+
+
+class Command(BaseCommand):
+    help = 'Move classes past the retention window, with their bookings, into the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, metavar='DAYS',
+                            help='Archive classes that started more than DAYS ago (default STUDIO_ARCHIVE_AFTER_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE, help='Classes per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be archived')
+
+    def handle(self, *args, **options):
+        if options['older_than'] is not None and options['older_than'] < 0:
+            raise CommandError('--older-than must not be negative')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        cutoff = archive_cutoff(options['older_than'])
+        if options['dry_run']:
+            classes = archivable(cutoff)
+            bookings = Booking.objects.filter(fitness_class__in=classes)
+            self.stdout.write(self.style.SUCCESS(
+                f'Would archive {classes.count()} classes and {bookings.count()} bookings '
+                f'that started before {cutoff:%Y-%m-%d %H:%M %Z}'
+            ))
+            return
+
+        started = time.perf_counter()
+        classes, bookings = archive_classes(cutoff, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {classes} classes and {bookings} bookings in {time.perf_counter() - started:.1f}s'
+        ))
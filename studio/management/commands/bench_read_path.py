@@ -0,0 +1,82 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from studio.metrics import percentile
+from studio.urls import async_urlpatterns, sync_urlpatterns
+
+
+class SyncStack:
+    urlpatterns = sync_urlpatterns
+
+
+class AsyncStack:
+    urlpatterns = async_urlpatterns
+
+
+_local = threading.local()
+
+
+def _sync_get(path):
+    client = getattr(_local, 'client', None)
+    if client is None:
+        client = _local.client = Client()
+    started = time.perf_counter()
+    response = client.get(path)
+    return time.perf_counter() - started, response.status_code
+
+
+class Command(BaseCommand):
+    help = 'Compare requests/sec of the sync (WSGI) and async (ASGI) read views at high concurrency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='Path to request (repeatable); default /classes/')
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per stack')
+        parser.add_argument('--concurrency', type=int, default=64, help='Requests in flight')
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or ['/classes/']
+        jobs = [paths[i % len(paths)] for i in range(options['requests'])]
+        concurrency = options['concurrency']
+
+        self.stdout.write(f"{'stack':<6} {'requests':>8} {'conc':>5} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>6}")
+        # Benchmarks measure the request path, not the rate limiter
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], STUDIO_THROTTLE_RATES={}):
+            with override_settings(ROOT_URLCONF=SyncStack):
+                self._report('wsgi', concurrency, *self._run_sync(jobs, concurrency))
+            with override_settings(ROOT_URLCONF=AsyncStack):
+                self._report('asgi', concurrency, *asyncio.run(self._run_async(jobs, concurrency)))
+
+    def _run_sync(self, jobs, concurrency):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(_sync_get, jobs))
+        return results, time.perf_counter() - started
+
+    async def _run_async(self, jobs, concurrency):
+        client = AsyncClient()
+        gate = asyncio.Semaphore(concurrency)
+
+        async def get(path):
+            async with gate:
+                started = time.perf_counter()
+                response = await client.get(path)
+                return time.perf_counter() - started, response.status_code
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(get(path) for path in jobs))
+        return results, time.perf_counter() - started
+
+    def _report(self, stack, concurrency, results, duration):
+        latencies = sorted(elapsed for elapsed, _ in results)
+        errors = sum(1 for _, code in results if code >= 400)
+        self.stdout.write(
+            f'{stack:<6} {len(results):>8} {concurrency:>5} {len(results) / duration:>9.1f} '
+            f'{percentile(latencies, 50) * 1000:>8.1f} {percentile(latencies, 99) * 1000:>8.1f} {errors:>6}'
+        )
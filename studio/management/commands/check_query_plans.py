@@ -0,0 +1,118 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.client import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from studio.analytics import stats_queryset
+from studio.archive import ARCHIVE_BATCH_SIZE, CLASS_FIELDS, archivable
+from studio.catalog import _catalog_queryset
+from studio.conditional import booking_list_validators, class_list_validators
+from studio.exports import export_queryset
+from studio.models import ArchivedBooking, FitnessClass, Booking, WaitlistEntry
+from studio.pagination import KeysetPagination
+from studio.reconcile import find_drift
+from studio.services import waitlist_position
+
+# "SCAN studio_booking" (optionally "USING INDEX ...") means every row of the
+# table or index is visited; SEARCH lines are index range lookups.
+FULL_SCAN = re.compile(r'\bSCAN (?!CONSTANT ROW)(\w+)')
+
+BOOKING_ORDERING = ('-booked_at', '-id')
+
+
+def _paginator(email, after=None):
+    """The bookings paginator of a first page, or of the page after ``after``"""
+    params = {'email': email}
+    if after is not None:
+        params['cursor'] = KeysetPagination(RequestFactory().get('/bookings/'))._encode(after, False)
+    return KeysetPagination(RequestFactory().get('/bookings/', params))
+
+
+def hot_queries():
+    """The queries each view issues, built by the helpers the views call
+
+    Each entry is a queryset, or a callable that runs a helper whose
+    queries are all explained (aggregates and paginated pages).
+    """
+    now = timezone.now()
+    today = timezone.localdate().isoformat()
+    email = 'plan-check@example.com'
+    waiter = WaitlistEntry(id=1, fitness_class_id=1)
+
+    def bookings():
+        return Booking.objects.active_for(email).select_related('fitness_class')
+
+    def archived():
+        return ArchivedBooking.objects.active_for(email).select_related('fitness_class')
+
+    return [
+        ('get_classes: catalog rebuild', _catalog_queryset()),
+        ('get_classes: validators', class_list_validators),
+        ('get_bookings: validators', lambda: booking_list_validators(email)),
+        ('get_bookings: first page',
+         lambda: _paginator(email).paginate_queryset(bookings(), BOOKING_ORDERING)),
+        ('get_bookings: next page',
+         lambda: _paginator(email, (now, 1)).paginate_queryset(bookings(), BOOKING_ORDERING)),
+        ('get_bookings?include_past=1: next page',
+         lambda: _paginator(email, (now, 1)).paginate_querysets([bookings(), archived()], BOOKING_ORDERING)),
+        ('book_class: class lookup',
+         FitnessClass.objects.filter(id=1)),
+        ('book_class: slot reservation',
+         FitnessClass.objects.filter(pk=1, available_slots__gte=1, datetime__gt=now)),
+        ('class_waitlist: entry lookup',
+         WaitlistEntry.objects.waiting().filter(fitness_class_id=1, client_email=email)),
+        ('class_waitlist: position', lambda: waitlist_position(waiter)),
+        ('promote_waitlist: next waiters',
+         WaitlistEntry.objects.waiting().filter(fitness_class_id=1)[:1]),
+        ('home / book_class_page: upcoming classes',
+         FitnessClass.objects.upcoming().order_by('datetime', 'id')),
+        ('view_bookings_page: bookings by email',
+         bookings().order_by(*BOOKING_ORDERING)),
+        ('get_stats: summary by class type and instructor',
+         stats_queryset('class_type,instructor', start=today, end=today)),
+        ('export_bookings: class roster', export_queryset(class_id=1)),
+        ('export_bookings: client history with the archive',
+         export_queryset(email=email, include_past=True)),
+        ('reconcile_slots --since: changed classes', lambda: find_drift(now)),
+        ('archive_classes: next batch',
+         archivable(now).order_by('datetime', 'id').values(*CLASS_FIELDS)[:ARCHIVE_BATCH_SIZE]),
+    ]
+
+
+def explain(query):
+    """EXPLAIN QUERY PLAN of a queryset, or of every query a callable runs"""
+    if not callable(query):
+        return query.explain()
+    with CaptureQueriesContext(connection) as captured:
+        query()
+    plans = []
+    with connection.cursor() as cursor:
+        for executed in captured.captured_queries:
+            cursor.execute(f'EXPLAIN QUERY PLAN {executed["sql"]}')
+            plans.extend(row[-1] for row in cursor.fetchall())
+    return '\n'.join(plans)
+
+
+class Command(BaseCommand):
+    help = 'Run EXPLAIN QUERY PLAN for every hot view query and fail on full table scans'
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('check_query_plans only understands SQLite query plans')
+
+        queries = hot_queries()
+        failures = []
+        for label, query in queries:
+            plan = explain(query)
+            scans = FULL_SCAN.findall(plan)
+            self.stdout.write(f'{label}:')
+            for line in plan.splitlines():
+                self.stdout.write(f'    {line}')
+            if scans:
+                failures.append(f"{label} scans {', '.join(scans)}")
+
+        if failures:
+            raise CommandError('Full table scans found:\n' + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS(f'All {len(queries)} hot queries use indexes'))
@@ -0,0 +1,44 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from studio.exports import EXPORT_FORMATS, ExportError, export_queryset, stream_export
+
+
+class Command(BaseCommand):
+    help = 'Stream bookings as CSV or NDJSON, by class, client email and/or class dates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--class-id', type=int, help='Roster of one class')
+        parser.add_argument('--email', help='Booking history of one client')
+        parser.add_argument('--start', help='First class date, YYYY-MM-DD (inclusive)')
+        parser.add_argument('--end', help='Last class date, YYYY-MM-DD (inclusive)')
+        parser.add_argument('--include-cancelled', action='store_true', help='Include cancelled bookings')
+        parser.add_argument('--include-past', action='store_true', help='Include bookings of archived classes')
+        parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--output', '-o', help='Write to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        try:
+            rows = export_queryset(
+                class_id=options['class_id'],
+                email=options['email'],
+                start=options['start'],
+                end=options['end'],
+                include_cancelled=options['include_cancelled'],
+                include_past=options['include_past'],
+            )
+        except ExportError as e:
+            raise CommandError(str(e))
+
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as out:
+                self._write(rows, options['format'], out)
+        else:
+            self._write(rows, options['format'], self.stdout)
+
+    def _write(self, rows, fmt, out):
+        for chunk in stream_export(rows, fmt):
+            if out is self.stdout:
+                out.write(chunk, ending='')
+            else:
+                out.write(chunk)
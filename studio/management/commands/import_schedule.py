@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from studio.schedule import ScheduleError, expand_schedule, import_classes, read_timetable
+
+
+class Command(BaseCommand):
+    help = 'Create classes from a recurring schedule or a CSV timetable'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--csv', dest='timetable',
+                            help='CSV timetable with columns name,instructor,start_date,time,total_slots[,days,weeks]')
+        parser.add_argument('--name', help='Class type, e.g. YOGA')
+        parser.add_argument('--instructor')
+        parser.add_argument('--days', help='Weekdays, e.g. Mon/Wed; omit for a one-off class')
+        parser.add_argument('--time', help='Start time HH:MM in the studio time zone')
+        parser.add_argument('--weeks', type=int, default=1, help='Number of weeks to repeat')
+        parser.add_argument('--slots', type=int, help='Capacity of each class')
+        parser.add_argument('--start-date', help='First day, YYYY-MM-DD (default today)')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be created')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            if options['timetable']:
+                with open(options['timetable'], newline='', encoding='utf-8') as timetable:
+                    classes = read_timetable(timetable)
+            else:
+                classes = expand_schedule(
+                    name=options['name'],
+                    instructor=options['instructor'],
+                    start_time=options['time'],
+                    total_slots=options['slots'],
+                    days=options['days'],
+                    weeks=options['weeks'],
+                    start_date=options['start_date'],
+                )
+        except (OSError, ScheduleError) as e:
+            raise CommandError(str(e))
+
+        created, skipped = import_classes(classes, dry_run=options['dry_run'])
+        verb = 'Would create' if options['dry_run'] else 'Created'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {len(created)} classes, skipped {len(skipped)} duplicates '
+            f'in {time.perf_counter() - started:.2f}s'
+        ))
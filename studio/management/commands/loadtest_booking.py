@@ -0,0 +1,153 @@
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from studio.metrics import percentile
+from studio.models import FitnessClass, Booking
+
+_local = threading.local()
+
+
+def _detect_lock(execute, sql, params, many, context):
+    try:
+        return execute(sql, params, many, context)
+    except Exception as e:
+        if 'locked' in str(e):
+            context['connection'].studio_lock_errors = getattr(context['connection'], 'studio_lock_errors', 0) + 1
+        raise
+
+
+def fire_booking(job):
+    """POST one booking through the real URLconf; runs in a worker thread or process"""
+    class_id, email = job
+    client = getattr(_local, 'client', None)
+    if client is None:
+        client = _local.client = Client()
+
+    connection.studio_lock_errors = 0
+    with connection.execute_wrapper(_detect_lock):
+        started = time.perf_counter()
+        response = client.post(reverse('api_book_class'), {
+            'class_id': class_id,
+            'client_name': 'Load Test',
+            'client_email': email
+        }, content_type='application/json')
+        elapsed = time.perf_counter() - started
+    return elapsed, response.status_code, connection.studio_lock_errors
+
+
+class Command(BaseCommand):
+    help = 'Fire concurrent bookings through the booking view and check for overselling'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--class-id', type=int, action='append', dest='class_ids',
+                            help='Target an existing class (repeatable); default creates fresh classes')
+        parser.add_argument('--classes', type=int, default=1, help='Number of classes to create')
+        parser.add_argument('--slots', type=int, default=50, help='Capacity of each created class')
+        parser.add_argument('--requests', type=int, default=200, help='Total booking requests to fire')
+        parser.add_argument('--concurrency', type=int, default=16, help='Worker threads or processes')
+        parser.add_argument('--processes', action='store_true', help='Use a process pool instead of threads')
+        parser.add_argument('--keep', action='store_true', help='Keep the classes created for the run')
+
+    def handle(self, *args, **options):
+        created = []
+        if options['class_ids']:
+            class_ids = options['class_ids']
+            if FitnessClass.objects.filter(pk__in=class_ids).count() != len(set(class_ids)):
+                raise CommandError('Unknown --class-id')
+        else:
+            starts_at = timezone.now() + timedelta(days=1)
+            created = [
+                FitnessClass.objects.create(
+                    name='HIIT',
+                    instructor='Load Test',
+                    datetime=starts_at,
+                    total_slots=options['slots'],
+                    available_slots=options['slots']
+                )
+                for _ in range(options['classes'])
+            ]
+            class_ids = [fitness_class.id for fitness_class in created]
+
+        # Unique emails, so capacity (not duplicates) is what runs out
+        run = uuid.uuid4().hex[:8]
+        jobs = [
+            (class_ids[i % len(class_ids)], f'load-{run}-{i}@example.com')
+            for i in range(options['requests'])
+        ]
+
+        try:
+            results, duration = self._run(jobs, options['concurrency'], options['processes'])
+            self._report(results, duration)
+            self._check_oversell(class_ids)
+        finally:
+            if created and not options['keep']:
+                FitnessClass.objects.filter(pk__in=class_ids).delete()
+
+    def _run(self, jobs, concurrency, processes):
+        # The test client talks to "testserver"
+        # Benchmarks measure the request path, not the rate limiter
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], STUDIO_THROTTLE_RATES={}):
+            if processes:
+                # Forked workers must not share the parent's database connection
+                connections.close_all()
+                pool = ProcessPoolExecutor(concurrency, mp_context=multiprocessing.get_context('fork'))
+            else:
+                pool = ThreadPoolExecutor(concurrency)
+            started = time.perf_counter()
+            with pool:
+                results = list(pool.map(fire_booking, jobs))
+            return results, time.perf_counter() - started
+
+    def _report(self, results, duration):
+        latencies = sorted(elapsed for elapsed, _, _ in results)
+        statuses = [code for _, code, _ in results]
+        booked = statuses.count(201)
+        rejected = sum(1 for code in statuses if 400 <= code < 500)
+        errors = sum(1 for code in statuses if code >= 500)
+        lock_errors = sum(locks for _, _, locks in results)
+
+        self.stdout.write(f'Requests:     {len(results)} in {duration:.2f}s')
+        self.stdout.write(f'Throughput:   {len(results) / duration if duration else 0:.1f} req/s')
+        self.stdout.write(
+            'Latency (ms): p50={:.1f} p95={:.1f} p99={:.1f} max={:.1f}'.format(
+                percentile(latencies, 50) * 1000,
+                percentile(latencies, 95) * 1000,
+                percentile(latencies, 99) * 1000,
+                (latencies[-1] if latencies else 0) * 1000,
+            )
+        )
+        self.stdout.write(f'Booked:       {booked}')
+        self.stdout.write(f'Rejected:     {rejected}')
+        self.stdout.write(f'Errors:       {errors}')
+        self.stdout.write(f'Lock errors:  {lock_errors}')
+
+    def _check_oversell(self, class_ids):
+        active = dict(
+            Booking.objects.filter(fitness_class_id__in=class_ids, is_cancelled=False)
+            .values_list('fitness_class').annotate(n=Count('id'))
+        )
+        problems = []
+        for fitness_class in FitnessClass.objects.filter(pk__in=class_ids):
+            booked = active.get(fitness_class.id, 0)
+            if booked > fitness_class.total_slots:
+                problems.append(f'class {fitness_class.id} oversold: {booked} bookings for {fitness_class.total_slots} slots')
+            elif fitness_class.available_slots != fitness_class.total_slots - booked:
+                problems.append(
+                    f'class {fitness_class.id} counter drift: available_slots={fitness_class.available_slots}, '
+                    f'expected {fitness_class.total_slots - booked}'
+                )
+        if problems:
+            raise CommandError('Oversell check failed:\n' + '\n'.join(problems))
+        self.stdout.write(self.style.SUCCESS('Oversell check passed'))
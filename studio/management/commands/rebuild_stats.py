@@ -0,0 +1,15 @@
+import time
+
+from django.core.management.base import BaseCommand
+from studio.analytics import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily utilization summary behind /stats/ from classes and bookings'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        rows = rebuild_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {rows} daily summary rows in {time.perf_counter() - started:.1f}s'
+        ))
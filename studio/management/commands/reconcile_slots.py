@@ -0,0 +1,62 @@
+import re
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from studio.reconcile import SlotReconciler, reconcile_slots
+
+RELATIVE_SINCE = re.compile(r'^(\d+)([mhd])$')
+UNITS = {'m': 'minutes', 'h': 'hours', 'd': 'days'}
+
+
+def parse_since(value):
+    """'30m' / '2h' / '1d' ago, or an ISO datetime (studio time zone if naive)"""
+    match = RELATIVE_SINCE.match(value)
+    if match:
+        return timezone.now() - timedelta(**{UNITS[match.group(2)]: int(match.group(1))})
+    try:
+        since = datetime.fromisoformat(value)
+    except ValueError:
+        raise CommandError('--since must be an ISO datetime or a duration like 30m, 2h or 1d')
+    return timezone.make_aware(since) if timezone.is_naive(since) else since
+
+
+class Command(BaseCommand):
+    help = 'Recompute available_slots from the active bookings and repair drifted classes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=parse_since,
+                            help='Only classes updated since then: ISO datetime or 30m / 2h / 1d')
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without repairing it')
+        parser.add_argument('--every', type=float, metavar='SECONDS',
+                            help='Keep running; between full passes only check classes changed since the last one')
+        parser.add_argument('--full-every', type=float, metavar='SECONDS',
+                            help='With --every, check every class this often (default STUDIO_RECONCILE_FULL_INTERVAL)')
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        if not options['every']:
+            self._report(options['since'], reconcile_slots(since=options['since'], dry_run=self.dry_run))
+            return
+        # Run one of these per deployment, not one per server process
+        reconciler = SlotReconciler(
+            options['every'], full_interval=options['full_every'], since=options['since'],
+            dry_run=self.dry_run, on_result=self._report,
+        )
+        try:
+            reconciler.run()
+        except KeyboardInterrupt:
+            pass
+
+    def _report(self, since, result):
+        for drift in result.drift:
+            self.stdout.write(
+                f'class {drift.class_id}: available_slots {drift.available}, expected {drift.expected} '
+                f'({drift.total_slots} slots, {drift.active} active bookings)'
+            )
+        verb = 'would repair' if self.dry_run else f'repaired {result.repaired}'
+        scope = 'changed' if since is not None else 'all'
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {result.checked} classes ({scope}), {len(result.drift)} drifted, {verb} '
+            f'in {result.elapsed:.2f}s'
+        ))
@@ -1,12 +1,50 @@
-from django.core.management.base import BaseCommand
-from django.utils import timezone
+import random
+import time
 from datetime import timedelta
-from studio.models import FitnessClass
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from studio.analytics import rebuild_stats
+from studio.catalog import invalidate_catalog
+from studio.models import ArchivedBooking, ArchivedClass, Booking, FitnessClass, WaitlistEntry
+
+INSTRUCTORS = [
+    'Priya Sharma', 'Rahul Gupta', 'Anjali Verma', 'Suresh Kumar', 'Meera Patel',
+    'Karan Singh', 'Neha Iyer', 'Vikram Rao', 'Divya Nair', 'Arjun Mehta',
+]
+FIRST_NAMES = ['Aarav', 'Diya', 'Ishaan', 'Kavya', 'Rohan', 'Sneha', 'Aditya', 'Pooja', 'Nikhil', 'Riya']
+LAST_NAMES = ['Sharma', 'Gupta', 'Reddy', 'Iyer', 'Patel', 'Singh', 'Das', 'Menon', 'Joshi', 'Khan']
+
+# Studio hours with the before-work and after-work peaks weighted up
+HOUR_WEIGHTS = {
+    6: 6, 7: 9, 8: 7, 9: 4, 10: 3, 11: 2, 12: 3, 13: 2,
+    14: 1, 15: 1, 16: 2, 17: 5, 18: 9, 19: 8, 20: 4,
+}
+
 
 class Command(BaseCommand):
-    help = 'Seed database with sample fitness classes'
-    
+    help = 'Seed database with sample fitness classes, or generate a synthetic data set'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--classes', type=int,
+                            help='Generate this many classes instead of the six samples')
+        parser.add_argument('--bookings', type=int, default=0,
+                            help='Bookings to spread over the generated classes')
+        parser.add_argument('--days', type=int, default=30,
+                            help='Days of upcoming schedule, starting tomorrow')
+        parser.add_argument('--past-days', type=int, default=0,
+                            help='Days of already finished schedule before today')
+        parser.add_argument('--clients', type=int,
+                            help='Size of the client pool (default: bookings / 5)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; same seed, same data')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per INSERT batch')
+
     def handle(self, *args, **options):
+        if options['classes'] is not None:
+            return self._generate(options)
+
         # Clear existing classes
         FitnessClass.objects.all().delete()
         
@@ -63,4 +101,114 @@ class Command(BaseCommand):
         
         self.stdout.write(
             self.style.SUCCESS(f'Successfully created {len(classes_data)} fitness classes')
-        )
\ No newline at end of file
+        )
+
+    def _generate(self, options):
+        n_classes, n_bookings, days = options['classes'], options['bookings'], options['days']
+        past_days, batch_size = options['past_days'], options['batch_size']
+        if n_classes < 1 or n_bookings < 0 or min(days, past_days) < 0 or days + past_days < 1:
+            raise CommandError('--classes must be positive and --days/--past-days must cover at least one day')
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive')
+
+        rng = random.Random(options['seed'])
+        started = time.perf_counter()
+        with transaction.atomic():
+            self._clear()
+            clients = options['clients'] or max(n_bookings // 5, 100)
+            classes, fill = self._plan_classes(rng, n_classes, n_bookings, days, past_days, clients)
+            for batch in _batched(classes, batch_size):
+                FitnessClass.objects.bulk_create(batch)
+
+            # bulk_create sends no post_save, so the slots taken by these
+            # bookings are already accounted for in available_slots
+            booked = 0
+            for batch in _batched(self._bookings(rng, classes, fill, clients), batch_size):
+                Booking.objects.bulk_create(batch)
+                booked += len(batch)
+            # ... nor do the utilization counters see them
+            rebuild_stats()
+        invalidate_catalog()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {len(classes)} classes and {booked} bookings in {elapsed:.1f}s '
+            f'(seed {options["seed"]})'
+        ))
+        if booked < n_bookings:
+            self.stdout.write(self.style.WARNING(
+                f'Only {booked} of {n_bookings} bookings fit into the generated capacity'
+            ))
+
+    def _clear(self):
+        # Row-by-row deletes would fire the slot signals for every booking;
+        # the whole studio is being replaced, so plain DELETEs are enough.
+        with connection.cursor() as cursor:
+            for model in (WaitlistEntry, Booking, FitnessClass, ArchivedBooking, ArchivedClass):
+                cursor.execute(f'DELETE FROM {connection.ops.quote_name(model._meta.db_table)}')
+
+    def _plan_classes(self, rng, n_classes, n_bookings, days, past_days, clients):
+        """Build unsaved classes and how many bookings each one gets"""
+        today = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+        hours, weights = list(HOUR_WEIGHTS), list(HOUR_WEIGHTS.values())
+        names = [code for code, label in FitnessClass.CLASS_TYPES]
+
+        planned = []
+        for _ in range(n_classes):
+            # Finished classes fall before today, upcoming ones from tomorrow
+            day = rng.randrange(past_days + days) - past_days
+            if day >= 0:
+                day += 1
+            hour = rng.choices(hours, weights)[0]
+            starts = today + timedelta(days=day, hours=hour, minutes=rng.choice((0, 15, 30, 45)))
+            total = rng.randint(10, 30)
+            fitness_class = FitnessClass(
+                name=rng.choice(names),
+                instructor=rng.choice(INSTRUCTORS),
+                datetime=starts,
+                total_slots=total,
+                available_slots=total,
+            )
+            # Peak hours fill up first, with a long tail of popular classes
+            planned.append((fitness_class, HOUR_WEIGHTS[hour] * rng.lognormvariate(0, 0.6)))
+        planned.sort(key=lambda pair: pair[0].datetime)
+        classes = [fitness_class for fitness_class, _ in planned]
+        demand = [weight for _, weight in planned]
+        # A client books a class at most once
+        capacity = [min(c.total_slots, clients) for c in classes]
+
+        # Spread the bookings by demand, then hand what overflows a full
+        # class to the classes that still have room
+        scale = n_bookings / sum(demand)
+        fill = [min(int(d * scale), cap) for d, cap in zip(demand, capacity)]
+        missing = n_bookings - sum(fill)
+        for i in sorted(range(n_classes), key=demand.__getitem__, reverse=True):
+            if missing <= 0:
+                break
+            extra = min(capacity[i] - fill[i], missing)
+            fill[i] += extra
+            missing -= extra
+        for fitness_class, taken in zip(classes, fill):
+            fitness_class.available_slots = fitness_class.total_slots - taken
+        return classes, fill
+
+    def _bookings(self, rng, classes, fill, clients):
+        now = timezone.now()
+        for fitness_class, taken in zip(classes, fill):
+            if not taken:
+                continue
+            # Most bookings land in the last few days before the class
+            opens = min(fitness_class.datetime, now)
+            for client in rng.sample(range(clients), taken):
+                yield Booking(
+                    fitness_class=fitness_class,
+                    client_name=f'{FIRST_NAMES[client % 10]} {LAST_NAMES[client // 10 % 10]}',
+                    client_email=f'client{client:07d}@example.com',
+                    booked_at=opens - timedelta(hours=rng.expovariate(1 / 48)),
+                )
+
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
\ No newline at end of file
@@ -0,0 +1,222 @@
+"""Per-request performance instrumentation.
+
+``PerformanceMiddleware`` times every request, counts and times its database
+queries through an execute wrapper installed on every connection and collects
+serializer time reported by views via ``measure('serialize')``. Per-request
+state lives in a context variable, so queries the async views run through
+``sync_to_async`` are still attributed to the right request. The numbers are added to a
+``Server-Timing`` response header and to in-process histograms exposed in
+Prometheus text format by the ``/metrics`` view, which needs a staff
+session or the ``STUDIO_METRICS_TOKEN`` bearer token. Each worker process
+keeps its own registry; scrape every worker (or aggregate) when running
+several.
+"""
+import hmac
+import math
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connection
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+_current = ContextVar('studio_request_stats', default=None)
+
+
+class RequestStats:
+    def __init__(self, request=None):
+        self.request = request
+        self.started = time.perf_counter()
+        self.db_count = 0
+        self.db_time = 0.0
+        self.phases = {}
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+
+def current_request_stats():
+    """RequestStats of the request being handled, or None outside a request"""
+    return _current.get()
+
+
+def time_query(execute, sql, params, many, context):
+    """Execute wrapper charging each query to the current request, if any"""
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db_time += time.perf_counter() - started
+        stats.db_count += 1
+
+
+def install_query_timer(connection):
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+@contextmanager
+def measure(phase):
+    """Attribute the wall time of the block to ``phase`` of the current request"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats = _current.get()
+        if stats is not None:
+            stats.add(phase, time.perf_counter() - started)
+
+
+def has_scrape_token(request):
+    """Whether ``request`` carries ``Authorization: Bearer <STUDIO_METRICS_TOKEN>``"""
+    token = settings.STUDIO_METRICS_TOKEN
+    scheme, _, given = request.headers.get('Authorization', '').partition(' ')
+    return bool(token) and scheme.lower() == 'bearer' and hmac.compare_digest(given.encode(), token.encode())
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[rank]
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels, value):
+        counts, total = self.series.get(labels) or ([0] * (len(self.buckets) + 1), 0.0)
+        counts[bisect_left(self.buckets, value)] += 1
+        self.series[labels] = (counts, total + value)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for labels, (counts, total) in sorted(self.series.items()):
+            label_text = _labels(labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {total}')
+            lines.append(f'{self.name}_count{{{label_text}}} {cumulative}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.series = {}
+
+    def inc(self, labels):
+        self.series[labels] = self.series.get(labels, 0) + 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        for labels, value in sorted(self.series.items()):
+            lines.append(f'{self.name}{{{_labels(labels)}}} {value}')
+        return lines
+
+
+def _labels(labels):
+    return ','.join(f'{key}="{value}"' for key, value in labels)
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = Counter('studio_requests_total', 'Requests by view, method and status')
+        self.duration = Histogram(
+            'studio_request_duration_seconds', 'Wall time per request', DURATION_BUCKETS)
+        self.db_time = Histogram(
+            'studio_db_duration_seconds', 'Database time per request', DURATION_BUCKETS)
+        self.db_queries = Histogram(
+            'studio_db_queries_per_request', 'Database queries per request', QUERY_COUNT_BUCKETS)
+        self.serializer_time = Histogram(
+            'studio_serializer_duration_seconds', 'Serializer time per request', DURATION_BUCKETS)
+
+    def record(self, view, method, status_code, duration, stats):
+        labels = (('view', view), ('method', method))
+        with self._lock:
+            self.requests.inc(labels + (('status', str(status_code)),))
+            self.duration.observe(labels, duration)
+            self.db_time.observe(labels, stats.db_time)
+            self.db_queries.observe(labels, stats.db_count)
+            self.serializer_time.observe(labels, stats.phases.get('serialize', 0.0))
+
+    def render(self):
+        with self._lock:
+            lines = []
+            for metric in (self.requests, self.duration, self.db_time, self.db_queries, self.serializer_time):
+                lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._lock:
+            for metric in (self.requests, self.duration, self.db_time, self.db_queries, self.serializer_time):
+                metric.series.clear()
+
+
+REGISTRY = Registry()
+
+
+class PerformanceMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Stay native under ASGI so async views aren't pushed into threads
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        install_query_timer(connection)
+        stats = RequestStats(request)
+        token = _current.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, stats, time.perf_counter() - stats.started)
+
+    async def __acall__(self, request):
+        stats = RequestStats(request)
+        token = _current.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, stats, time.perf_counter() - stats.started)
+
+    def _finish(self, request, response, stats, duration):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        REGISTRY.record(view, request.method, response.status_code, duration, stats)
+        response['Server-Timing'] = server_timing(duration, stats)
+        return response
+
+
+def server_timing(duration, stats):
+    parts = [f'db;dur={stats.db_time * 1000:.2f};desc="{stats.db_count} queries"']
+    parts.extend(f'{phase};dur={seconds * 1000:.2f}' for phase, seconds in stats.phases.items())
+    parts.append(f'total;dur={duration * 1000:.2f}')
+    return ', '.join(parts)
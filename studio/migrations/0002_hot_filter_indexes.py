@@ -0,0 +1,21 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('studio', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(condition=models.Q(('is_cancelled', False)), fields=['client_email', '-booked_at', '-id'], name='studio_booking_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fitnessclass',
+            index=models.Index(fields=['datetime', 'id'], name='studio_class_datetime_idx'),
+        ),
+    ]
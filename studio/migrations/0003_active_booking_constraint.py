@@ -0,0 +1,21 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('studio', '0002_hot_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='booking',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='booking',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_cancelled', False)), fields=('fitness_class', 'client_email'), name='studio_unique_active_booking'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:41
+
+import django.core.validators
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('studio', '0003_active_booking_constraint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('client_name', models.CharField(max_length=100)),
+                ('client_email', models.EmailField(max_length=254, validators=[django.core.validators.EmailValidator()])),
+                ('joined_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('promoted_at', models.DateTimeField(blank=True, null=True)),
+                ('fitness_class', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist', to='studio.fitnessclass')),
+                ('promoted_booking', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='waitlist_entry', to='studio.booking')),
+            ],
+            options={
+                'verbose_name_plural': 'Waitlist Entries',
+                'ordering': ['id'],
+                'indexes': [models.Index(condition=models.Q(('promoted_at__isnull', True)), fields=['fitness_class', 'id'], name='studio_waitlist_queue_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('promoted_at__isnull', True)), fields=('fitness_class', 'client_email'), name='studio_unique_waiting_entry')],
+            },
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:06
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_stats(apps, schema_editor):
+    """Summarize the existing classes and bookings, as rebuild_stats does
+
+    Written against the historical models only, so later changes to
+    studio.analytics cannot change what this migration does.
+    """
+    FitnessClass = apps.get_model('studio', 'FitnessClass')
+    Booking = apps.get_model('studio', 'Booking')
+    DailyClassStats = apps.get_model('studio', 'DailyClassStats')
+
+    rows = {}
+    for row in (
+        FitnessClass.objects.annotate(day=TruncDate('datetime'))
+        .values('day', 'name', 'instructor')
+        .annotate(class_count=Count('id'), total_slots=Sum('total_slots'))
+        .order_by()
+    ):
+        rows[row['day'], row['name'], row['instructor']] = DailyClassStats(
+            day=row['day'], class_type=row['name'], instructor=row['instructor'],
+            class_count=row['class_count'], total_slots=row['total_slots'],
+        )
+    for row in (
+        Booking.objects.annotate(day=TruncDate('fitness_class__datetime'))
+        .values('day', 'fitness_class__name', 'fitness_class__instructor')
+        .annotate(booking_count=Count('id'), cancellation_count=Count('id', filter=Q(is_cancelled=True)))
+        .order_by()
+    ):
+        stats = rows[row['day'], row['fitness_class__name'], row['fitness_class__instructor']]
+        stats.booking_count = row['booking_count']
+        stats.cancellation_count = row['cancellation_count']
+    DailyClassStats.objects.bulk_create(rows.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('studio', '0004_waitlist'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyClassStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('class_type', models.CharField(choices=[('YOGA', 'Yoga'), ('ZUMBA', 'Zumba'), ('HIIT', 'HIIT')], max_length=100)),
+                ('instructor', models.CharField(max_length=100)),
+                ('class_count', models.PositiveIntegerField(default=0)),
+                ('total_slots', models.PositiveIntegerField(default=0)),
+                ('booking_count', models.PositiveIntegerField(default=0)),
+                ('cancellation_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily Class Stats',
+                'ordering': ['day', 'class_type', 'instructor'],
+                'constraints': [models.UniqueConstraint(fields=('day', 'class_type', 'instructor'), name='studio_unique_daily_stats')],
+            },
+        ),
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:14
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('studio', '0006_class_updated_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedClass',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('name', models.CharField(choices=[('YOGA', 'Yoga'), ('ZUMBA', 'Zumba'), ('HIIT', 'HIIT')], max_length=100)),
+                ('instructor', models.CharField(max_length=100)),
+                ('datetime', models.DateTimeField()),
+                ('total_slots', models.PositiveIntegerField()),
+                ('available_slots', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Archived Class',
+                'verbose_name_plural': 'Archived Classes',
+                'ordering': ['datetime'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedBooking',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('client_name', models.CharField(max_length=100)),
+                ('client_email', models.EmailField(max_length=254)),
+                ('booked_at', models.DateTimeField()),
+                ('is_cancelled', models.BooleanField(default=False)),
+                ('fitness_class', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bookings', to='studio.archivedclass')),
+            ],
+            options={
+                'ordering': ['-booked_at'],
+                'indexes': [models.Index(condition=models.Q(('is_cancelled', False)), fields=['client_email', '-booked_at', '-id'], name='studio_archived_active_idx')],
+            },
+        ),
+    ]
@@ -1,7 +1,68 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Least
 from django.core.validators import EmailValidator, MinValueValidator
 from django.utils import timezone
-import pytz
+
+from .timezones import studio_zone
+
+class FitnessClassQuerySet(models.QuerySet):
+    def upcoming(self):
+        """Classes that have not started yet"""
+        return self.filter(datetime__gt=timezone.now())
+
+    def reserve_slot(self, class_id, upcoming_only=True):
+        """Atomically take one slot from a class, returning whether it succeeded
+
+        A single conditional UPDATE replaces the read-modify-write on the
+        model, so concurrent bookings can never drive available_slots below
+        zero and no row lock is needed.
+        """
+        return self.reserve_slots(class_id, 1, upcoming_only=upcoming_only)
+
+    def reserve_slots(self, class_id, count, upcoming_only=True):
+        """Atomically take ``count`` slots at once, or none at all"""
+        now = timezone.now()
+        queryset = self.filter(pk=class_id, available_slots__gte=count)
+        if upcoming_only:
+            queryset = queryset.filter(datetime__gt=now)
+        reserved = queryset.update(available_slots=F('available_slots') - count, updated_at=now)
+        if reserved:
+            from .catalog import invalidate_catalog
+            invalidate_catalog()
+        return bool(reserved)
+
+    def release_slots(self, counts):
+        """Atomically give back ``{class_id: count}`` slots in a single UPDATE
+
+        Each class is capped at its total_slots, so releasing can never
+        create capacity that was not there.
+        """
+        if not counts:
+            return 0
+        freed = Case(
+            *[When(pk=class_id, then=Value(count)) for class_id, count in counts.items()],
+            default=Value(0),
+            output_field=models.PositiveIntegerField()
+        )
+        released = self.filter(pk__in=counts.keys()).update(
+            available_slots=Least(F('available_slots') + freed, F('total_slots')),
+            updated_at=timezone.now()
+        )
+        if released:
+            from .catalog import invalidate_catalog
+            invalidate_catalog()
+        return released
+
+    def release_slot(self, class_id):
+        """Atomically give one slot back, never exceeding total_slots"""
+        released = self.filter(
+            pk=class_id, available_slots__lt=F('total_slots')
+        ).update(available_slots=F('available_slots') + 1, updated_at=timezone.now())
+        if released:
+            from .catalog import invalidate_catalog
+            invalidate_catalog()
+        return bool(released)
 
 class FitnessClass(models.Model):
     CLASS_TYPES = [
@@ -17,11 +78,19 @@ class FitnessClass(models.Model):
     available_slots = models.PositiveIntegerField(validators=[MinValueValidator(0)])
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = FitnessClassQuerySet.as_manager()
     
     class Meta:
         ordering = ['datetime']
         verbose_name = "Fitness Class"
         verbose_name_plural = "Fitness Classes"
+        indexes = [
+            # Upcoming-class filter and (datetime, id) keyset ordering
+            models.Index(fields=['datetime', 'id'], name='studio_class_datetime_idx'),
+            # reconcile_slots --since and the MAX(updated_at) validators
+            models.Index(fields=['updated_at'], name='studio_class_updated_idx'),
+        ]
         
     def __str__(self):
         return f"{self.name} - {self.instructor} ({self.datetime})"
@@ -34,16 +103,45 @@ class FitnessClass(models.Model):
         """Check if class is in the past"""
         return self.datetime <= timezone.now()
     
-    def get_local_datetime(self):
-        """Get datetime in IST timezone for display"""
-        ist = pytz.timezone('Asia/Kolkata')
-        return self.datetime.astimezone(ist)
+    def get_local_datetime(self, zone=None):
+        """Get datetime in the studio (or the given) time zone for display"""
+        return self.datetime.astimezone(zone or studio_zone())
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored capacity so save() can tell when it grows
+        instance._loaded_total_slots = instance.__dict__.get('total_slots')
+        # ... and the stored start, whose day the utilization summary files it under
+        instance._loaded_datetime = instance.__dict__.get('datetime')
+        return instance
     
     def save(self, *args, **kwargs):
+        # Added capacity becomes available straight away
+        loaded_total = getattr(self, '_loaded_total_slots', None)
+        added_slots = self.total_slots - loaded_total if loaded_total is not None else 0
+        if added_slots > 0:
+            self.available_slots += added_slots
+
         # Ensure available_slots doesn't exceed total_slots
         if self.available_slots > self.total_slots:
             self.available_slots = self.total_slots
-        super().save(*args, **kwargs)
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self._loaded_total_slots = self.total_slots
+            self._loaded_datetime = self.datetime
+            if added_slots > 0:
+                from .services import promote_waitlist
+                promote_waitlist([self.pk])
+
+        from .catalog import invalidate_catalog
+        invalidate_catalog()
+
+class BookingQuerySet(models.QuerySet):
+    def active_for(self, email):
+        """Non-cancelled bookings for an email, served by studio_booking_active_idx"""
+        return self.filter(client_email=email, is_cancelled=False)
 
 class Booking(models.Model):
     fitness_class = models.ForeignKey(FitnessClass, on_delete=models.CASCADE, related_name='bookings')
@@ -51,16 +149,154 @@ class Booking(models.Model):
     client_email = models.EmailField(validators=[EmailValidator()])
     booked_at = models.DateTimeField(default=timezone.now)
     is_cancelled = models.BooleanField(default=False)
+
+    objects = BookingQuerySet.as_manager()
     
     class Meta:
         ordering = ['-booked_at']
-        # Prevent duplicate active bookings for same user and class
-        unique_together = ['fitness_class', 'client_email']
+        constraints = [
+            # Prevent duplicate active bookings for same user and class;
+            # cancelled bookings don't block booking the class again
+            models.UniqueConstraint(
+                fields=['fitness_class', 'client_email'],
+                condition=Q(is_cancelled=False),
+                name='studio_unique_active_booking',
+            ),
+        ]
+        indexes = [
+            # Active bookings by email, newest first (get_bookings, view_bookings_page)
+            models.Index(
+                fields=['client_email', '-booked_at', '-id'],
+                condition=Q(is_cancelled=False),
+                name='studio_booking_active_idx',
+            ),
+        ]
         
     def __str__(self):
         return f"{self.client_name} - {self.fitness_class.name}"
     
-    def get_local_booked_time(self):
-        """Get booking time in IST timezone for display"""
-        ist = pytz.timezone('Asia/Kolkata')
-        return self.booked_at.astimezone(ist)
\ No newline at end of file
+    def get_local_booked_time(self, zone=None):
+        """Get booking time in the studio (or the given) time zone for display"""
+        return self.booked_at.astimezone(zone or studio_zone())
+
+class WaitlistQuerySet(models.QuerySet):
+    def waiting(self):
+        """Entries still queued, served by studio_waitlist_queue_idx"""
+        return self.filter(promoted_at__isnull=True)
+
+class WaitlistEntry(models.Model):
+    fitness_class = models.ForeignKey(FitnessClass, on_delete=models.CASCADE, related_name='waitlist')
+    client_name = models.CharField(max_length=100)
+    client_email = models.EmailField(validators=[EmailValidator()])
+    joined_at = models.DateTimeField(default=timezone.now)
+    promoted_at = models.DateTimeField(null=True, blank=True)
+    promoted_booking = models.OneToOneField(
+        Booking, on_delete=models.SET_NULL, null=True, blank=True, related_name='waitlist_entry'
+    )
+
+    objects = WaitlistQuerySet.as_manager()
+
+    class Meta:
+        # FIFO: the auto-increment id is the queue position
+        ordering = ['id']
+        verbose_name_plural = "Waitlist Entries"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['fitness_class', 'client_email'],
+                condition=Q(promoted_at__isnull=True),
+                name='studio_unique_waiting_entry',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['fitness_class', 'id'],
+                condition=Q(promoted_at__isnull=True),
+                name='studio_waitlist_queue_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.client_name} - waiting for {self.fitness_class.name}"
+
+class DailyClassStats(models.Model):
+    """Utilization of one day's classes of a type and instructor (see analytics.py)"""
+    day = models.DateField()
+    class_type = models.CharField(max_length=100, choices=FitnessClass.CLASS_TYPES)
+    instructor = models.CharField(max_length=100)
+    class_count = models.PositiveIntegerField(default=0)
+    total_slots = models.PositiveIntegerField(default=0)
+    booking_count = models.PositiveIntegerField(default=0)
+    cancellation_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['day', 'class_type', 'instructor']
+        verbose_name_plural = "Daily Class Stats"
+        constraints = [
+            # Also the index for day-range reads
+            models.UniqueConstraint(
+                fields=['day', 'class_type', 'instructor'],
+                name='studio_unique_daily_stats',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.class_type} - {self.instructor}"
+
+class ArchivedClass(models.Model):
+    """A past FitnessClass moved out of the hot table by archive_classes"""
+    # The original FitnessClass id
+    id = models.BigIntegerField(primary_key=True)
+    name = models.CharField(max_length=100, choices=FitnessClass.CLASS_TYPES)
+    instructor = models.CharField(max_length=100)
+    datetime = models.DateTimeField()
+    total_slots = models.PositiveIntegerField()
+    available_slots = models.PositiveIntegerField()
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['datetime']
+        verbose_name = "Archived Class"
+        verbose_name_plural = "Archived Classes"
+
+    def __str__(self):
+        return f"{self.name} - {self.instructor} ({self.datetime})"
+
+    def is_available(self):
+        """Archived classes are in the past"""
+        return False
+
+    def get_local_datetime(self, zone=None):
+        """Get datetime in the studio (or the given) time zone for display"""
+        return self.datetime.astimezone(zone or studio_zone())
+
+class ArchivedBooking(models.Model):
+    """A booking of an ArchivedClass, read by GET /bookings/?include_past=1"""
+    # The original Booking id
+    id = models.BigIntegerField(primary_key=True)
+    fitness_class = models.ForeignKey(ArchivedClass, on_delete=models.CASCADE, related_name='bookings')
+    client_name = models.CharField(max_length=100)
+    client_email = models.EmailField()
+    booked_at = models.DateTimeField()
+    is_cancelled = models.BooleanField(default=False)
+
+    objects = BookingQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['-booked_at']
+        indexes = [
+            # Same shape as studio_booking_active_idx for the include_past reads
+            models.Index(
+                fields=['client_email', '-booked_at', '-id'],
+                condition=Q(is_cancelled=False),
+                name='studio_archived_active_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.client_name} - {self.fitness_class.name}"
+
+    def get_local_booked_time(self, zone=None):
+        """Get booking time in the studio (or the given) time zone for display"""
+        return self.booked_at.astimezone(zone or studio_zone())
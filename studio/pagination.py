@@ -0,0 +1,197 @@
+"""Keyset (cursor) pagination for the list endpoints.
+
+Pages are addressed by the ordering key of the last (or first) row seen
+instead of an offset, so fetching any page costs O(page) and no
+``COUNT(*)`` is ever issued. Cursors are opaque base64 tokens carrying the
+key and the direction of travel.
+"""
+import base64
+import binascii
+import json
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from functools import reduce
+from operator import attrgetter, or_
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.utils.urls import replace_query_param
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _encode_value(value):
+    # Full isoformat keeps microseconds, which the tie-break relies on
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+class KeysetPagination:
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def __init__(self, request):
+        self.request = request
+        # DRF requests expose query_params; the plain async views pass HttpRequest
+        self.params = getattr(request, 'query_params', request.GET)
+        self.page_size = self._get_page_size()
+        self.key, self.reverse = self._decode(self.params.get(self.cursor_query_param))
+        self.next_key = None
+        self.previous_key = None
+
+    def _get_page_size(self):
+        default = settings.REST_FRAMEWORK.get('PAGE_SIZE', 20)
+        try:
+            size = int(self.params.get(self.page_size_query_param, default))
+        except (TypeError, ValueError):
+            return default
+        return min(max(size, 1), self.max_page_size)
+
+    def _decode(self, cursor):
+        if not cursor:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            key, reverse = payload['k'], bool(payload['r'])
+        except (binascii.Error, UnicodeError, ValueError, TypeError, KeyError):
+            raise InvalidCursor('Invalid cursor')
+        # A list of strings and numbers; its length and types are checked
+        # against the ordering once it is known
+        if not isinstance(key, list) or not key or not all(
+            isinstance(value, (str, int, float)) and not isinstance(value, bool) for value in key
+        ):
+            raise InvalidCursor('Invalid cursor')
+        return key, reverse
+
+    def _encode(self, key, reverse):
+        payload = json.dumps({'k': [_encode_value(v) for v in key], 'r': int(reverse)})
+        return base64.urlsafe_b64encode(payload.encode('ascii')).decode('ascii')
+
+    def paginate_list(self, entries, key):
+        """Paginate an in-memory list already sorted ascending by ``key``"""
+        if self.key is not None and entries:
+            self._check_key(key(entries[0]))
+        if self.key is None:
+            start = 0
+        elif self.reverse:
+            start = max(bisect_left(entries, tuple(self.key), key=key) - self.page_size, 0)
+        else:
+            start = bisect_right(entries, tuple(self.key), key=key)
+        page = entries[start:start + self.page_size]
+
+        if page and start + len(page) < len(entries):
+            self.next_key = key(page[-1])
+        if page and start > 0:
+            self.previous_key = key(page[0])
+        return page
+
+    def paginate_queryset(self, queryset, ordering):
+        """Paginate ``queryset`` by the ``ordering`` fields, e.g. ('-booked_at', '-id')"""
+        queryset = self._page_queryset(queryset, ordering)
+        return self._finish_page(list(queryset), ordering)
+
+    async def apaginate_queryset(self, queryset, ordering):
+        """Async variant of paginate_queryset for the ASGI views"""
+        queryset = self._page_queryset(queryset, ordering)
+        return self._finish_page([row async for row in queryset.aiterator()], ordering)
+
+    def paginate_querysets(self, querysets, ordering):
+        """Paginate the union of several querysets ordered by the same fields, one query each
+
+        Their ordering keys must not collide (e.g. live and archived rows
+        sharing one id sequence).
+        """
+        rows = [row for queryset in querysets for row in self._page_queryset(queryset, ordering)]
+        return self._finish_page(self._merge(rows, ordering), ordering)
+
+    async def apaginate_querysets(self, querysets, ordering):
+        """Async variant of paginate_querysets"""
+        rows = [row for queryset in querysets async for row in self._page_queryset(queryset, ordering).aiterator()]
+        return self._finish_page(self._merge(rows, ordering), ordering)
+
+    def _merge(self, rows, ordering):
+        # Stable sorts from the last field to the first, in fetch direction
+        for name in reversed(ordering):
+            rows.sort(key=attrgetter(name.lstrip('-')), reverse=name.startswith('-') != self.reverse)
+        return rows
+
+    def _page_queryset(self, queryset, ordering):
+        fields = [name.lstrip('-') for name in ordering]
+        descending = [name.startswith('-') for name in ordering]
+
+        if self.reverse:
+            queryset = queryset.order_by(*[
+                name if desc else f'-{name}' for name, desc in zip(fields, descending)
+            ])
+        else:
+            queryset = queryset.order_by(*ordering)
+
+        if self.key is not None:
+            queryset = queryset.filter(self._keyset_filter(queryset.model, fields, descending))
+
+        # One extra row tells whether another page follows
+        return queryset[:self.page_size + 1]
+
+    def _finish_page(self, rows, ordering):
+        fields = [name.lstrip('-') for name in ordering]
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+
+        def row_key(row):
+            return tuple(getattr(row, name) for name in fields)
+
+        # Coming from a cursor means there is a page on the side we came from
+        if self.reverse:
+            has_next, has_previous = self.key is not None, has_more
+        else:
+            has_next, has_previous = has_more, self.key is not None
+        if rows and has_next:
+            self.next_key = row_key(rows[-1])
+        if rows and has_previous:
+            self.previous_key = row_key(rows[0])
+        return rows
+
+    def _check_key(self, sample):
+        """The cursor key must compare with keys shaped like ``sample``"""
+        if len(self.key) != len(sample) or any(
+            isinstance(value, str) != isinstance(expected, str) for value, expected in zip(self.key, sample)
+        ):
+            raise InvalidCursor('Invalid cursor')
+
+    def _keyset_filter(self, model, fields, descending):
+        if len(self.key) != len(fields):
+            raise InvalidCursor('Invalid cursor')
+        try:
+            values = [
+                model._meta.get_field(name).to_python(value)
+                for name, value in zip(fields, self.key)
+            ]
+        except Exception:
+            raise InvalidCursor('Invalid cursor')
+
+        # (a, b) > (x, y)  <=>  a > x OR (a = x AND b > y), per direction
+        clauses = []
+        for i, (name, desc) in enumerate(zip(fields, descending)):
+            op = 'lt' if desc != self.reverse else 'gt'
+            equal = {f: v for f, v in zip(fields[:i], values[:i])}
+            clauses.append(Q(**equal, **{f'{name}__{op}': values[i]}))
+        return reduce(or_, clauses)
+
+    def _link(self, key, reverse):
+        if key is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self._encode(key, reverse))
+
+    def get_paginated_response_data(self, data):
+        return {
+            'status': 'success',
+            'data': data,
+            'count': len(data),
+            'next': self._link(self.next_key, False),
+            'previous': self._link(self.previous_key, True),
+        }
@@ -0,0 +1,144 @@
+"""Reconciliation of the denormalized ``available_slots`` counter.
+
+The booking services and the Booking signals keep ``available_slots`` up to
+date incrementally, which misses bulk deletes, admin edits of
+``is_cancelled`` and raw SQL. ``reconcile_slots`` recomputes every class (or
+only those whose ``updated_at`` moved since a given time) as ``total_slots``
+minus its active bookings with one grouped COUNT, and repairs the ones that
+drifted with compare-and-set UPDATEs: a counter is only rewritten if it
+still holds the value that was read, so a booking landing in between, or a
+second reconciler running at the same time, is never overwritten. Whatever
+was skipped that way is picked up by the next run.
+
+``SlotReconciler`` runs it periodically for ``reconcile_slots --every``.
+Between full passes it only checks classes whose ``updated_at`` moved, which
+misses drift from the booking side (queryset updates or deletes of
+bookings, admin edits, raw SQL), so a full pass still runs every
+``STUDIO_RECONCILE_FULL_INTERVAL`` seconds.
+"""
+import logging
+import threading
+import time
+from collections import namedtuple
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Case, Count, Q, Value, When
+from django.utils import timezone
+
+from .catalog import invalidate_catalog
+from .database import retry_on_locked
+from .models import FitnessClass
+from .services import promote_waitlist
+
+logger = logging.getLogger('studio')
+
+# Classes per compare-and-set UPDATE; keeps the WHERE clause within SQLite's limits
+REPAIR_BATCH_SIZE = 200
+
+Drift = namedtuple('Drift', 'class_id available expected active total_slots')
+ReconcileResult = namedtuple('ReconcileResult', 'checked drift repaired elapsed')
+
+
+def find_drift(since=None):
+    """(classes checked, Drift of each class whose counter disagrees with its bookings)"""
+    classes = FitnessClass.objects.all()
+    if since is not None:
+        classes = classes.filter(updated_at__gte=since)
+    rows = (
+        classes.annotate(active=Count('bookings', filter=Q(bookings__is_cancelled=False)))
+        .values_list('id', 'available_slots', 'total_slots', 'active')
+        .order_by()
+    )
+    checked = 0
+    drift = []
+    for class_id, available, total_slots, active in rows.iterator(chunk_size=2000):
+        checked += 1
+        # An overbooked class has no slots left, not a negative count
+        expected = max(total_slots - active, 0)
+        if available != expected:
+            drift.append(Drift(class_id, available, expected, active, total_slots))
+    return checked, drift
+
+
+@retry_on_locked
+def repair_drift(drift):
+    """Set each drifted counter to its expected value unless it changed since it was read
+
+    Returns the number of classes repaired. Classes that gained slots
+    promote their waitlist in the same transaction.
+    """
+    repaired = 0
+    now = timezone.now()
+    with transaction.atomic():
+        for start in range(0, len(drift), REPAIR_BATCH_SIZE):
+            batch = drift[start:start + REPAIR_BATCH_SIZE]
+            repaired += FitnessClass.objects.filter(
+                reduce(or_, [Q(pk=d.class_id, available_slots=d.available) for d in batch])
+            ).update(
+                available_slots=Case(*[When(pk=d.class_id, then=Value(d.expected)) for d in batch]),
+                updated_at=now
+            )
+        if repaired:
+            promote_waitlist([d.class_id for d in drift if d.expected > d.available])
+    if repaired:
+        invalidate_catalog()
+    return repaired
+
+
+def reconcile_slots(since=None, dry_run=False):
+    """Find and (unless ``dry_run``) repair drifted ``available_slots``"""
+    started = time.perf_counter()
+    checked, drift = find_drift(since)
+    repaired = 0 if dry_run or not drift else repair_drift(drift)
+    if drift:
+        logger.warning('Slot counters drifted on %d of %d classes, repaired %d', len(drift), checked, repaired,
+                       extra={'event': 'slot_drift', 'count': len(drift), 'outcome': 'dry_run' if dry_run else 'repaired'})
+    return ReconcileResult(checked, drift, repaired, time.perf_counter() - started)
+
+
+class SlotReconciler(threading.Thread):
+    """Reconcile every ``interval`` seconds: in full every ``full_interval``, else only changed classes
+
+    ``run()`` may be called directly to loop in the calling thread.
+    ``on_result(since, result)`` is called after each pass.
+    """
+
+    def __init__(self, interval, full_interval=None, since=None, dry_run=False, on_result=None):
+        super().__init__(name='slot-reconciler', daemon=True)
+        self.interval = interval
+        if full_interval is None:
+            full_interval = getattr(settings, 'STUDIO_RECONCILE_FULL_INTERVAL', 3600)
+        self.full_interval = full_interval
+        self.since = since
+        self.dry_run = dry_run
+        self.on_result = on_result
+        self._stopped = threading.Event()
+
+    def run(self):
+        since = self.since
+        # Started with ``since``, the first full pass is due one full_interval later
+        last_full = None if since is None else timezone.now()
+        while True:
+            started = timezone.now()
+            if last_full is None or (started - last_full).total_seconds() >= self.full_interval:
+                since = None
+            try:
+                result = reconcile_slots(since=since, dry_run=self.dry_run)
+                if self.on_result is not None:
+                    self.on_result(since, result)
+                if since is None:
+                    last_full = started
+                since = started
+            except Exception:
+                logger.exception('Slot reconciliation failed', extra={'event': 'slot_drift', 'outcome': 'error'})
+            finally:
+                # Do not hold a connection between runs
+                connections.close_all()
+            if self._stopped.wait(self.interval):
+                return
+
+    def stop(self):
+        self._stopped.set()
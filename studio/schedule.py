@@ -0,0 +1,191 @@
+"""Recurring schedules and bulk timetable import.
+
+A schedule like "YOGA with Priya every Mon/Wed 07:00 for 12 weeks" is
+expanded into unsaved ``FitnessClass`` rows in memory. ``import_classes``
+then drops the ones that already exist with a single range query and
+writes the rest with one ``bulk_create``, so a quarter's timetable costs a
+handful of statements instead of one round trip per class.
+
+Times are wall-clock times in the studio time zone (``TIME_ZONE``).
+"""
+import csv
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .analytics import rebuild_stats
+from .catalog import invalidate_catalog
+from .models import FitnessClass
+
+WEEKDAYS = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
+
+TIMETABLE_COLUMNS = ['name', 'instructor', 'start_date', 'time', 'total_slots', 'days', 'weeks']
+
+
+class ScheduleError(ValueError):
+    pass
+
+
+def parse_weekdays(value):
+    """'Mon/Wed', 'mon,wed' or 'Monday Wednesday' -> sorted weekday numbers"""
+    days = set()
+    for part in value.replace('/', ' ').replace(',', ' ').split():
+        try:
+            days.add(WEEKDAYS.index(part[:3].lower()))
+        except ValueError:
+            raise ScheduleError(f'Unknown weekday: {part}')
+    if not days:
+        raise ScheduleError('At least one weekday is required')
+    return sorted(days)
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise ScheduleError(f'Invalid date (expected YYYY-MM-DD): {value}')
+
+
+def _parse_time(value):
+    try:
+        return datetime.strptime(value, '%H:%M').time()
+    except (TypeError, ValueError):
+        raise ScheduleError(f'Invalid time (expected HH:MM): {value}')
+
+
+def _positive(value, name):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        number = 0
+    if number < 1:
+        raise ScheduleError(f'{name} must be a positive integer')
+    return number
+
+
+def expand_schedule(name, instructor, start_time, total_slots, days=None, weeks=1, start_date=None):
+    """Unsaved classes for every future occurrence of a (recurring) schedule
+
+    Without ``days`` the class happens once on ``start_date``; otherwise on
+    each listed weekday for ``weeks`` weeks from ``start_date`` (default today).
+    """
+    name = (name or '').strip().upper()
+    if name not in dict(FitnessClass.CLASS_TYPES):
+        raise ScheduleError(f'Unknown class type: {name}')
+    instructor = (instructor or '').strip()
+    if not instructor:
+        raise ScheduleError('Instructor is required')
+    total_slots = _positive(total_slots, 'total_slots')
+    if not isinstance(start_time, time):
+        start_time = _parse_time(start_time)
+    if isinstance(start_date, str):
+        start_date = _parse_date(start_date)
+    start_date = start_date or timezone.localdate()
+
+    if days:
+        weekdays = parse_weekdays(days) if isinstance(days, str) else sorted(days)
+        span = _positive(weeks, 'weeks') * 7
+        dates = [
+            start_date + timedelta(days=offset) for offset in range(span)
+            if (start_date + timedelta(days=offset)).weekday() in weekdays
+        ]
+    else:
+        dates = [start_date]
+
+    now = timezone.now()
+    classes = []
+    for day in dates:
+        starts = timezone.make_aware(datetime.combine(day, start_time))
+        if starts > now:
+            classes.append(FitnessClass(
+                name=name,
+                instructor=instructor,
+                datetime=starts,
+                total_slots=total_slots,
+                available_slots=total_slots,
+            ))
+    return classes
+
+
+def read_timetable(lines):
+    """Expand a CSV timetable (see TIMETABLE_COLUMNS) into unsaved classes
+
+    ``days`` and ``weeks`` may be left empty for one-off classes.
+    """
+    reader = csv.DictReader(lines)
+    missing = set(TIMETABLE_COLUMNS[:5]) - set(reader.fieldnames or [])
+    if missing:
+        raise ScheduleError(f'Missing timetable columns: {", ".join(sorted(missing))}')
+
+    classes = []
+    for line_number, row in enumerate(reader, start=2):
+        try:
+            classes.extend(expand_schedule(
+                name=row['name'],
+                instructor=row['instructor'],
+                start_time=row['time'],
+                total_slots=row['total_slots'],
+                days=row.get('days') or None,
+                weeks=row.get('weeks') or 1,
+                start_date=row['start_date'],
+            ))
+        except ScheduleError as e:
+            raise ScheduleError(f'Line {line_number}: {e}')
+    return classes
+
+
+def _class_key(fitness_class):
+    return (fitness_class.name, fitness_class.instructor, fitness_class.datetime)
+
+
+def import_classes(classes, dry_run=False):
+    """Insert the classes that do not exist yet; returns (created, skipped)
+
+    A class duplicates another with the same name, instructor and start.
+    """
+    if not classes:
+        return [], []
+
+    starts = [fitness_class.datetime for fitness_class in classes]
+    with transaction.atomic():
+        # One query for the whole import window instead of one per class
+        existing = set(
+            FitnessClass.objects.filter(
+                datetime__range=(min(starts), max(starts)),
+                instructor__in={fitness_class.instructor for fitness_class in classes},
+            ).values_list('name', 'instructor', 'datetime')
+        )
+        created, skipped = [], []
+        for fitness_class in classes:
+            key = _class_key(fitness_class)
+            if key in existing:
+                skipped.append(fitness_class)
+            else:
+                existing.add(key)
+                created.append(fitness_class)
+
+        if created and not dry_run:
+            FitnessClass.objects.bulk_create(created)
+            # bulk_create skips save() and post_save, which normally
+            # invalidate the catalog and count the classes in the summary
+            rebuild_stats({timezone.localdate(c.datetime) for c in created})
+            invalidate_catalog()
+    return created, skipped
+
+
+def repeat_weekly(classes, weeks):
+    """Unsaved copies of ``classes`` on the same weekday and time for the next ``weeks`` weeks"""
+    copies = []
+    for fitness_class in classes:
+        starts = timezone.localtime(fitness_class.datetime)
+        copies.extend(expand_schedule(
+            name=fitness_class.name,
+            instructor=fitness_class.instructor,
+            start_time=starts.time().replace(tzinfo=None),
+            total_slots=fitness_class.total_slots,
+            days=[starts.weekday()],
+            weeks=weeks,
+            start_date=starts.date() + timedelta(days=1),
+        ))
+    return copies
@@ -0,0 +1,188 @@
+"""Server-side filtering of the cached class catalog.
+
+``GET /classes/`` answers from the catalog cache (see catalog.py), so the
+filters run over that in-memory list instead of the database. A
+``CatalogIndex`` is built once per catalog version and kept in process:
+
+* entries stay sorted by start, so the upcoming cut-off and a date range
+  are two bisects;
+* class type maps to entry positions, and local start times (minute of the
+  day) are kept sorted for the time-of-day window, per requested time zone;
+* instructor search goes through the distinct instructor names: a sorted
+  word list answers one- and two-character prefixes, and a trigram map
+  narrows longer substrings to a handful of names before they are checked.
+  No request scans every class the way ``LIKE '%x%'`` would.
+
+A query enumerates the smallest of its candidate sets and checks the other
+filters on those positions only, so the work grows with the result rather
+than with the catalog.
+"""
+import time
+from bisect import bisect_left, bisect_right
+from collections import defaultdict, namedtuple
+from datetime import datetime, time as dt_time, timedelta
+
+from django.utils import timezone
+
+from .models import FitnessClass
+from .timezones import studio_zone
+
+CLASS_TYPES = [value for value, label in FitnessClass.CLASS_TYPES]
+
+ClassQuery = namedtuple('ClassQuery', 'name instructor start end time_from time_to available zone')
+
+
+# Local start minute of each entry, and the positions sorted by it
+MinuteIndex = namedtuple('MinuteIndex', 'minute_of keys positions')
+
+
+class FilterError(ValueError):
+    pass
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _day_start(value, name, zone, days=0):
+    try:
+        day = datetime.strptime(value, '%Y-%m-%d').date() + timedelta(days=days)
+    except ValueError:
+        raise FilterError(f'{name} must be a date in YYYY-MM-DD format')
+    return timezone.make_aware(datetime.combine(day, dt_time.min), zone)
+
+
+def _minute_of_day(value, name):
+    try:
+        parsed = datetime.strptime(value, '%H:%M')
+    except ValueError:
+        raise FilterError(f'{name} must be a time in HH:MM format')
+    return parsed.hour * 60 + parsed.minute
+
+
+def parse_class_query(params, zone=None):
+    """ClassQuery from the /classes/ query parameters
+
+    Dates and times are read in ``zone`` (the request's, see
+    timezones.request_zone), by default the studio time zone.
+    """
+    zone = zone or studio_zone()
+    name = params.get('name', '').strip().upper() or None
+    if name is not None and name not in CLASS_TYPES:
+        raise FilterError(f'name must be one of: {", ".join(CLASS_TYPES)}')
+    start = params.get('start')
+    end = params.get('end')
+    time_from = params.get('time_from')
+    time_to = params.get('time_to')
+    return ClassQuery(
+        name=name,
+        instructor=params.get('instructor', '').strip().lower() or None,
+        start=_day_start(start, 'start', zone).timestamp() if start else None,
+        # Inclusive end date: everything before the next day starts there
+        end=_day_start(end, 'end', zone, days=1).timestamp() if end else None,
+        time_from=_minute_of_day(time_from, 'time_from') if time_from else None,
+        time_to=_minute_of_day(time_to, 'time_to') if time_to else None,
+        available=params.get('available', '').lower() in ('1', 'true', 'yes'),
+        zone=zone,
+    )
+
+
+class CatalogIndex:
+    """Lookup structures over one version of the catalog entries"""
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.starts = [starts_at for starts_at, data in entries]
+        self.by_type = defaultdict(list)
+        self.by_instructor = defaultdict(list)
+        for position, (starts_at, data) in enumerate(entries):
+            self.by_type[data['name']].append(position)
+            self.by_instructor[data['instructor'].lower()].append(position)
+        # Zone key -> MinuteIndex, the studio zone up front, others on first use
+        self._minutes = {}
+        self.minutes(studio_zone())
+
+        self.words = sorted({(word, name) for name in self.by_instructor for word in name.split()})
+        self.trigrams = defaultdict(set)
+        for name in self.by_instructor:
+            for gram in _trigrams(name):
+                self.trigrams[gram].add(name)
+
+    def minutes(self, zone):
+        """MinuteIndex of the local start times in ``zone``"""
+        minutes = self._minutes.get(zone.key)
+        if minutes is None:
+            # Offsets change with DST, so each start is converted on its own
+            minute_of = []
+            for starts_at, data in self.entries:
+                local = datetime.fromtimestamp(starts_at, tz=zone)
+                minute_of.append(local.hour * 60 + local.minute)
+            positions = sorted(range(len(minute_of)), key=minute_of.__getitem__)
+            minutes = self._minutes[zone.key] = MinuteIndex(
+                minute_of, [minute_of[position] for position in positions], positions
+            )
+        return minutes
+
+    def instructor_names(self, query):
+        """Lower-cased instructor names containing ``query`` (a word prefix if shorter than 3)"""
+        if len(query) < 3:
+            names = set()
+            for i in range(bisect_left(self.words, (query,)), len(self.words)):
+                word, name = self.words[i]
+                if not word.startswith(query):
+                    break
+                names.add(name)
+            return names
+        postings = sorted((self.trigrams.get(gram, set()) for gram in _trigrams(query)), key=len)
+        return {name for name in postings[0].intersection(*postings[1:]) if query in name}
+
+    def search(self, query, now=None):
+        """Still-upcoming entries matching ``query``, in (start, id) order"""
+        lo = bisect_right(self.starts, time.time() if now is None else now)
+        hi = len(self.entries)
+        if query.start is not None:
+            lo = max(lo, bisect_left(self.starts, query.start))
+        if query.end is not None:
+            hi = min(hi, bisect_left(self.starts, query.end))
+        if lo >= hi:
+            return []
+
+        # (size, positions factory) per indexed filter; only the smallest is walked
+        sources = [(hi - lo, lambda: range(lo, hi))]
+        checks = []
+        if query.name is not None:
+            by_type = self.by_type.get(query.name, [])
+            sources.append((len(by_type), lambda: by_type))
+            checks.append(lambda p: self.entries[p][1]['name'] == query.name)
+        if query.instructor is not None:
+            positions = set()
+            for name in self.instructor_names(query.instructor):
+                positions.update(self.by_instructor[name])
+            sources.append((len(positions), lambda: positions))
+            checks.append(positions.__contains__)
+        if query.time_from is not None or query.time_to is not None:
+            minutes = self.minutes(query.zone or studio_zone())
+            first = 0 if query.time_from is None else bisect_left(minutes.keys, query.time_from)
+            last = len(minutes.keys) if query.time_to is None else bisect_right(minutes.keys, query.time_to)
+            earliest = 0 if query.time_from is None else query.time_from
+            latest = 24 * 60 if query.time_to is None else query.time_to
+            if earliest <= latest:
+                sources.append((max(last - first, 0), lambda: minutes.positions[first:last]))
+                checks.append(lambda p: earliest <= minutes.minute_of[p] <= latest)
+            else:
+                # A window past midnight (22:00-06:00): the late and the early range
+                sources.append((len(minutes.keys) - first + last,
+                                lambda: minutes.positions[first:] + minutes.positions[:last]))
+                checks.append(lambda p: minutes.minute_of[p] >= earliest or minutes.minute_of[p] <= latest)
+        if query.available:
+            # Most classes have free slots, so this is a check, never a source
+            checks.append(lambda p: self.entries[p][1]['available_slots'] > 0)
+
+        if not checks:
+            return self.entries[lo:hi]
+        size, walk = min(sources, key=lambda source: source[0])
+        candidates = walk()
+        matches = [p for p in candidates if lo <= p < hi and all(check(p) for check in checks)]
+        if not isinstance(candidates, range):
+            matches.sort()
+        return [self.entries[p] for p in matches]
@@ -1,11 +1,24 @@
 from rest_framework import serializers
-from .models import FitnessClass, Booking
+from .models import ArchivedBooking, ArchivedClass, FitnessClass, Booking, WaitlistEntry
+from .services import BATCH_ALL_OR_NOTHING, BATCH_BEST_EFFORT
+from django.conf import settings
 from django.core.validators import RegexValidator
-from django.utils import timezone
+from .timezones import LocalTimes
+
+class LocalTimeField(serializers.ReadOnlyField):
+    """A datetime as display text, formatted by the LocalTimes in ``context['local_times']``"""
+
+    def to_representation(self, value):
+        # Nested serializers share the root's context, so one LocalTimes
+        # serves the whole response
+        local_times = self.context.get('local_times')
+        if local_times is None:
+            local_times = self.context['local_times'] = LocalTimes()
+        return local_times.format(value)
 
 class FitnessClassSerializer(serializers.ModelSerializer):
     is_available = serializers.SerializerMethodField()
-    local_datetime = serializers.SerializerMethodField()
+    local_datetime = LocalTimeField(source='datetime')
     
     class Meta:
         model = FitnessClass
@@ -14,25 +27,40 @@ class FitnessClassSerializer(serializers.ModelSerializer):
         
     def get_is_available(self, obj):
         return obj.is_available()
-    
-    def get_local_datetime(self, obj):
-        return obj.get_local_datetime().strftime('%Y-%m-%d %H:%M:%S IST')
 
 class BookingSerializer(serializers.ModelSerializer):
     fitness_class = FitnessClassSerializer(read_only=True)
-    local_booked_time = serializers.SerializerMethodField()
+    local_booked_time = LocalTimeField(source='booked_at')
     
     class Meta:
         model = Booking
         fields = ['id', 'fitness_class', 'client_name', 'client_email', 
                  'booked_at', 'local_booked_time', 'is_cancelled']
         read_only_fields = ['booked_at']
-    
-    def get_local_booked_time(self, obj):
-        return obj.get_local_booked_time().strftime('%Y-%m-%d %H:%M:%S IST')
 
-class BookingInputSerializer(serializers.Serializer):
-    class_id = serializers.IntegerField(required=True)
+class ArchivedClassSerializer(FitnessClassSerializer):
+    class Meta(FitnessClassSerializer.Meta):
+        model = ArchivedClass
+
+class ArchivedBookingSerializer(BookingSerializer):
+    fitness_class = ArchivedClassSerializer(read_only=True)
+
+    class Meta(BookingSerializer.Meta):
+        model = ArchivedBooking
+
+def serialize_bookings(bookings, local_times=None):
+    """Serialize a page mixing live and archived bookings, keeping its order"""
+    context = {'local_times': local_times or LocalTimes()}
+    # One list serializer per model: building a serializer per row costs
+    # more than serializing the row
+    archived = [isinstance(booking, ArchivedBooking) for booking in bookings]
+    rows = {
+        False: iter(BookingSerializer([b for b, a in zip(bookings, archived) if not a], many=True, context=context).data),
+        True: iter(ArchivedBookingSerializer([b for b, a in zip(bookings, archived) if a], many=True, context=context).data),
+    }
+    return [next(rows[a]) for a in archived]
+
+class ClientInputSerializer(serializers.Serializer):
     client_name = serializers.CharField(
         required=True,
         max_length=100,
@@ -44,39 +72,40 @@ class BookingInputSerializer(serializers.Serializer):
         ]
     )
     client_email = serializers.EmailField(required=True)
-    
-    def validate_class_id(self, value):
-        """Validate class exists and is bookable"""
-        try:
-            fitness_class = FitnessClass.objects.get(id=value)
-            
-            if fitness_class.is_past_class():
-                raise serializers.ValidationError("Cannot book past classes.")
-            
-            if not fitness_class.is_available():
-                raise serializers.ValidationError("No available slots for this class.")
-                
-            return value
-            
-        except FitnessClass.DoesNotExist:
-            raise serializers.ValidationError("Class does not exist.")
-    
-    def validate(self, data):
-        """Check for duplicate bookings"""
-        try:
-            fitness_class = FitnessClass.objects.get(id=data['class_id'])
-            existing_booking = Booking.objects.filter(
-                fitness_class=fitness_class,
-                client_email=data['client_email'],
-                is_cancelled=False
-            ).exists()
-            
-            if existing_booking:
-                raise serializers.ValidationError({
-                    'non_field_errors': ['You have already booked this class.']
-                })
-                
-        except FitnessClass.DoesNotExist:
-            pass  # Will be caught by validate_class_id
-            
-        return data
\ No newline at end of file
+
+class BookingInputSerializer(ClientInputSerializer):
+    # Field-level checks only; class availability and duplicates are
+    # enforced by studio.services.book_class without extra queries
+    class_id = serializers.IntegerField(required=True)
+
+class WaitlistEntrySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = WaitlistEntry
+        fields = ['id', 'fitness_class', 'client_name', 'client_email', 'joined_at']
+
+
+class BatchBookingInputSerializer(serializers.Serializer):
+    # Entries are validated one by one with BookingInputSerializer so each
+    # gets its own result instead of failing the whole request
+    mode = serializers.ChoiceField(
+        choices=[BATCH_ALL_OR_NOTHING, BATCH_BEST_EFFORT],
+        default=BATCH_ALL_OR_NOTHING
+    )
+    bookings = serializers.ListField(
+        child=serializers.DictField(),
+        allow_empty=False,
+        max_length=getattr(settings, 'STUDIO_BATCH_BOOKING_LIMIT', 100)
+    )
+
+
+class CancelBookingInputSerializer(serializers.Serializer):
+    # Bookings are keyed by email, so the owner's email is the credential
+    client_email = serializers.EmailField(required=True)
+
+
+class BulkCancelBookingInputSerializer(CancelBookingInputSerializer):
+    booking_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=getattr(settings, 'STUDIO_BATCH_BOOKING_LIMIT', 100)
+    )
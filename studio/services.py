@@ -0,0 +1,319 @@
+"""Booking write path shared by the API and the HTML views.
+
+A single booking costs a fixed query budget, independent of load:
+
+1. ``SELECT`` the class (once)
+2. conditional ``UPDATE`` taking a slot (``FitnessClass.objects.reserve_slot``)
+3. ``INSERT`` the booking
+4. ``UPDATE`` of the day's utilization counters (``analytics.py``)
+
+all inside one transaction. Duplicate bookings are not pre-checked: the
+unique constraint on active (fitness_class, client_email) pairs rejects them
+and the resulting IntegrityError rolls the slot back with the transaction.
+
+Cancellation is a soft delete: ``is_cancelled`` is flipped with one
+conditional UPDATE and the slots go back with another, so rows are never
+deleted and the same client can book the class again. Whatever frees
+capacity (cancellation, a larger ``total_slots``) promotes waitlisted
+clients in FIFO order inside the same transaction.
+
+On SQLite every transaction here starts with ``BEGIN IMMEDIATE`` and is
+retried with backoff if the write lock stays busy (see ``database.py``).
+"""
+from collections import Counter, defaultdict
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .analytics import record_bookings, record_cancellations, stats_key
+from .database import retry_on_locked
+from .models import Booking, FitnessClass, WaitlistEntry
+
+BOOKING_QUERY_BUDGET = 4
+
+BATCH_ALL_OR_NOTHING = 'all_or_nothing'
+BATCH_BEST_EFFORT = 'best_effort'
+
+
+class BookingError(Exception):
+    """A booking was rejected; ``code`` tells the views how to respond"""
+
+    def __init__(self, message, code):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+
+
+@retry_on_locked
+def book_class(class_id, client_name, client_email):
+    """Book one slot in a class and return the saved Booking"""
+    try:
+        fitness_class = FitnessClass.objects.get(id=class_id)
+    except (FitnessClass.DoesNotExist, ValueError):
+        raise BookingError('Invalid class ID', 'not_found')
+
+    try:
+        with transaction.atomic():
+            if not FitnessClass.objects.reserve_slot(fitness_class.id):
+                if fitness_class.is_past_class():
+                    raise BookingError('Cannot book past classes', 'past_class')
+                raise BookingError('No slots available', 'full')
+
+            booking = Booking(
+                fitness_class=fitness_class,
+                client_name=client_name,
+                client_email=client_email
+            )
+            # The slot is already taken; keep the post_save signal out of it
+            booking._slot_reserved = True
+            booking.save()
+            record_bookings([stats_key(fitness_class.datetime, fitness_class.name, fitness_class.instructor)])
+    except IntegrityError:
+        raise BookingError('You have already booked this class', 'duplicate')
+
+    fitness_class.available_slots -= 1
+    return booking
+
+
+class _BatchAborted(Exception):
+    pass
+
+
+@retry_on_locked
+def book_batch(entries, mode=BATCH_ALL_OR_NOTHING):
+    """Book several (class_id, client_name, client_email) entries at once
+
+    Returns one result per entry, in order: the saved Booking or the
+    BookingError that rejected it. The whole batch costs one class fetch,
+    one duplicate check, one conditional UPDATE per distinct class and a
+    single ``bulk_create``. In all-or-nothing mode any rejection rolls the
+    batch back and the remaining entries are reported as ``aborted``.
+    """
+    results = [None] * len(entries)
+    classes = FitnessClass.objects.in_bulk({entry['class_id'] for entry in entries})
+    taken = set(
+        Booking.objects.filter(
+            fitness_class_id__in=classes.keys(),
+            client_email__in={entry['client_email'] for entry in entries},
+            is_cancelled=False
+        ).values_list('fitness_class_id', 'client_email')
+    )
+
+    per_class = defaultdict(list)
+    for index, entry in enumerate(entries):
+        fitness_class = classes.get(entry['class_id'])
+        key = (entry['class_id'], entry['client_email'])
+        if fitness_class is None:
+            results[index] = BookingError('Invalid class ID', 'not_found')
+        elif fitness_class.is_past_class():
+            results[index] = BookingError('Cannot book past classes', 'past_class')
+        elif key in taken:
+            results[index] = BookingError('You have already booked this class', 'duplicate')
+        else:
+            taken.add(key)
+            per_class[fitness_class.id].append(index)
+
+    all_or_nothing = mode == BATCH_ALL_OR_NOTHING
+    try:
+        with transaction.atomic():
+            if all_or_nothing and any(results):
+                raise _BatchAborted
+
+            bookings = []
+            booked_keys = []
+            for class_id, indexes in per_class.items():
+                granted = _reserve_for_batch(class_id, len(indexes), partial=not all_or_nothing)
+                for index in indexes[granted:]:
+                    results[index] = BookingError('No slots available', 'full')
+                if granted < len(indexes) and all_or_nothing:
+                    raise _BatchAborted
+
+                fitness_class = classes[class_id]
+                fitness_class.available_slots -= granted
+                booked_keys.extend(
+                    [stats_key(fitness_class.datetime, fitness_class.name, fitness_class.instructor)] * granted
+                )
+                for index in indexes[:granted]:
+                    entry = entries[index]
+                    booking = Booking(
+                        fitness_class=fitness_class,
+                        client_name=entry['client_name'],
+                        client_email=entry['client_email']
+                    )
+                    results[index] = booking
+                    bookings.append(booking)
+
+            # bulk_create sends no post_save, so the slots are not taken twice
+            Booking.objects.bulk_create(bookings)
+            record_bookings(booked_keys)
+    except _BatchAborted:
+        return [
+            result if isinstance(result, BookingError)
+            else BookingError('Not booked because another entry was rejected', 'aborted')
+            for result in results
+        ]
+    except IntegrityError:
+        # A concurrent request booked one of the pairs after the duplicate check
+        if all_or_nothing:
+            return [
+                BookingError('Batch conflicted with a concurrent booking', 'conflict')
+                for _ in entries
+            ]
+        return [_book_one(entry, result) for entry, result in zip(entries, results)]
+    return results
+
+
+def _book_one(entry, result):
+    """Best-effort fallback: retry an accepted entry on its own"""
+    if not isinstance(result, Booking):
+        return result
+    try:
+        return book_class(entry['class_id'], entry['client_name'], entry['client_email'])
+    except BookingError as e:
+        return e
+
+
+def _reserve_for_batch(class_id, count, partial):
+    """Take ``count`` slots from a class in one UPDATE, or as many as remain"""
+    if FitnessClass.objects.reserve_slots(class_id, count):
+        return count
+    if not partial:
+        return 0
+    remaining = FitnessClass.objects.filter(pk=class_id).values_list('available_slots', flat=True).first() or 0
+    granted = min(remaining, count)
+    if granted and FitnessClass.objects.reserve_slots(class_id, granted):
+        return granted
+    return 0
+
+
+@retry_on_locked
+def cancel_bookings(booking_ids, client_email):
+    """Soft-cancel active bookings owned by ``client_email``
+
+    Returns the ids that were cancelled; unknown, foreign or already
+    cancelled ids are skipped. Three statements regardless of how many
+    bookings or classes are involved: the lookup, the ``is_cancelled`` flip
+    and one UPDATE releasing the slots of every affected class. The
+    utilization summary then takes one UPDATE per (day, type, instructor).
+    """
+    with transaction.atomic():
+        rows = list(
+            Booking.objects.select_for_update(of=('self',))
+            .filter(pk__in=booking_ids, client_email=client_email, is_cancelled=False)
+            .values_list('id', 'fitness_class_id', 'fitness_class__datetime',
+                         'fitness_class__name', 'fitness_class__instructor')
+        )
+        if not rows:
+            return []
+
+        cancelled_ids = [row[0] for row in rows]
+        Booking.objects.filter(pk__in=cancelled_ids, is_cancelled=False).update(is_cancelled=True)
+        freed = Counter(row[1] for row in rows)
+        FitnessClass.objects.release_slots(freed)
+        record_cancellations(stats_key(*row[2:]) for row in rows)
+        promote_waitlist(freed.keys())
+    return cancelled_ids
+
+
+@retry_on_locked
+def join_waitlist(class_id, client_name, client_email):
+    """Queue a client for a full class and return the WaitlistEntry"""
+    try:
+        fitness_class = FitnessClass.objects.get(id=class_id)
+    except (FitnessClass.DoesNotExist, ValueError):
+        raise BookingError('Invalid class ID', 'not_found')
+
+    if fitness_class.is_past_class():
+        raise BookingError('Cannot book past classes', 'past_class')
+    if fitness_class.available_slots > 0:
+        raise BookingError('Slots are available; book the class instead', 'available')
+    if Booking.objects.active_for(client_email).filter(fitness_class=fitness_class).exists():
+        raise BookingError('You have already booked this class', 'duplicate')
+
+    try:
+        with transaction.atomic():
+            entry = WaitlistEntry.objects.create(
+                fitness_class=fitness_class,
+                client_name=client_name,
+                client_email=client_email
+            )
+            # A slot freed since the class was read must not strand the entry
+            promote_waitlist([fitness_class.id])
+    except IntegrityError:
+        raise BookingError('You are already on the waitlist for this class', 'duplicate')
+    return entry
+
+
+def waitlist_position(entry):
+    """1-based queue position of a waiting entry"""
+    return WaitlistEntry.objects.waiting().filter(
+        fitness_class_id=entry.fitness_class_id, id__lte=entry.id
+    ).count()
+
+
+def promote_waitlist(class_ids):
+    """Turn waitlist entries into bookings for every free slot, FIFO
+
+    Must run inside the transaction that freed the capacity so a freed
+    seat is never visible to polling clients before the queue is served.
+    Several seats freed at once promote several waiters with one
+    reservation UPDATE and one bulk_create per class, plus another round
+    for each batch that held waiters who had already booked. Returns the
+    bookings.
+    """
+    free = {
+        class_id: (slots, stats_key(starts_at, name, instructor))
+        for class_id, slots, starts_at, name, instructor in
+        FitnessClass.objects.upcoming()
+        .filter(pk__in=list(class_ids), available_slots__gt=0)
+        .values_list('id', 'available_slots', 'datetime', 'name', 'instructor')
+    }
+    if not free:
+        return []
+
+    promoted = []
+    for class_id, (slots, key) in free.items():
+        # Dropping waiters who already booked frees their turn, so keep
+        # reading the queue until the slots are filled or it runs out
+        while slots > 0:
+            bookings = _promote_next(class_id, slots, key)
+            if bookings is None:
+                break
+            promoted.extend(bookings)
+            slots -= len(bookings)
+    return promoted
+
+
+def _promote_next(class_id, slots, key):
+    """Book the first ``slots`` waiters of a class; None once there is nobody left to promote"""
+    waiters = list(WaitlistEntry.objects.waiting().filter(fitness_class_id=class_id)[:slots])
+    if not waiters:
+        return None
+
+    # Waiters who booked the class directly in the meantime leave the queue
+    booked = set(
+        Booking.objects.filter(
+            fitness_class_id=class_id,
+            client_email__in=[entry.client_email for entry in waiters],
+            is_cancelled=False
+        ).values_list('client_email', flat=True)
+    )
+    if booked:
+        WaitlistEntry.objects.filter(pk__in=[e.pk for e in waiters if e.client_email in booked]).delete()
+        waiters = [entry for entry in waiters if entry.client_email not in booked]
+    if not waiters:
+        return []
+    if not FitnessClass.objects.reserve_slots(class_id, len(waiters)):
+        return None
+
+    bookings = Booking.objects.bulk_create([
+        Booking(fitness_class_id=class_id, client_name=entry.client_name, client_email=entry.client_email)
+        for entry in waiters
+    ])
+    now = timezone.now()
+    for entry, booking in zip(waiters, bookings):
+        entry.promoted_at = now
+        entry.promoted_booking = booking
+    WaitlistEntry.objects.bulk_update(waiters, ['promoted_at', 'promoted_booking'])
+    record_bookings([key] * len(bookings))
+    return bookings
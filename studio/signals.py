@@ -1,18 +1,43 @@
+from django.db.backends.signals import connection_created
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import Booking
+from django.utils import timezone
+from .analytics import class_changed, rebuild_stats, record, record_bookings, stats_key
+from .catalog import invalidate_catalog
+from .database import apply_sqlite_pragmas
+from .metrics import install_query_timer
+from .models import Booking, FitnessClass
 
 @receiver(post_save, sender=Booking)
 def update_slots_on_booking_create(sender, instance, created, **kwargs):
-    if created:
+    # Bookings made through the views reserve their slot up front; anything
+    # else (admin, shell) still takes one here, atomically.
+    if created and not getattr(instance, '_slot_reserved', False):
+        FitnessClass.objects.reserve_slot(instance.fitness_class_id, upcoming_only=False)
         fitness_class = instance.fitness_class
-        if fitness_class.available_slots > 0:
-            fitness_class.available_slots -= 1
-            fitness_class.save()
+        record_bookings([stats_key(fitness_class.datetime, fitness_class.name, fitness_class.instructor)])
 
 @receiver(post_delete, sender=Booking)
 def update_slots_on_booking_delete(sender, instance, **kwargs):
-    fitness_class = instance.fitness_class
-    if fitness_class.available_slots < fitness_class.total_slots:
-        fitness_class.available_slots += 1
-        fitness_class.save()
+    # A cancelled booking already gave its slot back
+    if not instance.is_cancelled:
+        FitnessClass.objects.release_slot(instance.fitness_class_id)
+    fitness_class = FitnessClass.objects.filter(pk=instance.fitness_class_id).first()
+    if fitness_class is not None:
+        record({stats_key(fitness_class.datetime, fitness_class.name, fitness_class.instructor): {
+            'booking_count': -1, 'cancellation_count': -int(instance.is_cancelled),
+        }})
+
+@receiver(post_save, sender=FitnessClass)
+def update_stats_on_class_save(sender, instance, created, **kwargs):
+    class_changed(instance, created)
+
+@receiver(post_delete, sender=FitnessClass)
+def invalidate_catalog_on_class_delete(sender, instance, **kwargs):
+    invalidate_catalog()
+    rebuild_stats({timezone.localdate(instance.datetime)})
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    apply_sqlite_pragmas(connection)
+    install_query_timer(connection)
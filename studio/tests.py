@@ -1,13 +1,55 @@
-from django.test import TestCase
-from django.urls import reverse
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import resolve, reverse
 from django.utils import timezone
-from datetime import timedelta
+from django.utils.http import http_date
+from datetime import datetime, time as dt_time, timedelta
 from rest_framework.test import APITestCase
 from rest_framework import status
-from django.db import transaction
+from django.db import OperationalError, transaction, connection
+from django.db.models import Count, F
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+import base64
 import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+from unittest import mock
+from io import StringIO
+from django.core.management import call_command
+from django.core.management.base import CommandError
 
-from .models import FitnessClass, Booking
+from .models import ArchivedBooking, ArchivedClass, DailyClassStats, FitnessClass, Booking, WaitlistEntry
+from . import services
+from .analytics import rebuild_stats
+from .archive import archive_batch, archive_classes, archive_cutoff
+from .reconcile import SlotReconciler, find_drift, reconcile_slots, repair_drift
+from .database import retry_on_locked
+from .exports import export_queryset
+from .schedule import ScheduleError, expand_schedule, import_classes
+from .log import JsonFormatter, QueueListenerHandler, SamplingFilter
+from .metrics import REGISTRY
+from .throttling import LOCAL_STORE, LocalBucketStore
+from .timezones import LocalTimes, TimezoneError, get_zone
+from .urls import async_urlpatterns
+
+# Rate limits are switched off for the suite and tested in ThrottlingTest
+_no_throttling = override_settings(STUDIO_THROTTLE_RATES={})
+
+
+def setUpModule():
+    _no_throttling.enable()
+
+
+def tearDownModule():
+    _no_throttling.disable()
 
 class FitnessClassModelTest(TestCase):
     def setUp(self):
@@ -129,4 +171,1610 @@ class APIEndpointTest(APITestCase):
             datetime=self.past_time,
             total_slots=20,
             available_slots=0
-        )
\ No newline at end of file
+        )
+class CatalogCacheTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.fitness_class = FitnessClass.objects.create(
+            name='YOGA',
+            instructor='Test Instructor',
+            datetime=timezone.now() + timedelta(days=1),
+            total_slots=10,
+            available_slots=10
+        )
+        FitnessClass.objects.create(
+            name='HIIT',
+            instructor='Past Instructor',
+            datetime=timezone.now() - timedelta(days=1),
+            total_slots=10,
+            available_slots=10
+        )
+
+    def test_get_classes_served_from_cache(self):
+        response = self.client.get(reverse('api_get_classes'))
+        self.assertEqual(response.data['count'], 1)
+
+        # Only the conditional-GET aggregate; the rows come from the cache
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('api_get_classes'))
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertIn('MAX(', ctx.captured_queries[0]['sql'])
+        self.assertEqual(response.data['data'][0]['id'], self.fitness_class.id)
+
+    def test_class_save_invalidates_catalog(self):
+        self.client.get(reverse('api_get_classes'))
+        self.fitness_class.instructor = 'New Instructor'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.fitness_class.save()
+
+        response = self.client.get(reverse('api_get_classes'))
+        self.assertEqual(response.data['data'][0]['instructor'], 'New Instructor')
+
+    def test_booking_invalidates_catalog(self):
+        self.client.get(reverse('api_get_classes'))
+        with self.captureOnCommitCallbacks(execute=True):
+            Booking.objects.create(
+                fitness_class=self.fitness_class,
+                client_name='John Doe',
+                client_email='john@example.com'
+            )
+
+        response = self.client.get(reverse('api_get_classes'))
+        self.assertEqual(response.data['data'][0]['available_slots'], 9)
+
+    def test_invalidation_waits_for_commit(self):
+        self.client.get(reverse('api_get_classes'))
+        version = cache.get('studio:catalog:version')
+        with self.captureOnCommitCallbacks() as callbacks:
+            services.book_class(self.fitness_class.id, 'John Doe', 'john@example.com')
+            # Still the committed rows: a read now must not cache under a new version
+            self.assertEqual(cache.get('studio:catalog:version'), version)
+        self.assertTrue(callbacks)
+        for callback in callbacks:
+            callback()
+        response = self.client.get(reverse('api_get_classes'))
+        self.assertEqual(response.data['data'][0]['available_slots'], 9)
+
+    def test_class_delete_invalidates_catalog(self):
+        self.client.get(reverse('api_get_classes'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.fitness_class.delete()
+
+        response = self.client.get(reverse('api_get_classes'))
+        self.assertEqual(response.data['count'], 0)
+
+class SlotReservationTest(APITestCase):
+    def setUp(self):
+        self.fitness_class = FitnessClass.objects.create(
+            name='YOGA',
+            instructor='Test Instructor',
+            datetime=timezone.now() + timedelta(days=1),
+            total_slots=2,
+            available_slots=2
+        )
+
+    def test_reserve_slot_stops_at_zero(self):
+        self.assertTrue(FitnessClass.objects.reserve_slot(self.fitness_class.id))
+        self.assertTrue(FitnessClass.objects.reserve_slot(self.fitness_class.id))
+        self.assertFalse(FitnessClass.objects.reserve_slot(self.fitness_class.id))
+        self.fitness_class.refresh_from_db()
+        self.assertEqual(self.fitness_class.available_slots, 0)
+
+    def test_reserve_slot_rejects_past_class(self):
+        self.fitness_class.datetime = timezone.now() - timedelta(hours=1)
+        self.fitness_class.save()
+        self.assertFalse(FitnessClass.objects.reserve_slot(self.fitness_class.id))
+
+    def test_release_slot_capped_at_total(self):
+        self.assertFalse(FitnessClass.objects.release_slot(self.fitness_class.id))
+        FitnessClass.objects.reserve_slot(self.fitness_class.id)
+        self.assertTrue(FitnessClass.objects.release_slot(self.fitness_class.id))
+        self.fitness_class.refresh_from_db()
+        self.assertEqual(self.fitness_class.available_slots, 2)
+
+    def test_api_booking_takes_exactly_one_slot(self):
+        response = self.client.post(reverse('api_book_class'), {
+            'class_id': self.fitness_class.id,
+            'client_name': 'John Doe',
+            'client_email': 'john@example.com'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['data']['fitness_class']['available_slots'], 1)
+        self.fitness_class.refresh_from_db()
+        self.assertEqual(self.fitness_class.available_slots, 1)
+
+    def test_web_booking_does_not_oversell(self):
+        for i in range(3):
+            self.client.post(reverse('book_class_page'), {
+                'class_id': self.fitness_class.id,
+                'client_name': 'Client',
+                'client_email': f'client{i}@example.com'
+            })
+        self.fitness_class.refresh_from_db()
+        self.assertEqual(self.fitness_class.available_slots, 0)
+        self.assertEqual(self.fitness_class.bookings.count(), 2)
+
+class BookingServiceTest(APITestCase):
+    def setUp(self):
+        self.fitness_class = FitnessClass.objects.create(
+            name='YOGA',
+            instructor='Test Instructor',
+            datetime=timezone.now() + timedelta(days=1),
+            total_slots=5,
+            available_slots=5
+        )
+
+    def _statements(self, queries):
+        # Transaction control differs between TestCase savepoints and real
+        # BEGIN/COMMIT, so only data statements count against the budget
+        return [q for q in queries if not q['sql'].startswith(('SAVEPOINT', 'RELEASE', 'ROLLBACK', 'BEGIN'))]
+
+    def test_api_booking_query_budget(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('api_book_class'), {
+                'class_id': self.fitness_class.id,
+                'client_name': 'John Doe',
+                'client_email': 'john@example.com'
+            }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(self._statements(ctx.captured_queries)), services.BOOKING_QUERY_BUDGET)
+
+    def test_duplicate_rejected_by_constraint_and_slot_restored(self):
+        services.book_class(self.fitness_class.id, 'John Doe', 'john@example.com')
+        with self.assertRaises(services.BookingError) as cm:
+            services.book_class(self.fitness_class.id, 'John Doe', 'john@example.com')
+        self.assertEqual(cm.exception.code, 'duplicate')
+        self.fitness_class.refresh_from_db()
+        self.assertEqual(self.fitness_class.available_slots, 4)
+
+    def test_unknown_class_returns_404(self):
+        response = self.client.post(reverse('api_book_class'), {
+            'class_id': 9999,
+            'client_name': 'John Doe',
+            'client_email': 'john@example.com'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_full_class_rejected(self):
+        self.fitness_class.available_slots = 0
+        self.fitness_class.save()
+        with self.assertRaises(services.BookingError) as cm:
+            services.book_class(self.fitness_class.id, 'John Doe', 'john@example.com')
+        self.assertEqual(cm.exception.code, 'full')
+
+class KeysetPaginationTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        start = timezone.now() + timedelta(days=1)
+        self.classes = [
+            FitnessClass.objects.create(
+                name='YOGA',
+                instructor='Test Instructor',
+                # Two classes share each start time to exercise the id tie-break
+                datetime=start + timedelta(hours=i // 2),
+                total_slots=10,
+                available_slots=10
+            )
+            for i in range(5)
+        ]
+
+    def _walk(self, url, link='next'):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(item['id'] for item in response.data['data'])
+            url = response.data[link]
+        return ids, response
+
+    def test_classes_pages_cover_catalog_once(self):
+        ids, last = self._walk(reverse('api_get_classes') + '?page_size=2')
+        self.assertEqual(ids, [c.id for c in self.classes])
+
+        # Walking back from the last page returns the earlier pages
+        response = self.client.get(last.data['previous'])
+        self.assertEqual([item['id'] for item in response.data['data']], ids[2:4])
+
+    def test_bookings_pages_without_count_query(self):
+        booked_at = timezone.now()
+        for fitness_class in self.classes:
+            Booking.objects.create(
+                fitness_class=fitness_class,
+                client_name='John Doe',
+                client_email='john@example.com',
+                booked_at=booked_at
+            )
+
+        url = reverse('api_get_bookings') + '?email=john@example.com&page_size=2'
+        with CaptureQueriesContext(connection) as ctx:
+            ids, last = self._walk(url)
+        self.assertEqual(ids, sorted(ids, reverse=True))
+        self.assertEqual(len(set(ids)), 5)
+        # The only COUNT is the conditional-GET aggregate, never a page count
+        counts = [q['sql'] for q in ctx.captured_queries if 'COUNT(' in q['sql']]
+        self.assertTrue(all('MAX(' in sql for sql in counts))
+
+        back_ids, _ = self._walk(last.data['previous'], link='previous')
+        self.assertEqual(back_ids, ids[2:4] + ids[0:2])
+
+    def test_invalid_cursor_rejected(self):
+        response = self.client.get(reverse('api_get_classes') + '?cursor=garbage')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_crafted_cursor_rejected(self):
+        Booking.objects.create(fitness_class=self.classes[0], client_name='John Doe', client_email='john@example.com')
+        for key in (5, [], [None, 1], [True, 1], ['x', 1], [1.5], [{}, 1]):
+            cursor = base64.urlsafe_b64encode(json.dumps({'k': key, 'r': 0}).encode()).decode()
+            for url in (reverse('api_get_classes'), reverse('api_get_bookings') + '?email=john@example.com'):
+                response = self.client.get(url, {'cursor': cursor})
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, (url, key))
+
+class QueryPlanTest(TestCase):
+    def test_hot_queries_use_indexes(self):
+        out = StringIO()
+        call_command('check_query_plans', stdout=out)
+        self.assertIn('hot queries use indexes', out.getvalue())
+        self.assertNotIn('SCAN studio_', out.getvalue())
+
+class BatchBookingTest(APITestCase):
+    def setUp(self):
+        self.yoga = FitnessClass.objects.create(
+            name='YOGA',
+            instructor='Test Instructor',
+            datetime=timezone.now() + timedelta(days=1),
+            total_slots=3,
+            available_slots=3
+        )
+        self.zumba = FitnessClass.objects.create(
+            name='ZUMBA',
+            instructor='Another Instructor',
+            datetime=timezone.now() + timedelta(days=2),
+            total_slots=1,
+            available_slots=1
+        )
+
+    def _entry(self, fitness_class, n):
+        return {'class_id': fitness_class.id, 'client_name': 'Client', 'client_email': f'client{n}@example.com'}
+
+    def test_group_booking_uses_bulk_queries(self):
+        entries = [self._entry(self.yoga, n) for n in range(3)] + [self._entry(self.zumba, 0)]
+        # class fetch, duplicate check, one UPDATE per class, one bulk INSERT
+        # and one UPDATE per utilization summary row (the classes are on two days)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('api_book_batch'), {'bookings': entries}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['count'], 4)
+        statements = [q for q in ctx.captured_queries if not q['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+        self.assertEqual(len(statements), 7)
+
+        self.yoga.refresh_from_db()
+        self.zumba.refresh_from_db()
+        self.assertEqual((self.yoga.available_slots, self.zumba.available_slots), (0, 0))
+
+    def test_all_or_nothing_rolls_back(self):
+        entries = [self._entry(self.yoga, 0), self._entry(self.zumba, 0), self._entry(self.zumba, 1)]
+        response = self.client.post(reverse('api_book_batch'), {'bookings': entries}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([r['code'] for r in response.data['data']], ['aborted', 'full', 'full'])
+        self.assertFalse(Booking.objects.exists())
+        self.yoga.refresh_from_db()
+        self.assertEqual(self.yoga.available_slots, 3)
+
+    def test_best_effort_books_what_fits(self):
+        entries = [
+            self._entry(self.zumba, 0),
+            self._entry(self.zumba, 1),
+            self._entry(self.yoga, 0),
+            self._entry(self.yoga, 0),
+            {'class_id': self.yoga.id, 'client_name': 'Bad 1', 'client_email': 'x@example.com'},
+        ]
+        response = self.client.post(reverse('api_book_batch'), {
+            'mode': 'best_effort',
+            'bookings': entries
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'partial')
+        self.assertEqual(
+            [r['status'] if r['status'] == 'booked' else r['code'] for r in response.data['data']],
+            ['booked', 'full', 'booked', 'duplicate', 'invalid']
+        )
+        self.assertEqual(Booking.objects.count(), 2)
+
+class CancellationTest(APITestCase):
+    def setUp(self):
+        self.fitness_class = FitnessClass.objects.create(
+            name='YOGA',
+            instructor='Test Instructor',
+            datetime=timezone.now() + timedelta(days=1),
+            total_slots=3,
+            available_slots=3
+        )
+        self.other_class = FitnessClass.objects.create(
+            name='HIIT',
+            instructor='Another Instructor',
+            datetime=timezone.now() + timedelta(days=2),
+            total_slots=3,
+            available_slots=3
+        )
+        self.booking = services.book_class(self.fitness_class.id, 'John Doe', 'john@example.com')
+
+    def _cancel(self, booking_id, email='john@example.com'):
+        return self.client.post(
+            reverse('api_cancel_booking', args=[booking_id]), {'client_email': email}, format='json'
+        )
+
+    def test_cancel_releases_slot_without_deleting(self):
+        response = self._cancel(self.booking.id)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.booking.refresh_from_db()
+        self.assertTrue(self.booking.is_cancelled)
+        self.fitness_class.refresh_from_db()
+        self.assertEqual(self.fitness_class.available_slots, 3)
+
+    def test_cancel_twice_releases_once(self):
+        self._cancel(self.booking.id)
+        response = self._cancel(self.booking.id)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.fitness_class.refresh_from_db()
+        self.assertEqual(self.fitness_class.available_slots, 3)
+
+    def test_cancel_requires_owner_email(self):
+        response = self._cancel(self.booking.id, email='someone@example.com')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_rebook_after_cancel(self):
+        self._cancel(self.booking.id)
+        services.book_class(self.fitness_class.id, 'John Doe', 'john@example.com')
+        self.assertEqual(Booking.objects.filter(fitness_class=self.fitness_class).count(), 2)
+
+    def test_bulk_cancel_single_release_update(self):
+        second = services.book_class(self.fitness_class.id, 'John Doe', 'john2@example.com')
+        third = services.book_class(self.other_class.id, 'John Doe', 'john@example.com')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('api_cancel_bookings'), {
+                'client_email': 'john@example.com',
+                'booking_ids': [self.booking.id, second.id, third.id]
+            }, format='json')
+        self.assertEqual(sorted(response.data['data']['cancelled']), sorted([self.booking.id, third.id]))
+        self.assertEqual(response.data['data']['not_cancelled'], [second.id])
+        updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "studio_fitnessclass"')]
+        self.assertEqual(len(updates), 1)
+
+        self.fitness_class.refresh_from_db()
+        self.other_class.refresh_from_db()
+        self.assertEqual((self.fitness_class.available_slots, self.other_class.available_slots), (2, 3))
+
+    def test_deleting_cancelled_booking_keeps_slots(self):
+        self._cancel(self.booking.id)
+        Booking.objects.get(pk=self.booking.pk).delete()
+        self.fitness_class.refresh_from_db()
+        self.assertEqual(self.fitness_class.available_slots, 3)
+
+class WaitlistTest(APITestCase):
+    def setUp(self):
+        self.fitness_class = FitnessClass.objects.create(
+            name='YOGA',
+            instructor='Test Instructor',
+            datetime=timezone.now() + timedelta(days=1),
+            total_slots=2,
+            available_slots=2
+        )
+        self.bookings = [
+            services.book_class(self.fitness_class.id, 'Booked', f'booked{n}@example.com')
+            for n in range(2)
+        ]
+        for n in range(3):
+            response = self.client.post(reverse('api_class_waitlist', args=[self.fitness_class.id]), {
+                'client_name': 'Waiter',
+                'client_email': f'waiter{n}@example.com'
+            }, format='json')
+            self.assertEqual(response.data['data']['position'], n + 1)
+
+    def _active_emails(self):
+        return set(Booking.objects.filter(fitness_class=self.fitness_class, is_cancelled=False)
+                   .values_list('client_email', flat=True))
+
+    def test_join_rejected_when_slots_available(self):
+        other = FitnessClass.objects.create(
+            name='HIIT',
+            instructor='Test Instructor',
+            datetime=timezone.now() + timedelta(days=1),
+            total_slots=2,
+            available_slots=2
+        )
+        response = self.client.post(reverse('api_class_waitlist', args=[other.id]), {
+            'client_name': 'Waiter',
+            'client_email': 'waiter@example.com'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_cancellation_promotes_in_fifo_order(self):
+        services.cancel_bookings([self.bookings[0].id], 'booked0@example.com')
+        self.assertEqual(self._active_emails(), {'booked1@example.com', 'waiter0@example.com'})
+        self.fitness_class.refresh_from_db()
+        self.assertEqual(self.fitness_class.available_slots, 0)
+
+        response = self.client.get(
+            reverse('api_class_waitlist', args=[self.fitness_class.id]) + '?email=waiter2@example.com'
+        )
+        self.assertEqual(response.data['data']['position'], 2)
+
+    def test_several_freed_slots_promote_several_waiters(self):
+        services.cancel_bookings([self.bookings[0].id], 'booked0@example.com')
+        services.cancel_bookings([self.bookings[1].id], 'booked1@example.com')
+        self.assertEqual(self._active_emails(), {'waiter0@example.com', 'waiter1@example.com'})
+
+    def test_waiter_who_already_booked_passes_the_slot_on(self):
+        # waiter0 got a seat outside the queue; bulk_create keeps the slot count as is
+        Booking.objects.bulk_create([
+            Booking(fitness_class=self.fitness_class, client_name='Waiter', client_email='waiter0@example.com')
+        ])
+        services.cancel_bookings([self.bookings[0].id], 'booked0@example.com')
+        self.assertIn('waiter1@example.com', self._active_emails())
+        self.assertFalse(WaitlistEntry.objects.filter(client_email='waiter0@example.com').exists())
+        self.fitness_class.refresh_from_db()
+        self.assertEqual(self.fitness_class.available_slots, 0)
+
+    def test_capacity_increase_promotes_waiters(self):
+        fitness_class = FitnessClass.objects.get(pk=self.fitness_class.pk)
+        fitness_class.total_slots = 4
+        fitness_class.save()
+        self.assertEqual(
+            self._active_emails(),
+            {'booked0@example.com', 'booked1@example.com', 'waiter0@example.com', 'waiter1@example.com'}
+        )
+        fitness_class.refresh_from_db()
+        self.assertEqual(fitness_class.available_slots, 0)
+        self.assertEqual(WaitlistEntry.objects.waiting().count(), 1)
+
+class LoadTestCommandTest(TransactionTestCase):
+    def test_loadtest_books_up_to_capacity(self):
+        out = StringIO()
+        call_command('loadtest_booking', slots=5, requests=8, concurrency=2, keep=True, stdout=out)
+        self.assertIn('Booked:       5', out.getvalue())
+        self.assertIn('Oversell check passed', out.getvalue())
+
+    def test_loadtest_detects_counter_drift(self):
+        fitness_class = FitnessClass.objects.create(
+            name='YOGA',
+            instructor='Test Instructor',
+            datetime=timezone.now() + timedelta(days=1),
+            total_slots=5,
+            available_slots=5
+        )
+        # bulk_create skips the post_save signal, so the counter drifts
+        Booking.objects.bulk_create([
+            Booking(fitness_class=fitness_class, client_name='Ghost', client_email='ghost@example.com')
+        ])
+        with self.assertRaises(CommandError):
+            call_command('loadtest_booking', class_ids=[fitness_class.id], requests=0, stdout=StringIO())
+
+class PerformanceMetricsTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        REGISTRY.reset()
+        self.fitness_class = FitnessClass.objects.create(
+            name='YOGA',
+            instructor='Test Instructor',
+            datetime=timezone.now() + timedelta(days=1),
+            total_slots=10,
+            available_slots=10
+        )
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('api_get_classes'))
+        timing = response['Server-Timing']
+        self.assertIn('db;dur=', timing)
+        self.assertIn('serialize;dur=', timing)
+        self.assertIn('total;dur=', timing)
+
+        # A cache hit reports only the validator query and no serialization
+        response = self.client.get(reverse('api_get_classes'))
+        self.assertIn('desc="1 queries"', response['Server-Timing'])
+        self.assertNotIn('serialize', response['Server-Timing'])
+
+    def test_metrics_exposes_histograms(self):
+        self.client.get(reverse('api_get_classes'))
+        self.client.post(reverse('api_book_class'), {
+            'class_id': self.fitness_class.id,
+            'client_name': 'John Doe',
+            'client_email': 'john@example.com'
+        }, format='json')
+
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.client.force_login(User.objects.create_user('staff', 'staff@example.com', 'pw', is_staff=True))
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.client.logout()
+        self.assertIn('# TYPE studio_request_duration_seconds histogram', body)
+        self.assertIn('studio_requests_total{view="api_book_class",method="POST",status="201"} 1', body)
+        self.assertIn('studio_db_queries_per_request_bucket{view="api_book_class",method="POST",le="+Inf"} 1', body)
+        self.assertIn('studio_serializer_duration_seconds_count{view="api_get_classes",method="GET"} 1', body)
+
+    @override_settings(STUDIO_METRICS_TOKEN='scrape-secret')
+    def test_metrics_scrape_token(self):
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json()['message'], 'Metrics require a staff login')
+
+class AsyncStack:
+    """URLconf serving the read endpoints from studio.async_views"""
+    urlpatterns = async_urlpatterns
+
+
+@override_settings(ROOT_URLCONF=AsyncStack)
+class AsyncReadPathTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.fitness_class = FitnessClass.objects.create(
+            name='YOGA',
+            instructor='Test Instructor',
+            datetime=timezone.now() + timedelta(days=1),
+            total_slots=10,
+            available_slots=10
+        )
+        services.book_class(self.fitness_class.id, 'John Doe', 'john@example.com')
+
+    def test_routes_use_async_views(self):
+        match = resolve('/classes/', urlconf=AsyncStack)
+        self.assertTrue(iscoroutinefunction(match.func))
+
+    async def test_async_get_classes_matches_sync_payload(self):
+        response = await self.async_client.get('/classes/')
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['count'], 1)
+        self.assertEqual(body['data'][0]['available_slots'], 9)
+        self.assertIn('Server-Timing', response.headers)
+
+    async def test_async_get_bookings(self):
+        response = await self.async_client.get('/bookings/', {'email': 'john@example.com'})
+        self.assertEqual(response.json()['data'][0]['client_email'], 'john@example.com')
+
+        response = await self.async_client.get('/bookings/')
+        self.assertEqual(response.status_code, 400)
+
+    async def test_async_template_views(self):
+        response = await self.async_client.get('/')
+        self.assertContains(response, 'Test Instructor')
+        response = await self.async_client.get('/view-bookings/', {'email': 'nobody@example.com'})
+        self.assertContains(response, 'No bookings found for this email.')
+
+    async def test_async_export_streams(self):
+        response = await self.async_client.get('/bookings/export/', {'format': 'ndjson'})
+        self.assertEqual(response.status_code, 403)
+
+        staff = await sync_to_async(User.objects.create_user)('staff', 'staff@example.com', 'pw', is_staff=True)
+        await self.async_client.aforce_login(staff)
+        response = await self.async_client.get('/bookings/export/', {'format': 'ndjson'})
+        self.assertTrue(response.streaming)
+        body = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(json.loads(body)['client_email'], 'john@example.com')
+
+    async def test_async_conditional_get(self):
+        response = await self.async_client.get('/classes/')
+        response = await self.async_client.get('/classes/', headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+
+@override_settings(STUDIO_WRITE_RETRY_DELAY=0)
+class SQLiteTuningTest(TransactionTestCase):
+    def test_pragmas_and_immediate_transactions(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+    def test_lock_errors_are_retried(self):
+        calls = []
+
+        @retry_on_locked
+        def write():
+            calls.append(1)
+            if len(calls) < 3:
+                raise OperationalError('database is locked')
+            return 'ok'
+
+        self.assertEqual(write(), 'ok')
+        self.assertEqual(len(calls), 3)
+
+    def test_other_errors_and_nested_calls_are_not_retried(self):
+        calls = []
+
+        @retry_on_locked
+        def write(message):
+            calls.append(1)
+            raise OperationalError(message)
+
+        with self.assertRaises(OperationalError):
+            write('no such table: studio_booking')
+        self.assertEqual(len(calls), 1)
+
+        calls.clear()
+        with self.assertRaises(OperationalError), transaction.atomic():
+            write('database is locked')
+        self.assertEqual(len(calls), 1)
+
+
+class SeedDataCommandTest(TestCase):
+    def _generate(self, **options):
+        call_command('seed_data', stdout=StringIO(), **options)
+        return list(FitnessClass.objects.order_by('datetime', 'id').values_list(
+            'name', 'instructor', 'datetime', 'total_slots', 'available_slots'
+        ))
+
+    def test_sample_classes_by_default(self):
+        call_command('seed_data', stdout=StringIO())
+        self.assertEqual(FitnessClass.objects.count(), 6)
+
+    def test_generated_data_is_consistent_and_reproducible(self):
+        first = self._generate(classes=40, bookings=300, days=7, past_days=2, seed=3, batch_size=50)
+        self.assertEqual(len(first), 40)
+        self.assertEqual(Booking.objects.count(), 300)
+        # available_slots matches the bookings written behind the signals' back
+        mismatched = FitnessClass.objects.annotate(n=Count('bookings')).exclude(
+            available_slots=F('total_slots') - F('n')
+        )
+        self.assertFalse(mismatched.exists())
+        self.assertTrue(FitnessClass.objects.filter(datetime__lt=timezone.now()).exists())
+        self.assertTrue(FitnessClass.objects.upcoming().exists())
+
+        self.assertEqual(self._generate(classes=40, bookings=300, days=7, past_days=2, seed=3), first)
+        self.assertNotEqual(self._generate(classes=40, bookings=300, days=7, past_days=2, seed=4), first)
+
+    def test_bookings_are_capped_by_capacity(self):
+        out = StringIO()
+        call_command('seed_data', classes=2, bookings=1000, days=1, seed=1, stdout=out)
+        capacity = sum(FitnessClass.objects.values_list('total_slots', flat=True))
+        self.assertEqual(Booking.objects.count(), capacity)
+        self.assertIn('fit into the generated capacity', out.getvalue())
+
+
+class BookingExportTest(APITestCase):
+    def setUp(self):
+        self.tomorrow = FitnessClass.objects.create(
+            name='YOGA', instructor='Priya Sharma',
+            datetime=timezone.now() + timedelta(days=1), total_slots=10, available_slots=10
+        )
+        self.next_week = FitnessClass.objects.create(
+            name='HIIT', instructor='Karan Singh',
+            datetime=timezone.now() + timedelta(days=7), total_slots=10, available_slots=10
+        )
+        services.book_class(self.tomorrow.id, 'John Doe', 'john@example.com')
+        services.book_class(self.tomorrow.id, 'Jane Doe', 'jane@example.com')
+        services.book_class(self.next_week.id, 'John Doe', 'john@example.com')
+        cancelled = services.book_class(self.next_week.id, 'Jane Doe', 'jane@example.com')
+        services.cancel_bookings([cancelled.id], 'jane@example.com')
+        self.client.force_login(User.objects.create_user('staff', 'staff@example.com', 'pw', is_staff=True))
+
+    def _export(self, **params):
+        response = self.client.get(reverse('api_export_bookings'), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_class_roster_csv(self):
+        lines = self._export(class_id=self.tomorrow.id).splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['booking_id', 'class_id', 'class_name'])
+        self.assertEqual(len(lines), 3)
+        self.assertIn('jane@example.com', lines[2])
+
+    def test_email_history_ndjson(self):
+        rows = [json.loads(line) for line in self._export(email='john@example.com', format='ndjson').splitlines()]
+        self.assertEqual([row['class_name'] for row in rows], ['YOGA', 'HIIT'])
+
+    def test_date_range_and_cancelled(self):
+        day = timezone.localtime(self.next_week.datetime).date().isoformat()
+        rows = self._export(start=day, end=day, format='ndjson').splitlines()
+        self.assertEqual(len(rows), 1)
+        rows = self._export(start=day, end=day, format='ndjson', include_cancelled='1').splitlines()
+        self.assertEqual(len(rows), 2)
+
+    def test_export_requires_staff(self):
+        self.client.logout()
+        response = self.client.get(reverse('api_export_bookings'))
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json()['message'], 'Exports require a staff login')
+
+        self.client.force_login(User.objects.create_user('client', 'john@example.com', 'pw'))
+        response = self.client.get(reverse('api_export_bookings'), {'email': 'john@example.com'})
+        self.assertEqual(response.status_code, 403)
+
+    def test_invalid_parameters(self):
+        for params in ({'format': 'xml'}, {'start': 'tomorrow'}, {'class_id': 'abc'}):
+            response = self.client.get(reverse('api_export_bookings'), params)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()['status'], 'error')
+
+    def test_export_command(self):
+        out = StringIO()
+        call_command('export_bookings', '--email', 'jane@example.com', '--format', 'ndjson', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 1)
+        with self.assertRaises(CommandError):
+            call_command('export_bookings', '--start', '2024-13-01', stdout=StringIO())
+
+
+class ScheduleImportTest(TestCase):
+    def setUp(self):
+        today = timezone.localdate()
+        self.next_monday = today + timedelta(days=7 - today.weekday())
+
+    def test_recurring_schedule_expands_in_local_time(self):
+        classes = expand_schedule('yoga', 'Priya Sharma', '07:00', 20, days='Mon/Wed',
+                                  weeks=12, start_date=self.next_monday)
+        self.assertEqual(len(classes), 24)
+        local = [timezone.localtime(c.datetime) for c in classes]
+        self.assertEqual({(t.weekday(), t.hour, t.minute) for t in local}, {(0, 7, 0), (2, 7, 0)})
+        self.assertTrue(all(c.available_slots == 20 and c.name == 'YOGA' for c in classes))
+
+        with self.assertRaises(ScheduleError):
+            expand_schedule('PILATES', 'Priya Sharma', '07:00', 20)
+        with self.assertRaises(ScheduleError):
+            expand_schedule('YOGA', 'Priya Sharma', '7am', 20, days='Mon')
+
+    def test_import_is_set_based_and_skips_duplicates(self):
+        classes = expand_schedule('YOGA', 'Priya Sharma', '07:00', 20, days='Mon/Wed/Fri',
+                                  weeks=13, start_date=self.next_monday)
+        # One SELECT for duplicates and one INSERT, plus the savepoint pair;
+        # the summary rebuild of the imported days adds two aggregate SELECTs
+        # per live and archive table, a DELETE and one INSERT in a nested savepoint
+        with self.assertNumQueries(12):
+            created, skipped = import_classes(classes)
+        self.assertEqual((len(created), len(skipped)), (39, 0))
+        self.assertEqual(FitnessClass.objects.count(), 39)
+
+        again = expand_schedule('YOGA', 'Priya Sharma', '07:00', 20, days='Mon/Wed/Fri',
+                                weeks=14, start_date=self.next_monday)
+        created, skipped = import_classes(again)
+        self.assertEqual((len(created), len(skipped)), (3, 39))
+
+    def test_csv_timetable_command(self):
+        path = self._timetable([
+            'name,instructor,start_date,time,total_slots,days,weeks',
+            f'YOGA,Priya Sharma,{self.next_monday},07:00,20,Mon/Wed,4',
+            f'HIIT,Karan Singh,{self.next_monday},18:30,15,,',
+        ])
+        out = StringIO()
+        call_command('import_schedule', '--csv', path, stdout=out)
+        self.assertIn('Created 9 classes, skipped 0 duplicates', out.getvalue())
+        self.assertEqual(FitnessClass.objects.filter(name='HIIT').count(), 1)
+
+        bad = self._timetable(['name,instructor,start_date,time,total_slots', 'YOGA,,2030-01-01,07:00,10'])
+        with self.assertRaisesMessage(CommandError, 'Line 2: Instructor is required'):
+            call_command('import_schedule', '--csv', bad, stdout=StringIO())
+
+    def test_admin_repeat_weekly_action(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        fitness_class = FitnessClass.objects.create(
+            name='ZUMBA', instructor='Meera Patel',
+            datetime=timezone.now() + timedelta(days=1), total_slots=10, available_slots=10
+        )
+        response = self.client.post(reverse('admin:studio_fitnessclass_changelist'), {
+            'action': 'repeat_selected_weekly',
+            '_selected_action': [fitness_class.id],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(FitnessClass.objects.filter(instructor='Meera Patel').count(), 13)
+
+    def _timetable(self, lines):
+        handle = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False)
+        with handle:
+            handle.write('\n'.join(lines) + '\n')
+        self.addCleanup(os.remove, handle.name)
+        return handle.name
+
+
+class ConditionalGetTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.fitness_class = FitnessClass.objects.create(
+            name='YOGA',
+            instructor='Test Instructor',
+            datetime=timezone.now() + timedelta(days=1),
+            total_slots=10,
+            available_slots=10
+        )
+
+    def test_classes_not_modified_after_one_query(self):
+        url = reverse('api_get_classes')
+        response = self.client.get(url)
+        etag = response['ETag']
+        # A class starting or being deleted moves no timestamp forward
+        self.assertNotIn('Last-Modified', response)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=http_date(time.time()))
+        self.assertEqual(response.status_code, 200)
+
+
+        # Taking a slot bumps updated_at, so the old ETag no longer matches
+        with self.captureOnCommitCallbacks(execute=True):
+            services.book_class(self.fitness_class.id, 'John Doe', 'john@example.com')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['data'][0]['available_slots'], 9)
+        self.assertNotEqual(response['ETag'], etag)
+
+        # Deleting the class drops it from the count
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            FitnessClass.objects.filter(pk=self.fitness_class.pk).delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['data'], [])
+
+    def test_bad_parameters_are_rejected_before_the_precondition(self):
+        url = reverse('api_get_classes')
+        etag = self.client.get(url)['ETag']
+        for params in ({'time_from': '7am'}, {'cursor': 'not-a-cursor'}):
+            response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 400)
+
+        url = reverse('api_get_bookings')
+        etag = self.client.get(url, {'email': 'john@example.com'})['ETag']
+        response = self.client.get(url, {'email': 'john@example.com', 'cursor': 'x'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 400)
+
+    def test_bookings_etag_follows_active_bookings(self):
+        url = reverse('api_get_bookings') + '?email=john@example.com'
+        booking = services.book_class(self.fitness_class.id, 'John Doe', 'john@example.com')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        services.cancel_bookings([booking.id], 'john@example.com')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 0)
+
+    def test_bookings_etag_follows_the_embedded_class(self):
+        url = reverse('api_get_bookings') + '?email=john@example.com'
+        services.book_class(self.fitness_class.id, 'John Doe', 'john@example.com')
+        etag = self.client.get(url)['ETag']
+
+        # Another client's booking changes the embedded available_slots
+        services.book_class(self.fitness_class.id, 'Jane Doe', 'jane@example.com')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['data'][0]['fitness_class']['available_slots'], 8)
+        etag = response['ETag']
+
+        # The class starting flips is_available
+        with mock.patch('studio.conditional.timezone.now', return_value=self.fitness_class.datetime + timedelta(minutes=1)):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class TemplatePageTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.fitness_class = FitnessClass.objects.create(
+            name='YOGA',
+            instructor='Test Instructor',
+            datetime=timezone.now() + timedelta(days=1),
+            total_slots=10,
+            available_slots=10
+        )
+
+    def test_warm_pages_issue_no_queries(self):
+        self.client.get(reverse('home'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('home'))
+        self.assertContains(response, 'Test Instructor')
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('book_class_page'))
+        self.assertContains(response, '(10 slots left)')
+
+    def test_view_bookings_page_is_one_query(self):
+        services.book_class(self.fitness_class.id, 'John Doe', 'john@example.com')
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('view_bookings_page'), {'email': 'john@example.com'})
+        self.assertContains(response, 'John Doe booked YOGA')
+
+    def test_booking_refreshes_cached_fragments(self):
+        self.client.get(reverse('book_class_page'))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('book_class_page'), {
+                'class_id': self.fitness_class.id,
+                'client_name': 'John Doe',
+                'client_email': 'john@example.com'
+            })
+        self.assertContains(response, 'Booking successful!')
+        # The catalog is invalidated on commit, which the test transaction defers
+        self.assertContains(self.client.get(reverse('book_class_page')), '(9 slots left)')
+
+        # Errors render the same cached options without re-querying the classes
+        with self.assertNumQueries(0):
+            response = self.client.post(reverse('book_class_page'), {'class_id': self.fitness_class.id})
+        self.assertContains(response, 'All fields are required')
+        self.assertContains(response, '(9 slots left)')
+
+    def test_started_classes_drop_out_of_cached_table(self):
+        self.client.get(reverse('home'))
+        # The class starts: the catalog version stays, the entry count drops
+        with mock.patch('studio.catalog.time') as clock:
+            clock.time.return_value = self.fitness_class.datetime.timestamp() + 1
+            response = self.client.get(reverse('home'))
+        self.assertNotContains(response, 'Test Instructor')
+
+
+class StructuredLoggingTest(APITestCase):
+    def test_records_carry_request_context(self):
+        FitnessClass.objects.create(
+            name='YOGA', instructor='Test Instructor',
+            datetime=timezone.now() + timedelta(days=1), total_slots=10, available_slots=10
+        )
+        with self.assertLogs('studio', level='INFO') as logs:
+            self.client.get(reverse('api_get_classes'))
+        record = logs.records[-1]
+        line = json.loads(JsonFormatter().format(record))
+        self.assertEqual(line['message'], 'Retrieved 1 upcoming classes')
+        self.assertEqual(line['event'], 'classes_listed')
+        self.assertEqual(line['view'], 'api_get_classes')
+        self.assertEqual(line['count'], 1)
+        self.assertIn('elapsed_ms', line)
+
+    def test_sampling_only_touches_listed_events(self):
+        sampling = SamplingFilter(rates={'classes_listed': 0})
+        listed = logging.makeLogRecord({'msg': 'Retrieved %d upcoming classes', 'args': (3,), 'event': 'classes_listed'})
+        booked = logging.makeLogRecord({'msg': 'Booking created', 'event': 'booking'})
+        self.assertFalse(sampling.filter(listed))
+        self.assertTrue(sampling.filter(booked))
+        self.assertTrue(SamplingFilter(rates={'classes_listed': 1}).filter(listed))
+
+    def test_queue_handler_writes_on_listener_thread(self):
+        written = []
+
+        class Collect(logging.Handler):
+            def emit(self, record):
+                written.append((threading.current_thread(), self.format(record)))
+
+        handler = QueueListenerHandler(targets=[Collect()])
+        self.addCleanup(handler.close)
+        logger = logging.getLogger('studio.tests.queue')
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+
+        logger.warning('Booking rejected (%s)', 'full')
+        handler.flush()
+        self.assertEqual(written[0][1], 'Booking rejected (full)')
+        self.assertIsNot(written[0][0], threading.current_thread())
+
+        # A forked worker inherits the handler but not the listener thread
+        parent_listener = handler.listener
+        with mock.patch('studio.log.os.getpid', return_value=os.getpid() + 1):
+            logger.warning('Logged after fork')
+            handler.flush()
+            self.assertIsNot(handler.listener, parent_listener)
+            self.assertEqual(written[-1][1], 'Logged after fork')
+            handler.close()
+        parent_listener.stop()
+
+
+class IdempotencyKeyTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.fitness_class = FitnessClass.objects.create(
+            name='YOGA', instructor='Test Instructor',
+            datetime=timezone.now() + timedelta(days=1), total_slots=10, available_slots=10
+        )
+        self.payload = {
+            'class_id': self.fitness_class.id,
+            'client_name': 'John Doe',
+            'client_email': 'john@example.com'
+        }
+
+    def _book(self, key, payload=None):
+        return self.client.post(reverse('api_book_class'), payload or self.payload,
+                                format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_original_response_without_queries(self):
+        first = self._book('retry-1')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+
+        with self.assertNumQueries(0):
+            retry = self._book('retry-1')
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Booking.objects.count(), 1)
+
+        # A new key is a new attempt and hits the duplicate check
+        self.assertEqual(self._book('retry-2').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_key_reused_with_other_body_is_rejected(self):
+        self._book('reuse')
+        response = self._book('reuse', {**self.payload, 'client_email': 'jane@example.com'})
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    @override_settings(STUDIO_IDEMPOTENCY_WAIT=0)
+    def test_in_flight_duplicate_is_not_run_twice(self):
+        cache.add('studio:idempotency:book_class:in-flight', 'pending')
+        response = self._book('in-flight')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Booking.objects.count(), 0)
+
+
+class IdempotencyCoalescingTest(TransactionTestCase):
+    def test_concurrent_duplicates_reach_the_database_once(self):
+        cache.clear()
+        fitness_class = FitnessClass.objects.create(
+            name='YOGA', instructor='Test Instructor',
+            datetime=timezone.now() + timedelta(days=1), total_slots=10, available_slots=10
+        )
+        calls = []
+        book_class = services.book_class
+
+        def slow_book(*args):
+            calls.append(1)
+            time.sleep(0.2)
+            return book_class(*args)
+
+        def post(_):
+            return self.client_class().post(reverse('api_book_class'), {
+                'class_id': fitness_class.id,
+                'client_name': 'John Doe',
+                'client_email': 'john@example.com'
+            }, content_type='application/json', HTTP_IDEMPOTENCY_KEY='burst')
+
+        with mock.patch.object(services, 'book_class', slow_book), ThreadPoolExecutor(4) as pool:
+            responses = list(pool.map(post, range(4)))
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual({r.status_code for r in responses}, {201})
+        self.assertEqual(len({r.json()['data']['id'] for r in responses}), 1)
+
+
+class ClassFilterTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        tomorrow = timezone.localdate() + timedelta(days=1)
+
+        def at(day, hour, minute=0):
+            return timezone.make_aware(datetime.combine(day, dt_time(hour, minute)))
+
+        self.yoga = FitnessClass.objects.create(
+            name='YOGA', instructor='Priya Sharma', datetime=at(tomorrow, 7), total_slots=10, available_slots=10
+        )
+        self.zumba = FitnessClass.objects.create(
+            name='ZUMBA', instructor='Rahul Gupta', datetime=at(tomorrow, 18), total_slots=10, available_slots=10
+        )
+        self.hiit = FitnessClass.objects.create(
+            name='HIIT', instructor='Anjali Verma', datetime=at(tomorrow + timedelta(days=2), 7, 30),
+            total_slots=10, available_slots=10
+        )
+        self.full = FitnessClass.objects.create(
+            name='YOGA', instructor='Priyanka Rao', datetime=at(tomorrow + timedelta(days=3), 9),
+            total_slots=1, available_slots=0
+        )
+        self.tomorrow = tomorrow
+
+    def _ids(self, **params):
+        response = self.client.get(reverse('api_get_classes'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [row['id'] for row in response.data['data']]
+
+    def test_filters(self):
+        self.assertEqual(self._ids(name='yoga'), [self.yoga.id, self.full.id])
+        self.assertEqual(self._ids(name='YOGA', available='1'), [self.yoga.id])
+        self.assertEqual(self._ids(start=self.tomorrow.isoformat(), end=self.tomorrow.isoformat()),
+                         [self.yoga.id, self.zumba.id])
+        self.assertEqual(self._ids(time_from='07:00', time_to='08:00'), [self.yoga.id, self.hiit.id])
+        self.assertEqual(self._ids(time_from='17:00'), [self.zumba.id])
+        # A window that wraps past midnight
+        self.assertEqual(self._ids(time_from='17:00', time_to='07:15'), [self.yoga.id, self.zumba.id])
+
+    def test_filters_in_the_requested_zone(self):
+        # 07:00 IST is 01:30 UTC, and the evening before in Los Angeles
+        self.assertEqual(self._ids(tz='UTC', time_from='01:00', time_to='02:00'), [self.yoga.id, self.hiit.id])
+        self.assertEqual(self._ids(tz='UTC', time_from='07:00', time_to='08:00'), [])
+        self.assertEqual(self._ids(tz='UTC', time_from='12:00'), [self.zumba.id])
+        day_before = (self.tomorrow - timedelta(days=1)).isoformat()
+        self.assertEqual(self._ids(tz='America/Los_Angeles', start=day_before, end=day_before), [self.yoga.id])
+        self.assertEqual(self._ids(tz='America/Los_Angeles', start=self.tomorrow.isoformat(), end=self.tomorrow.isoformat()),
+                         [self.zumba.id])
+
+    def test_instructor_search(self):
+        # Substrings of three or more characters, anywhere in the name
+        self.assertEqual(self._ids(instructor='SHARMA'), [self.yoga.id])
+        self.assertEqual(self._ids(instructor='priya'), [self.yoga.id, self.full.id])
+        self.assertEqual(self._ids(instructor='a sh'), [self.yoga.id])
+        # Shorter queries match the start of a word
+        self.assertEqual(self._ids(instructor='r'), [self.zumba.id, self.full.id])
+        self.assertEqual(self._ids(instructor='xyz'), [])
+
+    def test_filtered_reads_use_the_cached_index(self):
+        self._ids(name='HIIT')
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self._ids(instructor='verma', name='HIIT'), [self.hiit.id])
+        # Only the conditional-GET aggregate
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_pages_keep_the_filter(self):
+        response = self.client.get(reverse('api_get_classes'), {'name': 'YOGA', 'page_size': 1})
+        self.assertIn('name=YOGA', response.data['next'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([row['id'] for row in response.data['data']], [self.full.id])
+
+    def test_invalid_filters(self):
+        for params in ({'name': 'PILATES'}, {'start': 'tomorrow'}, {'time_from': '7am'}):
+            response = self.client.get(reverse('api_get_classes'), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.data['status'], 'error')
+
+    @override_settings(ROOT_URLCONF=AsyncStack)
+    async def test_async_filters(self):
+        response = await self.async_client.get('/classes/', {'instructor': 'gupta'})
+        self.assertEqual([row['id'] for row in response.json()['data']], [self.zumba.id])
+
+
+def make_upcoming_class(slots):
+    """A class starting tomorrow with every slot free"""
+    return FitnessClass.objects.create(
+        name='YOGA', instructor='Test Instructor',
+        datetime=timezone.now() + timedelta(days=1), total_slots=slots, available_slots=slots
+    )
+
+
+class ReconcileSlotsTest(TestCase):
+    def setUp(self):
+        self.fitness_class = make_upcoming_class(slots=3)
+        for n in range(2):
+            services.book_class(self.fitness_class.id, 'Client', f'client{n}@example.com')
+
+    def test_consistent_counters_are_left_alone(self):
+        with self.assertNumQueries(1):
+            checked, drift = find_drift()
+        self.assertEqual((checked, drift), (1, []))
+
+    def test_bulk_cancellation_drift_is_repaired(self):
+        # A queryset update sends no signals, so the slots never come back
+        Booking.objects.update(is_cancelled=True)
+        version = cache.get('studio:catalog:version')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            result = reconcile_slots()
+        self.assertEqual(result.drift[0].available, 1)
+        self.assertEqual(result.drift[0].expected, 3)
+        self.assertEqual(result.repaired, 1)
+        self.fitness_class.refresh_from_db()
+        self.assertEqual(self.fitness_class.available_slots, 3)
+        self.assertNotEqual(cache.get('studio:catalog:version'), version)
+
+    def test_overbooked_class_has_no_slots_left(self):
+        FitnessClass.objects.update(total_slots=1, available_slots=1)
+        reconcile_slots()
+        self.fitness_class.refresh_from_db()
+        self.assertEqual(self.fitness_class.available_slots, 0)
+
+    def test_counter_changed_after_the_read_is_not_overwritten(self):
+        Booking.objects.update(is_cancelled=True)
+        checked, drift = find_drift()
+        FitnessClass.objects.filter(pk=self.fitness_class.pk).update(available_slots=2)
+        self.assertEqual(repair_drift(drift), 0)
+        self.fitness_class.refresh_from_db()
+        self.assertEqual(self.fitness_class.available_slots, 2)
+
+    def test_freed_slots_promote_the_waitlist(self):
+        services.book_class(self.fitness_class.id, 'Client', 'client2@example.com')
+        services.join_waitlist(self.fitness_class.id, 'Wait Er', 'wait@example.com')
+        Booking.objects.filter(client_email='client0@example.com').update(is_cancelled=True)
+
+        reconcile_slots()
+        self.assertTrue(Booking.objects.active_for('wait@example.com').exists())
+        self.fitness_class.refresh_from_db()
+        self.assertEqual(self.fitness_class.available_slots, 0)
+
+    def test_since_only_checks_changed_classes(self):
+        Booking.objects.update(is_cancelled=True)
+        FitnessClass.objects.update(updated_at=timezone.now() - timedelta(days=2))
+        self.assertEqual(reconcile_slots(since=timezone.now() - timedelta(days=1)).checked, 0)
+
+        out = StringIO()
+        call_command('reconcile_slots', '--since', '3d', '--dry-run', stdout=out)
+        self.assertIn('available_slots 1, expected 3', out.getvalue())
+        self.assertIn('Checked 1 classes (changed), 1 drifted, would repair', out.getvalue())
+        self.fitness_class.refresh_from_db()
+        self.assertEqual(self.fitness_class.available_slots, 1)
+
+        with self.assertRaises(CommandError):
+            call_command('reconcile_slots', '--since', 'yesterday')
+
+
+class SlotReconcilerTest(TransactionTestCase):
+    def test_background_pass_repairs_drift(self):
+        fitness_class = make_upcoming_class(slots=3)
+        FitnessClass.objects.update(available_slots=0)
+
+        # Wait for a pass instead of polling the row: the test database is
+        # a shared-cache in-memory SQLite, where a read during the repair
+        # fails with "table is locked" instead of waiting
+        reconciled = threading.Event()
+
+        def run_pass(*args, **kwargs):
+            result = reconcile_slots(*args, **kwargs)
+            reconciled.set()
+            return result
+
+        reconciler = SlotReconciler(interval=0.01)
+        with mock.patch('studio.reconcile.reconcile_slots', side_effect=run_pass):
+            reconciler.start()
+            try:
+                self.assertTrue(reconciled.wait(5))
+            finally:
+                reconciler.stop()
+                reconciler.join()
+        fitness_class.refresh_from_db()
+        self.assertEqual(fitness_class.available_slots, 3)
+
+    def test_full_pass_catches_booking_side_drift(self):
+        # Incremental passes only see classes whose updated_at moved;
+        # bulk booking changes do not touch it
+        calls = []
+
+        def run_pass(since=None, dry_run=False):
+            calls.append(since)
+            if len(calls) == 4:
+                reconciler.stop()
+            return None
+
+        reconciler = SlotReconciler(interval=0, full_interval=3600)
+        with mock.patch('studio.reconcile.reconcile_slots', side_effect=run_pass):
+            reconciler.run()
+        self.assertIsNone(calls[0])
+        self.assertTrue(all(since is not None for since in calls[1:]))
+
+        calls.clear()
+        reconciler = SlotReconciler(interval=0, full_interval=0)
+        with mock.patch('studio.reconcile.reconcile_slots', side_effect=run_pass):
+            reconciler.run()
+        self.assertEqual(calls, [None] * 4)
+
+
+class AnalyticsTest(TestCase):
+    def setUp(self):
+        self.yoga = FitnessClass.objects.create(
+            name='YOGA', instructor='Priya', datetime=timezone.now() + timedelta(days=1),
+            total_slots=2, available_slots=2
+        )
+        self.hiit = FitnessClass.objects.create(
+            name='HIIT', instructor='Ravi', datetime=timezone.now() - timedelta(days=1),
+            total_slots=4, available_slots=4
+        )
+
+    def _counters(self):
+        return sorted(DailyClassStats.objects.values_list(
+            'day', 'class_type', 'instructor', 'class_count', 'total_slots', 'booking_count', 'cancellation_count'
+        ))
+
+    def test_write_paths_keep_summary_in_step_with_rebuild(self):
+        booking = services.book_class(self.yoga.id, 'John Doe', 'john@example.com')
+        services.book_batch([{'class_id': self.yoga.id, 'client_name': 'Jane', 'client_email': 'jane@example.com'}])
+        services.join_waitlist(self.yoga.id, 'Wait Er', 'wait@example.com')
+        # Cancelling promotes the waitlisted client: one cancellation, one more booking
+        services.cancel_bookings([booking.id], 'john@example.com')
+        Booking.objects.create(fitness_class=self.hiit, client_name='Old', client_email='old@example.com')
+
+        counters = self._counters()
+        self.assertEqual(len(counters), 2)
+        self.assertIn((timezone.localdate(self.yoga.datetime), 'YOGA', 'Priya', 1, 2, 3, 1), counters)
+        rebuild_stats()
+        self.assertEqual(self._counters(), counters)
+
+    def test_migration_backfills_existing_rows(self):
+        services.book_class(self.yoga.id, 'John Doe', 'john@example.com')
+        expected = self._counters()
+
+        DailyClassStats.objects.all().delete()
+        import_module('studio.migrations.0005_daily_class_stats').backfill_stats(apps, None)
+        self.assertEqual(self._counters(), expected)
+
+    def test_class_changes_recompute_their_days(self):
+        self.yoga.total_slots = 5
+        self.yoga.datetime += timedelta(days=3)
+        self.yoga.save()
+        self.assertEqual(
+            DailyClassStats.objects.get(class_type='YOGA').day, timezone.localdate(self.yoga.datetime)
+        )
+        self.assertEqual(DailyClassStats.objects.get(class_type='YOGA').total_slots, 5)
+
+        self.hiit.delete()
+        self.assertFalse(DailyClassStats.objects.filter(class_type='HIIT').exists())
+
+    def test_stats_endpoint_reads_only_the_summary(self):
+        services.book_class(self.yoga.id, 'John Doe', 'john@example.com')
+        Booking.objects.create(fitness_class=self.hiit, client_name='Old', client_email='old@example.com')
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('api_get_stats'), {'group_by': 'class_type'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = {row['class_type']: row for row in response.json()['data']}
+        self.assertEqual(rows['YOGA']['fill_rate'], 0.5)
+        self.assertEqual(rows['YOGA']['no_show_candidates'], 0)
+        self.assertEqual(rows['HIIT']['no_show_candidates'], 1)
+
+        response = self.client.get(reverse('api_get_stats'), {'class_type': 'yoga'})
+        self.assertEqual(response.json()['data'][0]['day'], timezone.localdate(self.yoga.datetime).isoformat())
+
+        self.assertEqual(self.client.get(reverse('api_get_stats'), {'group_by': 'room'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api_get_stats'), {'start': 'May'}).status_code, 400)
+
+    def test_rebuild_stats_command(self):
+        DailyClassStats.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_stats', stdout=out)
+        self.assertIn('Rebuilt 2 daily summary rows', out.getvalue())
+
+    @override_settings(ROOT_URLCONF=AsyncStack)
+    async def test_async_stats(self):
+        response = await self.async_client.get('/stats/', {'group_by': 'instructor'})
+        self.assertEqual([row['instructor'] for row in response.json()['data']], ['Priya', 'Ravi'])
+
+
+@override_settings(STUDIO_THROTTLE_RATES={
+    'book': {'ip': '100/min', 'email': '2/min'},
+    'classes': {'ip': '2/min'},
+})
+class ThrottlingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        LOCAL_STORE.clear()
+        self.fitness_class = FitnessClass.objects.create(
+            name='YOGA', instructor='Test Instructor',
+            datetime=timezone.now() + timedelta(days=1), total_slots=10, available_slots=10
+        )
+
+    def _book(self, email):
+        return self.client.post(reverse('api_book_class'), {
+            'class_id': self.fitness_class.id,
+            'client_name': 'John Doe',
+            'client_email': email
+        }, content_type='application/json')
+
+    def test_limit_answers_429_without_queries(self):
+        self.assertEqual(self.client.get(reverse('api_get_classes')).status_code, 200)
+        self.assertEqual(self.client.get(reverse('api_get_classes')).status_code, 200)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('api_get_classes'))
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertEqual(response.json(), {'status': 'error', 'message': 'Too many requests; retry in 30 seconds'})
+
+    def test_buckets_are_per_email(self):
+        self._book('john@example.com')
+        self._book('John@Example.com')
+        self.assertEqual(self._book('john@example.com').status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(self._book('jane@example.com').status_code, status.HTTP_201_CREATED)
+
+    def test_forwarded_for_cannot_dodge_ip_limit(self):
+        for n in range(2):
+            self.client.get(reverse('api_get_classes'), HTTP_X_FORWARDED_FOR=f'10.0.0.{n}')
+        response = self.client.get(reverse('api_get_classes'), HTTP_X_FORWARDED_FOR='10.0.0.9')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_denied_request_takes_no_tokens(self):
+        store = LocalBucketStore()
+        buckets = [('ip', 5, 60), ('email', 1, 60)]
+        self.assertEqual(store.take_all(buckets), 0)
+        for _ in range(3):
+            self.assertTrue(store.take_all(buckets))
+        # The email rejections left the IP bucket alone
+        self.assertEqual(round(store._buckets['ip'][0]), 4)
+
+    def test_unlisted_scope_is_not_limited(self):
+        for _ in range(5):
+            self.assertEqual(self.client.get(reverse('api_get_bookings'), {'email': 'a@example.com'}).status_code, 200)
+
+    def test_bucket_refills_over_time(self):
+        store = LocalBucketStore()
+        with mock.patch('studio.throttling.time.monotonic', side_effect=[0, 0, 0, 30]):
+            self.assertEqual(store.take('k', 2, 60), 0)
+            self.assertEqual(store.take('k', 2, 60), 0)
+            self.assertEqual(store.take('k', 2, 60), 30)
+            self.assertEqual(store.take('k', 2, 60), 0)
+
+    def test_store_is_bounded(self):
+        store = LocalBucketStore(max_keys=2)
+        for key in 'abc':
+            store.take(key, 1, 60)
+        self.assertEqual(list(store._buckets), ['b', 'c'])
+
+
+@override_settings(ROOT_URLCONF=AsyncStack, STUDIO_THROTTLE_RATES={'classes': {'ip': '1/min'}})
+class AsyncThrottlingTest(TestCase):
+    async def test_async_view_is_limited(self):
+        LOCAL_STORE.clear()
+        self.assertEqual((await self.async_client.get('/classes/')).status_code, 200)
+        response = await self.async_client.get('/classes/')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '60')
+
+
+class ArchiveTest(APITestCase):
+    def setUp(self):
+        self.old = FitnessClass.objects.create(
+            name='YOGA', instructor='Priya', datetime=timezone.now() - timedelta(days=120),
+            total_slots=3, available_slots=3
+        )
+        self.upcoming = FitnessClass.objects.create(
+            name='HIIT', instructor='Ravi', datetime=timezone.now() + timedelta(days=1),
+            total_slots=3, available_slots=3
+        )
+        self.old_booking = Booking.objects.create(
+            fitness_class=self.old, client_name='John Doe', client_email='john@example.com',
+            booked_at=timezone.now() - timedelta(days=121)
+        )
+        Booking.objects.create(
+            fitness_class=self.old, client_name='John Doe', client_email='john@example.com',
+            booked_at=timezone.now() - timedelta(days=122), is_cancelled=True
+        )
+        self.live_booking = services.book_class(self.upcoming.id, 'John Doe', 'john@example.com')
+
+    def _stats(self):
+        return sorted(DailyClassStats.objects.values_list(
+            'day', 'class_type', 'class_count', 'booking_count', 'cancellation_count'
+        ))
+
+    def test_old_classes_move_with_their_bookings(self):
+        rebuild_stats()
+        stats = self._stats()
+        self.old.refresh_from_db()
+        self.assertEqual(archive_classes(archive_cutoff()), (1, 2))
+
+        self.assertFalse(FitnessClass.objects.filter(pk=self.old.pk).exists())
+        self.assertEqual(Booking.objects.count(), 1)
+        archived = ArchivedClass.objects.get(pk=self.old.pk)
+        self.assertEqual((archived.name, archived.available_slots), ('YOGA', self.old.available_slots))
+        self.assertEqual(
+            list(ArchivedBooking.objects.active_for('john@example.com').values_list('id', flat=True)),
+            [self.old_booking.id]
+        )
+        # No signals: the upcoming class and the summary are untouched
+        self.upcoming.refresh_from_db()
+        self.assertEqual(self.upcoming.available_slots, 2)
+        self.assertEqual(self._stats(), stats)
+        rebuild_stats()
+        self.assertEqual(self._stats(), stats)
+
+        self.assertEqual(archive_classes(archive_cutoff()), (0, 0))
+
+    def test_batches(self):
+        for n in range(4):
+            FitnessClass.objects.create(
+                name='ZUMBA', instructor='Asha', datetime=timezone.now() - timedelta(days=100 + n),
+                total_slots=1, available_slots=1
+            )
+        with mock.patch('studio.archive.archive_batch', wraps=archive_batch) as batch:
+            self.assertEqual(archive_classes(archive_cutoff(), batch_size=2), (5, 2))
+        self.assertEqual(batch.call_count, 4)
+        self.assertEqual(FitnessClass.objects.count(), 1)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('archive_classes', '--dry-run', stdout=out)
+        self.assertIn('Would archive 1 classes', out.getvalue())
+        self.assertTrue(FitnessClass.objects.filter(pk=self.old.pk).exists())
+
+        out = StringIO()
+        call_command('archive_classes', '--older-than', '365', stdout=out)
+        self.assertIn('Archived 0 classes and 0 bookings', out.getvalue())
+        call_command('archive_classes', '--older-than', '30', stdout=out)
+        self.assertIn('Archived 1 classes and 2 bookings', out.getvalue())
+
+    def test_include_past_merges_archived_bookings(self):
+        archive_classes(archive_cutoff())
+        url = reverse('api_get_bookings')
+
+        response = self.client.get(url, {'email': 'john@example.com'})
+        self.assertEqual([row['id'] for row in response.data['data']], [self.live_booking.id])
+
+        response = self.client.get(url, {'email': 'john@example.com', 'include_past': '1', 'page_size': 1})
+        self.assertEqual([row['id'] for row in response.data['data']], [self.live_booking.id])
+        response = self.client.get(response.data['next'])
+        row = response.data['data'][0]
+        self.assertEqual((row['id'], row['fitness_class']['name']), (self.old_booking.id, 'YOGA'))
+        self.assertIsNone(response.data['next'])
+
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([row['id'] for row in response.data['data']], [self.live_booking.id])
+
+    def test_export_include_past(self):
+        archive_classes(archive_cutoff())
+        self.assertEqual([row['id'] for row in export_queryset(email='john@example.com')], [self.live_booking.id])
+
+        rows = list(export_queryset(email='john@example.com', include_past=True))
+        self.assertEqual([row['id'] for row in rows], [self.old_booking.id, self.live_booking.id])
+        self.assertEqual(rows[0]['fitness_class__name'], 'YOGA')
+        self.assertEqual(len(export_queryset(include_cancelled=True, include_past=True)), 3)
+
+        self.client.force_login(User.objects.create_user('staff', 'staff@example.com', 'pw', is_staff=True))
+        response = self.client.get(reverse('api_export_bookings'), {'format': 'ndjson', 'include_past': '1'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['booking_id'] for line in lines], [self.old_booking.id, self.live_booking.id])
+
+    def test_seed_data_clears_the_archive(self):
+        archive_classes(archive_cutoff())
+        call_command('seed_data', classes=2, bookings=1, stdout=StringIO())
+        self.assertFalse(ArchivedClass.objects.exists())
+        self.assertFalse(ArchivedBooking.objects.exists())
+
+    @override_settings(ROOT_URLCONF=AsyncStack)
+    async def test_async_include_past(self):
+        await sync_to_async(archive_classes)(archive_cutoff())
+        response = await self.async_client.get('/bookings/', {'email': 'john@example.com', 'include_past': 'true'})
+        self.assertEqual(
+            [row['id'] for row in response.json()['data']], [self.live_booking.id, self.old_booking.id]
+        )
+
+
+class TimezoneRenderingTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.starts = timezone.now().replace(microsecond=0) + timedelta(days=1)
+        self.fitness_class = FitnessClass.objects.create(
+            name='YOGA', instructor='Priya', datetime=self.starts, total_slots=5, available_slots=5
+        )
+        self.booking = services.book_class(self.fitness_class.id, 'John Doe', 'john@example.com')
+
+    def _local(self, value, name):
+        return value.astimezone(get_zone(name)).strftime('%Y-%m-%d %H:%M:%S %Z')
+
+    def test_studio_zone_by_default(self):
+        response = self.client.get(reverse('api_get_classes'))
+        self.assertEqual(response.data['data'][0]['local_datetime'], self._local(self.starts, 'Asia/Kolkata'))
+        self.assertTrue(response.data['data'][0]['local_datetime'].endswith(' IST'))
+        self.assertIn('Accept-Timezone', response['Vary'])
+
+    def test_classes_in_requested_zone(self):
+        default = self.client.get(reverse('api_get_classes'))
+        response = self.client.get(reverse('api_get_classes'), {'tz': 'America/New_York'})
+        self.assertEqual(response.data['data'][0]['local_datetime'], self._local(self.starts, 'America/New_York'))
+        self.assertNotEqual(response['ETag'], default['ETag'])
+        # The cached catalog stays in the studio zone
+        again = self.client.get(reverse('api_get_classes'))
+        self.assertEqual(again.data['data'][0]['local_datetime'], default.data['data'][0]['local_datetime'])
+
+        response = self.client.get(reverse('api_get_classes'), {'tz': 'Mars/Olympus'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['message'], 'Unknown time zone: Mars/Olympus')
+
+    def test_bookings_follow_accept_timezone(self):
+        response = self.client.get(
+            reverse('api_get_bookings'), {'email': 'john@example.com'}, headers={'Accept-Timezone': 'Europe/London'}
+        )
+        row = response.data['data'][0]
+        self.assertEqual(row['local_booked_time'], self._local(self.booking.booked_at, 'Europe/London'))
+        self.assertEqual(row['fitness_class']['local_datetime'], self._local(self.starts, 'Europe/London'))
+
+        response = self.client.get(
+            reverse('api_get_bookings'), {'email': 'john@example.com'},
+            headers={'If-None-Match': response['ETag']}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_zones_and_instants_are_reused(self):
+        self.assertIs(get_zone('Asia/Tokyo'), get_zone('Asia/Tokyo'))
+        with self.assertRaises(TimezoneError):
+            get_zone('../etc/passwd')
+
+        local_times = LocalTimes(get_zone('Asia/Tokyo'))
+        texts = local_times.format_timestamps([self.starts.timestamp()] * 3 + [0])
+        self.assertEqual(texts[0], self._local(self.starts, 'Asia/Tokyo'))
+        self.assertEqual(len(set(texts)), 2)
+        self.assertEqual(len(local_times._texts), 2)
+
+    @override_settings(ROOT_URLCONF=AsyncStack)
+    async def test_async_views(self):
+        response = await self.async_client.get('/classes/', {'tz': 'UTC'})
+        self.assertEqual(response.json()['data'][0]['local_datetime'], self._local(self.starts, 'UTC'))
+        response = await self.async_client.get('/bookings/', {'email': 'john@example.com'}, headers={'Accept-Timezone': 'UTC'})
+        self.assertEqual(response.json()['data'][0]['local_booked_time'], self._local(self.booking.booked_at, 'UTC'))
+        response = await self.async_client.get('/bookings/', {'email': 'john@example.com', 'tz': 'Nowhere'})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,191 @@
+"""Token-bucket rate limiting for the studio API.
+
+Each (endpoint scope, key kind, key) pair owns a bucket holding up to N
+tokens that refills at N per period, as configured in
+``STUDIO_THROTTLE_RATES`` (e.g. ``{'book': {'ip': '30/min', 'email':
+'10/min'}}``). A request takes one token from every bucket of its scope,
+or none if any of them is empty, in which case it gets 429 with
+``Retry-After`` set to the time until every bucket has a token. Buckets
+live in process memory behind a lock (an LRU-bounded dict, O(1) per
+check) or, with ``STUDIO_THROTTLE_CACHE`` set, in a shared Django cache
+so several workers enforce one limit. Checking a limit never touches the
+main database.
+
+The shared-cache store reads and writes buckets without a lock, so under
+heavy contention across workers a few extra requests may slip through.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import BaseThrottle
+from rest_framework.views import exception_handler as drf_exception_handler
+
+RATE_PERIODS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+
+
+def parse_rate(rate):
+    """'10/min' -> (capacity 10, refill of 10 tokens per 60 seconds)"""
+    count, period = rate.split('/')
+    return int(count), RATE_PERIODS[period]
+
+
+def _refill(tokens, stamp, now, capacity, period):
+    return min(capacity, tokens + (now - stamp) * capacity / period)
+
+
+def _wait(tokens, capacity, period):
+    """Seconds until the bucket holds a whole token; 0 if it does now"""
+    return 0 if tokens >= 1 else (1 - tokens) * period / capacity
+
+
+def _take_all(states, buckets, now):
+    """Refill ``states`` and take a token from each unless one of them is empty
+
+    ``states`` are the stored (tokens, stamp) pairs (None for a new bucket)
+    of ``buckets``. Returns the new states and the wait, which is 0 when the
+    tokens were taken. A denied request takes nothing, so it does not use up
+    the caller's other limits.
+    """
+    tokens = [
+        capacity if state is None else _refill(state[0], state[1], now, capacity, period)
+        for state, (key, capacity, period) in zip(states, buckets)
+    ]
+    wait = max(_wait(left, capacity, period) for left, (key, capacity, period) in zip(tokens, buckets))
+    if not wait:
+        tokens = [left - 1 for left in tokens]
+    return [(left, now) for left in tokens], wait
+
+
+class LocalBucketStore:
+    """Buckets in process memory, least recently used evicted past ``max_keys``"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, period):
+        return self.take_all([(key, capacity, period)])
+
+    def take_all(self, buckets):
+        """Take a token from every (key, capacity, period) bucket, or from none; returns the wait"""
+        now = time.monotonic()
+        with self._lock:
+            states = [self._buckets.pop(key, None) for key, capacity, period in buckets]
+            states, wait = _take_all(states, buckets, now)
+            for (key, capacity, period), state in zip(buckets, states):
+                self._buckets[key] = state
+            while len(self._buckets) > self.max_keys:
+                # An evicted bucket comes back full, i.e. forgiven
+                self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheBucketStore:
+    """Buckets in a Django cache shared by every worker"""
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+
+    def take(self, key, capacity, period):
+        return self.take_all([(key, capacity, period)])
+
+    def take_all(self, buckets):
+        now = time.time()
+        stored = self.cache.get_many([key for key, capacity, period in buckets])
+        states, wait = _take_all([stored.get(key) for key, capacity, period in buckets], buckets, now)
+        for (key, capacity, period), state in zip(buckets, states):
+            # An untouched bucket is full again after one period
+            self.cache.set(key, state, timeout=period)
+        return wait
+
+
+LOCAL_STORE = LocalBucketStore()
+
+
+def get_store():
+    alias = getattr(settings, 'STUDIO_THROTTLE_CACHE', None)
+    return CacheBucketStore(alias) if alias else LOCAL_STORE
+
+
+def _ip(request):
+    # BaseThrottle honours NUM_PROXIES / X-Forwarded-For and only reads META,
+    # so it works for DRF and plain Django requests alike. NUM_PROXIES must
+    # be set (0 without a proxy): unset, the whole client-supplied header is
+    # the key and a client could rotate it to get a fresh bucket.
+    return BaseThrottle().get_ident(request)
+
+
+def _email(request):
+    params = getattr(request, 'query_params', request.GET)
+    email = params.get('email')
+    if not email and request.method == 'POST' and hasattr(request, 'data'):
+        data = request.data
+        email = data.get('client_email') if hasattr(data, 'get') else None
+    return email.strip().lower() if email else None
+
+
+KEY_FUNCTIONS = {'ip': _ip, 'email': _email}
+
+
+def check_rate(request, scope):
+    """Seconds until ``request`` may proceed under ``scope``, or None if it may now"""
+    rates = getattr(settings, 'STUDIO_THROTTLE_RATES', {}).get(scope)
+    if not rates:
+        return None
+    buckets = []
+    for kind, rate in rates.items():
+        ident = KEY_FUNCTIONS[kind](request)
+        if ident is not None:
+            buckets.append((f'studio:throttle:{scope}:{kind}:{ident}', *parse_rate(rate)))
+    if not buckets:
+        return None
+    return get_store().take_all(buckets) or None
+
+
+class StudioThrottle(BaseThrottle):
+    scope = None
+
+    def allow_request(self, request, view):
+        self._wait = check_rate(request, self.scope)
+        return self._wait is None
+
+    def wait(self):
+        return self._wait
+
+
+def throttle(scope):
+    """DRF throttle class for ``@throttle_classes`` limiting ``scope``"""
+    return type(f'{scope.title()}Throttle', (StudioThrottle,), {'scope': scope})
+
+
+def _message(wait):
+    return f'Too many requests; retry in {math.ceil(wait)} seconds'
+
+
+def throttled_response(request, scope):
+    """429 JsonResponse for the plain and async views, or None if allowed"""
+    wait = check_rate(request, scope)
+    if wait is None:
+        return None
+    response = JsonResponse({'status': 'error', 'message': _message(wait)}, status=429)
+    response['Retry-After'] = str(math.ceil(wait))
+    return response
+
+
+def exception_handler(exc, context):
+    """DRF's handler, with throttled responses in the studio error format"""
+    response = drf_exception_handler(exc, context)
+    if isinstance(exc, Throttled) and response is not None:
+        response.data = {'status': 'error', 'message': _message(exc.wait or 0)}
+    return response
@@ -0,0 +1,67 @@
+"""Local times rendered in the client's time zone.
+
+Responses carry ``local_datetime`` / ``local_booked_time`` display strings
+next to the UTC datetimes. They are in the studio zone (``TIME_ZONE``)
+unless the list endpoints are asked for another IANA zone with ``?tz=`` or
+an ``Accept-Timezone`` header. Zone objects come from ``zoneinfo`` and are
+kept for the life of the process, and each response formats its times
+through one ``LocalTimes``, which converts every distinct instant once:
+the classes a client booked, or a weekly timetable, repeat the same starts.
+"""
+from datetime import datetime
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.conf import settings
+
+DISPLAY_FORMAT = '%Y-%m-%d %H:%M:%S %Z'
+
+
+class TimezoneError(ValueError):
+    pass
+
+
+@lru_cache(maxsize=1024)
+def get_zone(name):
+    """ZoneInfo for an IANA zone name, created once per process"""
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        # Not cached: lru_cache does not keep exceptions
+        raise TimezoneError(f'Unknown time zone: {name}')
+
+
+def studio_zone():
+    return get_zone(settings.TIME_ZONE)
+
+
+def request_zone(request):
+    """Zone asked for by ``?tz=`` or ``Accept-Timezone``, else the studio zone"""
+    params = getattr(request, 'query_params', request.GET)
+    name = (params.get('tz') or request.headers.get('Accept-Timezone', '')).strip()
+    return get_zone(name) if name else studio_zone()
+
+
+class LocalTimes:
+    """Display strings of instants in one zone, each distinct instant formatted once"""
+
+    def __init__(self, zone=None):
+        self.zone = zone or studio_zone()
+        self._texts = {}
+
+    @property
+    def is_studio_zone(self):
+        return self.zone.key == settings.TIME_ZONE
+
+    def format_timestamp(self, timestamp):
+        text = self._texts.get(timestamp)
+        if text is None:
+            text = self._texts[timestamp] = datetime.fromtimestamp(timestamp, tz=self.zone).strftime(DISPLAY_FORMAT)
+        return text
+
+    def format(self, value):
+        """Display string of an aware datetime"""
+        return self.format_timestamp(value.timestamp())
+
+    def format_timestamps(self, timestamps):
+        return [self.format_timestamp(timestamp) for timestamp in timestamps]
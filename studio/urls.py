@@ -1,18 +1,40 @@
+from django.conf import settings
 from django.urls import path
-from . import views
-
-# API URLs
-api_urlpatterns = [
-    path('classes/', views.get_classes, name='api_get_classes'),
-    path('book/', views.book_class, name='api_book_class'),
-    path('bookings/', views.get_bookings, name='api_get_bookings'),
-]
-
-# Template URLs
-template_urlpatterns = [
-    path('', views.home, name='home'),
-    path('book-class/', views.book_class_page, name='book_class_page'),
-    path('view-bookings/', views.view_bookings_page, name='view_bookings_page'),
-]
-
-urlpatterns = api_urlpatterns + template_urlpatterns
\ No newline at end of file
+from . import async_views, views
+
+
+def build_urlpatterns(read_views):
+    """URL patterns with the read-only endpoints served by ``read_views``"""
+    # API URLs
+    api_urlpatterns = [
+        path('classes/', read_views.get_classes, name='api_get_classes'),
+        path('classes/<int:class_id>/waitlist/', views.class_waitlist, name='api_class_waitlist'),
+        path('book/', views.book_class, name='api_book_class'),
+        path('book/batch/', views.book_batch, name='api_book_batch'),
+        path('bookings/', read_views.get_bookings, name='api_get_bookings'),
+        path('bookings/export/', read_views.export_bookings, name='api_export_bookings'),
+        path('bookings/cancel/', views.cancel_bookings, name='api_cancel_bookings'),
+        path('bookings/<int:booking_id>/cancel/', views.cancel_booking, name='api_cancel_booking'),
+        path('stats/', read_views.get_stats, name='api_get_stats'),
+    ]
+
+    # Template URLs
+    template_urlpatterns = [
+        path('', read_views.home, name='home'),
+        path('book-class/', views.book_class_page, name='book_class_page'),
+        path('view-bookings/', read_views.view_bookings_page, name='view_bookings_page'),
+    ]
+
+    # Operational URLs
+    ops_urlpatterns = [
+        path('metrics', views.metrics, name='metrics'),
+    ]
+
+    return api_urlpatterns + template_urlpatterns + ops_urlpatterns
+
+
+sync_urlpatterns = build_urlpatterns(views)
+async_urlpatterns = build_urlpatterns(async_views)
+
+# ASGI deployments set STUDIO_ASYNC_VIEWS (see fitness_booking/asgi.py)
+urlpatterns = async_urlpatterns if settings.STUDIO_ASYNC_VIEWS else sync_urlpatterns
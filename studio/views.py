@@ -1,49 +1,79 @@
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
-from django.utils import timezone
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, throttle_classes
 from rest_framework.response import Response
 from rest_framework import status
-from django.db import transaction
-from django.utils.timezone import localtime
-from .models import FitnessClass, Booking
-from .serializers import FitnessClassSerializer, BookingSerializer, BookingInputSerializer
+from django.views.decorators.http import require_GET
+from .models import ArchivedBooking, Booking, WaitlistEntry
+from .archive import include_past
+from .analytics import StatsError, stats_queryset_from_params, summarize
+from .catalog import catalog_entry_key, entries_data, get_catalog_index
+from .conditional import add_validators, booking_list_validators, class_list_validators, not_modified
+from .idempotency import idempotent
+from .throttling import throttle, throttled_response
+from .exports import EXPORT_FORMATS, ExportError, export_filename, export_queryset_from_params, get_format, staff_only, stream_export
+from .pagination import InvalidCursor, KeysetPagination
+from .search import FilterError, parse_class_query
+from .timezones import LocalTimes, TimezoneError, request_zone
+from . import services
+from .metrics import REGISTRY, has_scrape_token, measure
+from .serializers import (
+    BookingSerializer, BookingInputSerializer, BatchBookingInputSerializer,
+    CancelBookingInputSerializer, BulkCancelBookingInputSerializer,
+    ClientInputSerializer, WaitlistEntrySerializer, serialize_bookings,
+)
 import logging
 logger = logging.getLogger('studio')
 
 # ====================== API VIEWS ======================
 
 @api_view(['GET'])
+@throttle_classes([throttle('classes')])
 def get_classes(request):
-    """Get all upcoming fitness classes"""
+    """Get upcoming fitness classes, one keyset page at a time"""
     try:
-        # Filter for upcoming classes only
-        classes = FitnessClass.objects.filter(datetime__gt=timezone.now())
-        serializer = FitnessClassSerializer(classes, many=True)
+        # Bad parameters get a 400 even when the client's copy is current
+        zone = request_zone(request)
+        query = parse_class_query(request.query_params, zone)
+        paginator = KeysetPagination(request)
+
+        # Polling clients with a current copy get a 304 after one aggregate query
+        validators = class_list_validators(zone)
+        response = not_modified(request, validators)
+        if response is not None:
+            return response
+
+        # Filtered in memory over the cached catalog; only a miss touches the database
+        entries = paginator.paginate_list(get_catalog_index().search(query), key=catalog_entry_key)
+        classes = entries_data(entries, LocalTimes(zone))
         
-        logger.info(f"Retrieved {len(classes)} upcoming classes")
+        logger.info('Retrieved %d upcoming classes', len(classes), extra={'event': 'classes_listed', 'count': len(classes)})
         
-        # Fixed response format - was returning serializer.data twice
-        return Response({
-            'status': 'success',
-            'data': serializer.data,
-            'count': len(classes)
-        })
+        return add_validators(Response(paginator.get_paginated_response_data(classes)), validators)
         
+    except (InvalidCursor, FilterError, TimezoneError) as e:
+        return Response({
+            'status': 'error',
+            'message': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+
     except Exception as e:
-        logger.error(f"Error retrieving classes: {str(e)}")
+        logger.error('Error retrieving classes: %s', e, extra={'event': 'classes_listed', 'outcome': 'error'})
         return Response({
             'status': 'error',
             'message': 'Failed to retrieve classes'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 @api_view(['POST'])
+@throttle_classes([throttle('book')])
+@idempotent
 def book_class(request):
     """Book a fitness class with proper validation and race condition protection"""
     
     # Validate input data
     input_serializer = BookingInputSerializer(data=request.data)
     if not input_serializer.is_valid():
-        logger.warning(f"Invalid booking data: {input_serializer.errors}")
+        logger.warning('Invalid booking data: %s', input_serializer.errors, extra={'event': 'booking', 'outcome': 'invalid'})
         return Response({
             'status': 'error',
             'message': 'Invalid data provided',
@@ -53,74 +83,122 @@ def book_class(request):
     data = input_serializer.validated_data
 
     try:
-        # Use database transaction to prevent race conditions
-        with transaction.atomic():
-            # Lock the fitness class row for update
-            fitness_class = FitnessClass.objects.select_for_update().get(id=data['class_id'])
-            
-            # Double-check availability after acquiring lock
-            if not fitness_class.is_available():
-                if fitness_class.is_past_class():
-                    logger.warning(f"Attempt to book past class: {fitness_class.id}")
-                    return Response({
-                        'status': 'error',
-                        'message': 'Cannot book past classes'
-                    }, status=status.HTTP_400_BAD_REQUEST)
-                else:
-                    logger.warning(f"No slots available for class: {fitness_class.id}")
-                    return Response({
-                        'status': 'error',
-                        'message': 'No slots available'
-                    }, status=status.HTTP_400_BAD_REQUEST)
-
-            # Check for existing booking (double-check after lock)
-            existing_booking = Booking.objects.filter(
-                fitness_class=fitness_class,
-                client_email=data['client_email'],
-                is_cancelled=False
-            ).exists()
-            
-            if existing_booking:
-                logger.warning(f"Duplicate booking attempt: {data['client_name']} ({data['client_email']}) for class {fitness_class.id}")
-                return Response({
-                    'status': 'error',
-                    'message': 'You have already booked this class'
-                }, status=status.HTTP_400_BAD_REQUEST)
-
-            # Create booking
-            booking = Booking.objects.create(
-                fitness_class=fitness_class,
-                client_name=data['client_name'],
-                client_email=data['client_email']
-            )
-
-        
-
-            logger.info(f"Booking created: {booking.client_name} ({booking.client_email}) for {fitness_class.name}")
-            
-            # Return booking details
-            booking_serializer = BookingSerializer(booking)
+        booking = services.book_class(data['class_id'], data['client_name'], data['client_email'])
+    
+    except services.BookingError as e:
+        if e.code == 'not_found':
+            logger.error('Invalid fitness class ID: %s', data['class_id'],
+                         extra={'event': 'booking', 'outcome': 'rejected', 'code': e.code, 'class_id': data['class_id']})
             return Response({
-                'status': 'success',
-                'message': 'Booking created successfully',
-                'data': booking_serializer.data
-            }, status=status.HTTP_201_CREATED)
-
-    except FitnessClass.DoesNotExist:
-        logger.error(f"Invalid fitness class ID: {data['class_id']}")
+                'status': 'error',
+                'message': e.message
+            }, status=status.HTTP_404_NOT_FOUND)
+        logger.warning('Booking rejected (%s): %s (%s) for class %s', e.code, data['client_name'], data['client_email'], data['class_id'],
+                       extra={'event': 'booking', 'outcome': 'rejected', 'code': e.code, 'class_id': data['class_id'], 'email': data['client_email']})
         return Response({
             'status': 'error',
-            'message': 'Invalid class ID'
-        }, status=status.HTTP_404_NOT_FOUND)
+            'message': e.message
+        }, status=status.HTTP_400_BAD_REQUEST)
     
     except Exception as e:
-        logger.error(f"Unexpected error during booking: {str(e)}")
+        logger.error('Unexpected error during booking: %s', e, extra={'event': 'booking', 'outcome': 'error', 'class_id': data['class_id']})
         return Response({
             'status': 'error',
             'message': 'Failed to create booking'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    logger.info('Booking created: %s (%s) for %s', booking.client_name, booking.client_email, booking.fitness_class.name,
+                extra={'event': 'booking', 'outcome': 'booked', 'class_id': booking.fitness_class_id, 'booking_id': booking.id, 'email': booking.client_email})
+    
+    # Return booking details
+    with measure('serialize'):
+        booking_data = BookingSerializer(booking).data
+    return Response({
+        'status': 'success',
+        'message': 'Booking created successfully',
+        'data': booking_data
+    }, status=status.HTTP_201_CREATED)
+
+@api_view(['POST'])
+@throttle_classes([throttle('book')])
+def book_batch(request):
+    """Book several classes and/or attendees in one request"""
+    batch_serializer = BatchBookingInputSerializer(data=request.data)
+    if not batch_serializer.is_valid():
+        return Response({
+            'status': 'error',
+            'message': 'Invalid data provided',
+            'errors': batch_serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    mode = batch_serializer.validated_data['mode']
+    entries = batch_serializer.validated_data['bookings']
+
+    # Field validation per entry; nothing touches the database yet
+    results = [None] * len(entries)
+    valid = []
+    for index, entry in enumerate(entries):
+        entry_serializer = BookingInputSerializer(data=entry)
+        if entry_serializer.is_valid():
+            valid.append((index, entry_serializer.validated_data))
+        else:
+            results[index] = {
+                'index': index,
+                'status': 'error',
+                'code': 'invalid',
+                'message': 'Invalid data provided',
+                'errors': entry_serializer.errors
+            }
+
+    try:
+        if mode == services.BATCH_ALL_OR_NOTHING and len(valid) < len(entries):
+            outcomes = [
+                services.BookingError('Not booked because another entry was rejected', 'aborted')
+                for _ in valid
+            ]
+        else:
+            outcomes = services.book_batch([data for _, data in valid], mode=mode) if valid else []
+    except Exception as e:
+        logger.error('Unexpected error during batch booking: %s', e, extra={'event': 'batch_booking', 'outcome': 'error'})
+        return Response({
+            'status': 'error',
+            'message': 'Failed to create bookings'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    with measure('serialize'):
+        for (index, _), outcome in zip(valid, outcomes):
+            if isinstance(outcome, services.BookingError):
+                results[index] = {
+                    'index': index,
+                    'status': 'error',
+                    'code': outcome.code,
+                    'message': outcome.message
+                }
+            else:
+                results[index] = {
+                    'index': index,
+                    'status': 'booked',
+                    'data': BookingSerializer(outcome).data
+                }
+
+    booked = sum(1 for result in results if result['status'] == 'booked')
+    logger.info('Batch booking (%s): %d/%d booked', mode, booked, len(entries),
+                extra={'event': 'batch_booking', 'outcome': mode, 'count': booked})
+    if booked == len(entries):
+        response_status, http_status = 'success', status.HTTP_201_CREATED
+    elif booked:
+        response_status, http_status = 'partial', status.HTTP_200_OK
+    else:
+        response_status, http_status = 'error', status.HTTP_400_BAD_REQUEST
+    return Response({
+        'status': response_status,
+        'message': f'{booked} of {len(entries)} bookings created',
+        'data': results,
+        'count': booked
+    }, status=http_status)
+
 @api_view(['GET'])
+@throttle_classes([throttle('bookings')])
 def get_bookings(request):
     """Get all bookings for a specific email address"""
     try:
@@ -131,35 +209,248 @@ def get_bookings(request):
                 'message': 'Email parameter is required'
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        # Get active bookings only
-        bookings = Booking.objects.filter(
-            client_email=email,
-            is_cancelled=False
-        ).select_related('fitness_class')
+        zone = request_zone(request)
+        paginator = KeysetPagination(request)
+        validators = booking_list_validators(email, zone)
+        response = not_modified(request, validators)
+        if response is not None:
+            return response
+
+        # Get active bookings only, newest first
+        bookings = Booking.objects.active_for(email).select_related('fitness_class')
+        if include_past(request.query_params):
+            # Archived bookings of past classes, merged in by the same keyset
+            archived = ArchivedBooking.objects.active_for(email).select_related('fitness_class')
+            page = paginator.paginate_querysets([bookings, archived], ordering=('-booked_at', '-id'))
+        else:
+            page = paginator.paginate_queryset(bookings, ordering=('-booked_at', '-id'))
         
-        serializer = BookingSerializer(bookings, many=True)
+        with measure('serialize'):
+            data = serialize_bookings(page, LocalTimes(zone))
         
-        logger.info(f"Retrieved {len(bookings)} bookings for {email}")
+        logger.info('Retrieved %d bookings for %s', len(page), email, extra={'event': 'bookings_listed', 'email': email, 'count': len(page)})
+        return add_validators(Response(paginator.get_paginated_response_data(data)), validators)
+        
+    except (InvalidCursor, TimezoneError) as e:
+        return Response({
+            'status': 'error',
+            'message': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    except Exception as e:
+        logger.error('Error retrieving bookings: %s', e, extra={'event': 'bookings_listed', 'outcome': 'error'})
+        return Response({
+            'status': 'error',
+            'message': 'Failed to retrieve bookings'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['POST'])
+@throttle_classes([throttle('cancel')])
+def cancel_booking(request, booking_id):
+    """Cancel one booking and release its slot"""
+    input_serializer = CancelBookingInputSerializer(data=request.data)
+    if not input_serializer.is_valid():
+        return Response({
+            'status': 'error',
+            'message': 'Invalid data provided',
+            'errors': input_serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    email = input_serializer.validated_data['client_email']
+    try:
+        cancelled = services.cancel_bookings([booking_id], email)
+    except Exception as e:
+        logger.error('Unexpected error during cancellation: %s', e, extra={'event': 'cancellation', 'outcome': 'error', 'booking_id': booking_id})
+        return Response({
+            'status': 'error',
+            'message': 'Failed to cancel booking'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    if not cancelled:
+        return Response({
+            'status': 'error',
+            'message': 'No active booking found'
+        }, status=status.HTTP_404_NOT_FOUND)
+
+    logger.info('Booking cancelled: %s (%s)', booking_id, email,
+                extra={'event': 'cancellation', 'outcome': 'cancelled', 'booking_id': booking_id, 'email': email})
+    return Response({
+        'status': 'success',
+        'message': 'Booking cancelled successfully',
+        'data': {'id': booking_id, 'is_cancelled': True}
+    })
+
+@api_view(['POST'])
+@throttle_classes([throttle('cancel')])
+def cancel_bookings(request):
+    """Cancel several bookings of one client in a single request"""
+    input_serializer = BulkCancelBookingInputSerializer(data=request.data)
+    if not input_serializer.is_valid():
+        return Response({
+            'status': 'error',
+            'message': 'Invalid data provided',
+            'errors': input_serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    data = input_serializer.validated_data
+    try:
+        cancelled = services.cancel_bookings(data['booking_ids'], data['client_email'])
+    except Exception as e:
+        logger.error('Unexpected error during bulk cancellation: %s', e, extra={'event': 'cancellation', 'outcome': 'error'})
+        return Response({
+            'status': 'error',
+            'message': 'Failed to cancel bookings'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    cancelled_ids = set(cancelled)
+    not_cancelled = [booking_id for booking_id in data['booking_ids'] if booking_id not in cancelled_ids]
+    logger.info('Bulk cancellation: %d bookings cancelled for %s', len(cancelled), data['client_email'],
+                extra={'event': 'cancellation', 'outcome': 'cancelled', 'count': len(cancelled), 'email': data['client_email']})
+    return Response({
+        'status': 'success',
+        'message': f'{len(cancelled)} bookings cancelled',
+        'data': {'cancelled': cancelled, 'not_cancelled': not_cancelled},
+        'count': len(cancelled)
+    })
+
+@api_view(['GET', 'POST'])
+@throttle_classes([throttle('waitlist')])
+def class_waitlist(request, class_id):
+    """Join the waitlist of a full class (POST) or check your position (GET)"""
+    if request.method == 'GET':
+        email = request.query_params.get('email')
+        if not email:
+            return Response({
+                'status': 'error',
+                'message': 'Email parameter is required'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        entry = WaitlistEntry.objects.waiting().filter(fitness_class_id=class_id, client_email=email).first()
+        if entry is None:
+            return Response({
+                'status': 'error',
+                'message': 'Not on the waitlist for this class'
+            }, status=status.HTTP_404_NOT_FOUND)
         return Response({
             'status': 'success',
-            'data': serializer.data,
-            'count': len(bookings)
+            'data': {**WaitlistEntrySerializer(entry).data, 'position': services.waitlist_position(entry)}
         })
-        
+
+    input_serializer = ClientInputSerializer(data=request.data)
+    if not input_serializer.is_valid():
+        return Response({
+            'status': 'error',
+            'message': 'Invalid data provided',
+            'errors': input_serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    data = input_serializer.validated_data
+    try:
+        entry = services.join_waitlist(class_id, data['client_name'], data['client_email'])
+    except services.BookingError as e:
+        if e.code == 'not_found':
+            http_status = status.HTTP_404_NOT_FOUND
+        elif e.code == 'available':
+            http_status = status.HTTP_409_CONFLICT
+        else:
+            http_status = status.HTTP_400_BAD_REQUEST
+        return Response({
+            'status': 'error',
+            'message': e.message
+        }, status=http_status)
     except Exception as e:
-        logger.error(f"Error retrieving bookings: {str(e)}")
+        logger.error('Unexpected error joining waitlist: %s', e, extra={'event': 'waitlist', 'outcome': 'error', 'class_id': class_id})
         return Response({
             'status': 'error',
-            'message': 'Failed to retrieve bookings'
+            'message': 'Failed to join waitlist'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    entry.refresh_from_db(fields=['promoted_at'])
+    if entry.promoted_at is not None:
+        logger.info('Waitlist entry promoted immediately: %s for class %s', data['client_email'], class_id,
+                    extra={'event': 'waitlist', 'outcome': 'promoted', 'class_id': class_id, 'email': data['client_email']})
+        return Response({
+            'status': 'success',
+            'message': 'A slot opened up; you have been booked',
+            'data': WaitlistEntrySerializer(entry).data
+        }, status=status.HTTP_201_CREATED)
+
+    logger.info('Joined waitlist: %s (%s) for class %s', data['client_name'], data['client_email'], class_id,
+                extra={'event': 'waitlist', 'outcome': 'waiting', 'class_id': class_id, 'email': data['client_email']})
+    return Response({
+        'status': 'success',
+        'message': 'Added to the waitlist',
+        'data': {**WaitlistEntrySerializer(entry).data, 'position': services.waitlist_position(entry)}
+    }, status=status.HTTP_201_CREATED)
+
+@api_view(['GET'])
+@throttle_classes([throttle('stats')])
+def get_stats(request):
+    """Class utilization per day, class type and/or instructor from the daily summary"""
+    try:
+        stats = [summarize(row) for row in stats_queryset_from_params(request.query_params)]
+        logger.info('Retrieved %d stats rows', len(stats), extra={'event': 'stats_listed', 'count': len(stats)})
+        return Response({
+            'status': 'success',
+            'data': stats,
+            'count': len(stats)
+        })
+
+    except StatsError as e:
+        return Response({
+            'status': 'error',
+            'message': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    except Exception as e:
+        logger.error('Error retrieving stats: %s', e, extra={'event': 'stats_listed', 'outcome': 'error'})
+        return Response({
+            'status': 'error',
+            'message': 'Failed to retrieve stats'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+# Plain Django view: DRF would claim the ``format`` query parameter
+@require_GET
+def export_bookings(request):
+    """Stream bookings as CSV or NDJSON, by class, client email and/or class dates"""
+    response = throttled_response(request, 'export') or staff_only(request.user)
+    if response is not None:
+        return response
+    try:
+        fmt = get_format(request.GET)
+        rows = export_queryset_from_params(request.GET)
+    except ExportError as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': str(e)
+        }, status=400)
+
+    logger.info('Exporting bookings as %s: %s', fmt, request.GET.urlencode(), extra={'event': 'export', 'outcome': fmt})
+    response = StreamingHttpResponse(stream_export(rows, fmt), content_type=EXPORT_FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(request.GET, fmt)}"'
+    return response
+
+def metrics(request):
+    """Per-view latency, DB and serializer histograms in Prometheus text format"""
+    # Route names and timings are internal: scrapers send the token, people log in as staff
+    if not has_scrape_token(request):
+        denied = staff_only(request.user, what='Metrics')
+        if denied is not None:
+            return denied
+    return HttpResponse(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 # ====================== TEMPLATE VIEWS ======================
 
+# Friendlier wording for the HTML form than the API messages
+WEB_BOOKING_ERRORS = {
+    'not_found': 'Invalid class selected',
+    'full': 'No slots available for this class',
+}
+
 def home(request):
     """Home page showing upcoming classes"""
-    current_time = timezone.now()
-    classes = FitnessClass.objects.filter(datetime__gte=current_time).order_by('id')
-    return render(request, 'home.html', {'data': classes})
+    # The class table comes from the upcoming_classes context processor
+    return render(request, 'home.html')
 
 def book_class_page(request):
     """Booking page with form handling"""
@@ -170,70 +461,25 @@ def book_class_page(request):
 
         # Validate required fields
         if not all([class_id, name, email]):
-            return render(request, 'book.html', {
-                'error': 'All fields are required',
-                'classes': FitnessClass.objects.filter(datetime__gte=timezone.now())
-            })
+            return render(request, 'book.html', {'error': 'All fields are required'})
 
         try:
-            with transaction.atomic():
-                fitness_class = FitnessClass.objects.select_for_update().get(id=class_id)
-                
-                # Check if class is in the past
-                if fitness_class.is_past_class():
-                    return render(request, 'book.html', {
-                        'error': 'Cannot book past classes',
-                        'classes': FitnessClass.objects.filter(datetime__gte=timezone.now())
-                    })
-                
-                # Check available slots
-                if fitness_class.available_slots <= 0:
-                    return render(request, 'book.html', {
-                        'error': 'No slots available for this class',
-                        'classes': FitnessClass.objects.filter(datetime__gte=timezone.now())
-                    })
-                
-                # Check for existing booking
-                existing_booking = Booking.objects.filter(
-                    fitness_class=fitness_class,
-                    client_email=email,
-                    is_cancelled=False
-                ).exists()
-                
-                if existing_booking:
-                    return render(request, 'book.html', {
-                        'error': 'You have already booked this class',
-                        'classes': FitnessClass.objects.filter(datetime__gte=timezone.now())
-                    })
-                
-                # Create booking
-                booking = Booking.objects.create(
-                    fitness_class=fitness_class,
-                    client_name=name,
-                    client_email=email
-                )
-                
-                
-                logger.info(f"Web booking created: {name} ({email}) for {fitness_class.name}")
-                return render(request, 'book.html', {
-                    'message': 'Booking successful!',
-                    'booking': booking,
-                    'classes': FitnessClass.objects.filter(datetime__gte=timezone.now())
-                })
-        
-        except FitnessClass.DoesNotExist:
-            return render(request, 'book.html', {
-                'error': 'Invalid class selected',
-                'classes': FitnessClass.objects.filter(datetime__gte=timezone.now())
-            })
+            booking = services.book_class(class_id, name, email)
+        except services.BookingError as e:
+            return render(request, 'book.html', {'error': WEB_BOOKING_ERRORS.get(e.code, e.message)})
         except Exception as e:
-            logger.error(f"Web booking error: {str(e)}")
-            return render(request, 'book.html', {'error': 'Booking failed. Please try again.',
-                                                 'classes': FitnessClass.objects.filter(datetime__gte=timezone.now())})
+            logger.error('Web booking error: %s', e, extra={'event': 'booking', 'outcome': 'error'})
+            return render(request, 'book.html', {'error': 'Booking failed. Please try again.'})
+
+        logger.info('Web booking created: %s (%s) for %s', name, email, booking.fitness_class.name,
+                    extra={'event': 'booking', 'outcome': 'booked', 'class_id': booking.fitness_class_id, 'booking_id': booking.id, 'email': email})
+        return render(request, 'book.html', {
+            'message': 'Booking successful!',
+            'booking': booking
+        })
     
     # GET request - show booking form
-    classes = FitnessClass.objects.filter(datetime__gte=timezone.now()).order_by('id')
-    return render(request, 'book.html', {'classes': classes})
+    return render(request, 'book.html')
 
 def view_bookings_page(request):
     """View bookings page"""
@@ -242,9 +488,10 @@ def view_bookings_page(request):
     message = None
     
     if email:
-        bookings = Booking.objects.filter(client_email=email,is_cancelled=False).select_related('fitness_class').order_by('-booked_at')
+        # One query: the list is evaluated here instead of exists() + iteration
+        bookings = list(Booking.objects.active_for(email).select_related('fitness_class').order_by('-booked_at', '-id'))
         
-        if not bookings.exists():
+        if not bookings:
             message = 'No bookings found for this email.'
     
     return render(request, 'viewbook.html', {'bookings': bookings,'message': message,'email': email})